@@ -0,0 +1,448 @@
+"""
+Клиент Asana API
+
+Общий HTTP-пул (keep-alive, HTTP/2 при наличии h2), лимиты на токен
+(TokenBucket + семафор), повторы с экспоненциальной задержкой и
+постраничное чтение с предзагрузкой следующей страницы.
+
+Отдельный модуль, чтобы клиентом могли пользоваться задачи вне бота
+(monthly_reports, бенчмарки), не поднимая main.
+"""
+
+import os
+import random
+import asyncio
+import logging
+import httpx
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Tuple, AsyncIterator
+
+from ratelimit import TokenBucket
+from telemetry import telemetry
+from task_records import TASK_FIELDS, TaskRecords, loads
+
+logger = logging.getLogger(__name__)
+
+ASANA_WORKSPACE = os.environ.get("ASANA_WORKSPACE", "860693669973770")
+
+# HTTP-пул для Asana (один на всё время жизни бота)
+ASANA_HTTP2 = os.environ.get("ASANA_HTTP2", "1") == "1"
+ASANA_MAX_CONNECTIONS = int(os.environ.get("ASANA_MAX_CONNECTIONS", "20"))
+ASANA_MAX_KEEPALIVE = int(os.environ.get("ASANA_MAX_KEEPALIVE", "10"))
+ASANA_KEEPALIVE_EXPIRY = float(os.environ.get("ASANA_KEEPALIVE_EXPIRY", "60"))
+ASANA_TIMEOUT = float(os.environ.get("ASANA_TIMEOUT", "30"))
+ASANA_CONNECT_TIMEOUT = float(os.environ.get("ASANA_CONNECT_TIMEOUT", "5"))
+ASANA_PAGE_SIZE = int(os.environ.get("ASANA_PAGE_SIZE", "100"))  # максимум Asana — 100
+ASANA_GZIP = os.environ.get("ASANA_GZIP", "1") == "1"  # 0 — без сжатия (Accept-Encoding: identity)
+
+# Лимиты Asana на токен: 150 запросов/мин (бесплатный план), 1500 (платные); до 50 параллельных GET
+ASANA_RATE_PER_MIN = float(os.environ.get("ASANA_RATE_PER_MIN", "150"))
+ASANA_BURST = float(os.environ.get("ASANA_BURST", "15"))
+ASANA_MAX_CONCURRENT = int(os.environ.get("ASANA_MAX_CONCURRENT", "15"))
+ASANA_MAX_RETRIES = int(os.environ.get("ASANA_MAX_RETRIES", "5"))
+ASANA_BACKOFF_BASE = float(os.environ.get("ASANA_BACKOFF_BASE", "0.5"))
+ASANA_BACKOFF_MAX = float(os.environ.get("ASANA_BACKOFF_MAX", "30"))
+
+
+def create_http_client(verify=True) -> httpx.AsyncClient:
+    """Общий HTTP-клиент с пулом соединений и keep-alive (verify — как в httpx)"""
+    http2 = ASANA_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("ASANA_HTTP2=1, но пакет h2 не установлен — работаем по HTTP/1.1")
+            http2 = False
+    
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=ASANA_MAX_CONNECTIONS,
+            max_keepalive_connections=ASANA_MAX_KEEPALIVE,
+            keepalive_expiry=ASANA_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(ASANA_TIMEOUT, connect=ASANA_CONNECT_TIMEOUT),
+        verify=verify,
+    )
+
+
+class AsanaError(Exception):
+    """Ошибка Asana API (после всех повторов)"""
+    
+    def __init__(self, status: Optional[int], message: str):
+        super().__init__(f"Asana {status or 'network'}: {message}")
+        self.status = status
+
+
+class SearchPagingError(Exception):
+    """Поиск Asana не может пролистать дальше: полная страница с одним created_at"""
+
+
+class AsanaClient:
+    """Клиент для работы с Asana API"""
+    
+    BASE_URL = "https://app.asana.com/api/1.0"
+    
+    # Лимиты Asana считаются на токен, поэтому ведро и семафор общие
+    # для всех клиентов с одним токеном
+    _limiters: Dict[str, Tuple[TokenBucket, asyncio.Semaphore]] = {}
+    
+    def __init__(self, token: str, http: Optional[httpx.AsyncClient] = None):
+        self.token = token
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip" if ASANA_GZIP else "identity"
+        }
+        self.records = TaskRecords()
+        # Без переданного клиента создаём свой, но закрываем его сами
+        self._owns_http = http is None
+        self.http = http or create_http_client()
+        
+        if token not in self._limiters:
+            self._limiters[token] = (
+                TokenBucket(ASANA_RATE_PER_MIN / 60, ASANA_BURST),
+                asyncio.Semaphore(ASANA_MAX_CONCURRENT)
+            )
+        self.bucket, self.concurrency = self._limiters[token]
+        
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retried": 0,
+            "failed": 0,
+            "wait_seconds": 0.0,
+        }
+    
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        allow_status: Tuple[int, ...] = ()
+    ) -> httpx.Response:
+        """
+        Единая точка выхода в Asana.
+        
+        Ведро токенов держит частоту запросов, семафор — число параллельных.
+        429 — ждём Retry-After (ведро блокируется для всех запросов с этим
+        токеном); 5xx и сетевые ошибки — экспоненциальная пауза с джиттером.
+        """
+        attempt = 0
+        while True:
+            self.stats["wait_seconds"] += await self.bucket.acquire()
+            
+            resp = None
+            error = None
+            endpoint = self._endpoint(url)
+            async with self.concurrency:
+                self.stats["requests"] += 1
+                with telemetry.timer("asana_request_seconds", method=method, endpoint=endpoint) as labels:
+                    try:
+                        resp = await self.http.request(method, url, headers=self.headers, params=params)
+                        labels["status"] = resp.status_code
+                    except (httpx.TimeoutException, httpx.TransportError) as e:
+                        error = f"{type(e).__name__}: {e}"
+                        labels["status"] = "network_error"
+            if resp is not None:
+                telemetry.count("asana_response_bytes_total", len(resp.content), endpoint=endpoint)
+                telemetry.count("asana_wire_bytes_total", resp.num_bytes_downloaded, endpoint=endpoint)
+            
+            delay = None
+            if resp is not None:
+                status = resp.status_code
+                if status < 400 or status in allow_status:
+                    return resp
+                
+                if status == 429:
+                    self.stats["throttled"] += 1
+                    delay = float(resp.headers.get("Retry-After") or 0) or None
+                    if delay:
+                        self.bucket.pause(delay)
+                elif status < 500:
+                    self.stats["failed"] += 1
+                    raise AsanaError(status, self._error_message(resp))
+                error = self._error_message(resp)
+            
+            if attempt >= ASANA_MAX_RETRIES:
+                self.stats["failed"] += 1
+                raise AsanaError(resp.status_code if resp is not None else None, error)
+            
+            if delay is None:
+                delay = min(ASANA_BACKOFF_MAX, ASANA_BACKOFF_BASE * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+            
+            attempt += 1
+            self.stats["retried"] += 1
+            logger.warning(f"Asana retry {attempt}/{ASANA_MAX_RETRIES} in {delay:.1f}s: {error}")
+            await asyncio.sleep(delay)
+    
+    def _decode(self, resp: httpx.Response) -> Dict:
+        """Тело ответа (orjson, если установлен)"""
+        with telemetry.timer("asana_decode_seconds", endpoint=self._endpoint(str(resp.url.copy_with(query=None)))):
+            return loads(resp.content)
+    
+    @classmethod
+    def _endpoint(cls, url: str) -> str:
+        """Путь без gid — метка для метрик (/tasks/123 -> /tasks/:gid)"""
+        path = url[len(cls.BASE_URL):] if url.startswith(cls.BASE_URL) else url
+        return "/".join(":gid" if part.isdigit() else part for part in path.split("/"))
+    
+    @staticmethod
+    def _error_message(resp: httpx.Response) -> str:
+        """Текст ошибки из тела ответа Asana"""
+        try:
+            errors = resp.json().get("errors") or []
+            return "; ".join(e.get("message", "") for e in errors) or resp.reason_phrase
+        except ValueError:
+            return resp.reason_phrase
+    
+    async def aclose(self):
+        """Закрыть пул соединений (если он наш)"""
+        if self._owns_http:
+            await self.http.aclose()
+    
+    async def get_tasks(
+        self, 
+        project_id: str = None,
+        assignee: str = None,
+        completed: bool = False,
+        opt_fields: str = TASK_FIELDS["sync"],
+        max_tasks: Optional[int] = None,
+        completed_since: Optional[str] = None
+    ) -> List[Dict]:
+        """Получить задачи (все страницы)"""
+        tasks = []
+        async for page in self.iter_task_pages(
+            project_id=project_id,
+            assignee=assignee,
+            completed=completed,
+            opt_fields=opt_fields,
+            max_tasks=max_tasks,
+            completed_since=completed_since
+        ):
+            tasks.extend(page)
+        return tasks
+    
+    async def iter_task_pages(
+        self,
+        project_id: str = None,
+        assignee: str = None,
+        completed: bool = False,
+        opt_fields: str = TASK_FIELDS["sync"],
+        limit: int = ASANA_PAGE_SIZE,
+        max_tasks: Optional[int] = None,
+        completed_since: Optional[str] = None
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Постраничный обход задач.
+        
+        Следующая страница запрашивается сразу, как только известен её offset,
+        поэтому вызывающий код обрабатывает текущую страницу, пока следующая
+        уже в пути. completed_since — незавершённые плюс завершённые после даты.
+        """
+        params = {
+            "opt_fields": opt_fields,
+            "completed_since": completed_since or ("now" if not completed else None),
+            "limit": max(1, min(limit, 100))
+        }
+        
+        if project_id:
+            params["project"] = project_id
+        if assignee:
+            params["assignee"] = assignee
+            params["workspace"] = ASANA_WORKSPACE
+        
+        params = {k: v for k, v in params.items() if v}
+        async for page in self._iter_pages(f"{self.BASE_URL}/tasks", params, max_tasks):
+            yield self.records.compact_page(page)
+    
+    async def _iter_pages(
+        self,
+        url: str,
+        params: Dict,
+        max_items: Optional[int] = None
+    ) -> AsyncIterator[List[Dict]]:
+        """Обход коллекции по next_page.offset с предзагрузкой следующей страницы"""
+        fetched = 0
+        pending = asyncio.create_task(self._get_page(url, params))
+        
+        try:
+            while pending:
+                page, next_offset = await pending
+                pending = None
+                
+                if max_items is not None:
+                    page = page[:max_items - fetched]
+                fetched += len(page)
+                
+                if next_offset and (max_items is None or fetched < max_items):
+                    pending = asyncio.create_task(
+                        self._get_page(url, {**params, "offset": next_offset})
+                    )
+                
+                if page:
+                    yield page
+        finally:
+            if pending:
+                pending.cancel()
+    
+    async def _get_page(self, url: str, params: Dict) -> Tuple[List[Dict], Optional[str]]:
+        """Одна страница коллекции: (данные, offset следующей страницы)"""
+        resp = await self._request("GET", url, params=params)
+        data = self._decode(resp)
+        next_page = data.get("next_page") or {}
+        return data.get("data", []), next_page.get("offset")
+    
+    async def get_task(
+        self,
+        task_id: str,
+        opt_fields: str = TASK_FIELDS["refetch"]
+    ) -> Optional[Dict]:
+        """Получить одну задачу (None, если удалена или стала недоступна)"""
+        resp = await self._request(
+            "GET",
+            f"{self.BASE_URL}/tasks/{task_id}",
+            params={"opt_fields": opt_fields},
+            allow_status=(403, 404)
+        )
+        # 403 — задачу сделали приватной: для бота она исчезла так же, как удалённая
+        if resp.status_code in (403, 404):
+            return None
+        return self.records.compact(self._decode(resp).get("data"))
+    
+    async def get_events(self, resource: str, sync: Optional[str] = None) -> Dict:
+        """
+        События ресурса с момента sync-токена.
+        
+        Без токена (или с истёкшим) Asana отвечает 412 и выдаёт новый токен —
+        тогда возвращаем {"sync": ..., "expired": True}.
+        """
+        params = {"resource": resource}
+        if sync:
+            params["sync"] = sync
+        
+        resp = await self._request(
+            "GET",
+            f"{self.BASE_URL}/events",
+            params=params,
+            allow_status=(412,)
+        )
+        data = self._decode(resp)
+        
+        if resp.status_code == 412:
+            return {"data": [], "sync": data.get("sync"), "expired": True}
+        
+        return {
+            "data": data.get("data", []),
+            "sync": data.get("sync"),
+            "has_more": data.get("has_more", False)
+        }
+    
+    async def get_projects(self, workspace_id: str) -> List[Dict]:
+        """Активные (неархивные) проекты воркспейса"""
+        projects = []
+        async for page in self._iter_pages(
+            f"{self.BASE_URL}/projects",
+            {
+                "workspace": workspace_id,
+                "archived": "false",
+                "opt_fields": "name",
+                "limit": 100
+            }
+        ):
+            projects.extend(page)
+        return projects
+    
+    async def get_project(self, project_id: str) -> Optional[Dict]:
+        """Получить проект"""
+        resp = await self._request(
+            "GET",
+            f"{self.BASE_URL}/projects/{project_id}",
+            params={"opt_fields": "name"},
+            allow_status=(404,)
+        )
+        if resp.status_code == 404:
+            return None
+        data = self._decode(resp)
+        return data.get("data")
+    
+    async def get_users(self, workspace_id: str) -> List[Dict]:
+        """Получить пользователей воркспейса"""
+        resp = await self._request(
+            "GET",
+            f"{self.BASE_URL}/workspaces/{workspace_id}/users",
+            params={"opt_fields": "name,email"}
+        )
+        data = self._decode(resp)
+        return data.get("data", [])
+    
+    async def search_tasks(
+        self,
+        workspace_id: str,
+        text: str = None,
+        assignee: str = None,
+        due_on_before: str = None,
+        completed: bool = False,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Поиск задач (все страницы; filters — прочие параметры поиска как в API)"""
+        params = dict(filters or {})
+        if text:
+            params["text"] = text
+        if assignee:
+            params["assignee.any"] = assignee
+        if due_on_before:
+            params["due_on.before"] = due_on_before
+        if not completed:
+            params["completed"] = "false"
+        
+        tasks = []
+        async for page in self.iter_search_pages(workspace_id, params):
+            tasks.extend(page)
+        return tasks
+    
+    async def iter_search_pages(
+        self,
+        workspace_id: str,
+        filters: Dict,
+        opt_fields: str = TASK_FIELDS["search"],
+        limit: int = ASANA_PAGE_SIZE
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Постраничный поиск по воркспейсу.
+        
+        У поиска нет offset — страницы листаются сортировкой по created_at:
+        следующая начинается с created_at последней задачи. Границу берём
+        с запасом в 1 мс и отбрасываем уже виденные gid, чтобы не потерять
+        задачи, созданные в одну миллисекунду. Если целая страница создана в
+        одну миллисекунду (массовый импорт, копия проекта), сдвинуться нельзя —
+        SearchPagingError: неполный список нельзя выдавать за полный.
+        """
+        url = f"{self.BASE_URL}/workspaces/{workspace_id}/tasks/search"
+        limit = max(1, min(limit, 100))
+        params = {
+            **filters,
+            "opt_fields": opt_fields if "created_at" in opt_fields.split(",") else opt_fields + ",created_at",
+            "sort_by": "created_at",
+            "sort_ascending": "true",
+            "limit": limit
+        }
+        
+        seen = set()
+        while True:
+            resp = await self._request("GET", url, params=params)
+            page = self.records.compact_page(self._decode(resp).get("data", []))
+            fresh = [t for t in page if t["gid"] not in seen]
+            seen.update(t["gid"] for t in fresh)
+            if fresh:
+                yield fresh
+            
+            if len(page) < limit:
+                return
+            if not fresh:
+                # Целая страница с одним created_at — дальше не сдвинуться
+                raise SearchPagingError(f"search paging stuck at {page[-1].get('created_at')}")
+            
+            last = datetime.fromisoformat(page[-1]["created_at"].replace("Z", "+00:00"))
+            params["created_at.after"] = (last - timedelta(milliseconds=1)).isoformat(timespec="milliseconds")
@@ -0,0 +1,214 @@
+"""
+Задержка запросов к Asana: новый клиент на вызов против общего пула
+
+Локальный HTTPS-сервер-заглушка отдаёт задачу как /tasks/<gid> Asana.
+Сравниваются два режима AsanaClient:
+
+- fresh  — как было: на каждый вызов новый httpx.AsyncClient (новое
+  TCP-соединение и TLS-рукопожатие);
+- pooled — общий клиент create_http_client() на всё время жизни бота.
+
+Сетевую задержку до app.asana.com заглушка имитирует сама: --rtt на
+каждый запрос и ещё 2 * rtt на новое соединение (TCP + TLS 1.3). Без
+пакета cryptography (самоподписанный сертификат) сервер работает по HTTP.
+
+Запуск (из bot/):
+    python benchmarks/asana_latency.py
+    python benchmarks/asana_latency.py --requests 300 --rtt 0.04 --parallel 10
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import asana_client
+from asana_client import AsanaClient, create_http_client
+
+TASK = json.dumps({
+    "data": {
+        "gid": "1",
+        "name": "Задача",
+        "due_on": "2026-01-15",
+        "completed": False,
+        "assignee": {"gid": "1", "name": "Анна"},
+        "projects": [{"gid": "1"}],
+    },
+}, ensure_ascii=False).encode()
+
+
+def self_signed_context() -> Tuple[Optional[ssl.SSLContext], Optional[ssl.SSLContext]]:
+    """(серверный, клиентский) TLS-контексты для 127.0.0.1; (None, None) без cryptography"""
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+    except ImportError:  # необязательная зависимость
+        return None, None
+
+    import datetime
+    import ipaddress
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .sign(key, hashes.SHA256())
+    )
+
+    directory = tempfile.mkdtemp()
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+
+    server = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server.load_cert_chain(cert_path, key_path)
+    client = ssl.create_default_context(cafile=cert_path)
+    return server, client
+
+
+class StubAsanaServer:
+    """HTTP/1.1 с keep-alive; на каждый запрос — одна задача"""
+
+    def __init__(self, rtt: float, tls: Optional[ssl.SSLContext]):
+        self.rtt = rtt
+        self.tls = tls
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]
+        return f"{'https' if self.tls else 'http'}://127.0.0.1:{port}/api/1.0"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=self.tls)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        # Рукопожатия TCP и TLS — два круга до сервера
+        await asyncio.sleep(2 * self.rtt)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                await asyncio.sleep(self.rtt)
+                close = b"connection: close" in head.lower()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(TASK)}\r\n".encode()
+                    + (b"Connection: close\r\n" if close else b"")
+                    + b"\r\n" + TASK
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def stub_client_class(base_url: str):
+    return type("StubAsanaClient", (AsanaClient,), {"BASE_URL": base_url})
+
+
+async def measure(server: StubAsanaServer, mode: str, requests: int, parallel: int, verify) -> List[float]:
+    """Задержки вызовов get_task в режиме fresh/pooled"""
+    client_class = stub_client_class(server.base_url)
+    # Свой токен — своё ведро лимитов с текущими ASANA_RATE_PER_MIN/ASANA_BURST
+    token = f"bench-{mode}-{id(server)}"
+    shared = create_http_client(verify=verify) if mode == "pooled" else None
+    semaphore = asyncio.Semaphore(parallel)
+    latencies: List[float] = []
+
+    async def call(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            if shared is None:
+                # Как до общего пула: клиент живёт один вызов
+                async with httpx.AsyncClient(verify=verify) as http:
+                    await client_class(token, http=http).get_task(str(i))
+            else:
+                await client_class(token, http=shared).get_task(str(i))
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*(call(i) for i in range(requests)))
+    finally:
+        if shared is not None:
+            await shared.aclose()
+    return latencies
+
+
+def summary(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+async def run(requests: int, rtt: float, parallel: int) -> Dict[str, Dict]:
+    server_tls, client_tls = self_signed_context()
+    # Лимиты запросов к Asana в заглушке не нужны
+    asana_client.ASANA_RATE_PER_MIN = 10 ** 9
+    asana_client.ASANA_BURST = 10 ** 9
+    results = {}
+    for mode in ("fresh", "pooled"):
+        async with StubAsanaServer(rtt, server_tls) as server:
+            latencies = await measure(server, mode, requests, parallel, client_tls or True)
+            results[mode] = {**summary(latencies), "connections": server.connections, "requests": server.requests}
+    results["tls"] = server_tls is not None
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Задержка запросов к заглушке Asana")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.02, help="имитация круга до сервера, с")
+    parser.add_argument("--parallel", type=int, default=1, help="одновременных вызовов")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.requests, args.rtt, args.parallel))
+    print(f"{args.requests} вызовов get_task, rtt {args.rtt * 1000:.0f} мс, параллельно {args.parallel}, "
+          f"{'HTTPS' if results['tls'] else 'HTTP'}")
+    for mode in ("fresh", "pooled"):
+        r = results[mode]
+        print(
+            f"{mode:>7}: среднее {r['mean'] * 1000:6.1f} мс  p50 {r['p50'] * 1000:6.1f} мс  "
+            f"p99 {r['p99'] * 1000:6.1f} мс  соединений {r['connections']}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
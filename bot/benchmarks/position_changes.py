@@ -0,0 +1,132 @@
+"""
+Бенчмарк поиска изменений позиций на паре снимков
+
+Синтетическая пара снимков positions (по умолчанию 1M строк в каждом):
+вчерашние позиции случайны, сегодняшние — вчерашние со сдвигом, часть
+запросов выпадает из выдачи или появляется впервые, порядок строк разный.
+
+Сравниваются:
+- loop — построчный проход на словарях (как это написали бы без NumPy);
+- numpy — to_columns + diff_snapshots из position_changes.
+
+Время to_columns печатается отдельно: это разбор строк, который нужен
+при любом способе сравнения. Результаты обоих способов сверяются.
+
+Запуск (из bot/):
+    python benchmarks/position_changes.py
+    python benchmarks/position_changes.py --rows 200000 --threshold 3
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from position_changes import DROPPED, ENTERED, LEFT, TOP, UNRANKED, diff_snapshots, to_columns
+
+ENGINES = ("yandex", "google")
+REGIONS = ("spb", "msk", "ekb", "nsk", "kzn")
+
+
+def synthetic_pair(rows: int, seed: int = 1) -> Tuple[List[Dict], List[Dict]]:
+    """(вчера, сегодня): по rows строк, 2% ключей есть только в одном из дней"""
+    rng = np.random.default_rng(seed)
+    stale = rows // 50
+    total = rows + stale
+
+    def row(i: int, position) -> Dict:
+        keyword, rest = divmod(i, len(ENGINES) * len(REGIONS))
+        return {
+            "keyword": f"запрос {keyword}",
+            "search_engine": ENGINES[rest % len(ENGINES)],
+            "region": REGIONS[rest // len(ENGINES)],
+            "position": position,
+        }
+
+    before = rng.integers(1, 60, total)
+    before_unranked = rng.random(total) < 0.05
+    after = np.clip(before + rng.normal(0, 3, total).round().astype(int), 1, 100)
+    after_unranked = rng.random(total) < 0.05
+
+    # Первые stale ключей были только вчера, последние stale — только сегодня
+    previous = [row(i, None if before_unranked[i] else int(before[i])) for i in range(rows)]
+    current = [row(i, None if after_unranked[i] else int(after[i])) for i in range(stale, total)]
+    rng.shuffle(previous)
+    rng.shuffle(current)
+    return previous, current
+
+
+def loop_diff(previous: List[Dict], current: List[Dict], threshold: int) -> Dict[str, Dict]:
+    """Построчное сравнение: ключ -> (было, стало, вид)"""
+    def key(r: Dict) -> str:
+        return f"{r['keyword']}\x1f{r.get('search_engine')}\x1f{r.get('region')}"
+
+    before = {key(r): r["position"] if r.get("position") is not None else UNRANKED for r in previous}
+    changes = {}
+    for r in current:
+        k = key(r)
+        if k not in before:
+            continue
+        was = before[k]
+        now = r["position"] if r.get("position") is not None else UNRANKED
+        if was <= TOP < now:
+            kind = LEFT
+        elif now <= TOP < was:
+            kind = ENTERED
+        elif now - was >= threshold:
+            kind = DROPPED
+        else:
+            continue
+        changes[k] = (was, now, kind)
+    return changes
+
+
+def run(rows: int, threshold: int) -> Dict:
+    previous, current = synthetic_pair(rows)
+
+    started = time.perf_counter()
+    expected = loop_diff(previous, current, threshold)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = to_columns(previous), to_columns(current)
+    columns_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    changes = diff_snapshots(*columns, threshold)
+    diff_seconds = time.perf_counter() - started
+
+    found = {
+        str(k): (int(p), int(c), int(kind))
+        for k, p, c, kind in zip(changes["keys"], changes["previous"], changes["current"], changes["kind"])
+    }
+    return {
+        "rows": rows,
+        "changes": len(found),
+        "match": found == expected,
+        "loop": loop_seconds,
+        "to_columns": columns_seconds,
+        "diff": diff_seconds,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Бенчмарк diff_snapshots на паре снимков")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="строк в каждом снимке")
+    parser.add_argument("--threshold", type=int, default=5)
+    args = parser.parse_args()
+
+    r = run(args.rows, args.threshold)
+    print(f"{r['rows']} строк x 2, изменений {r['changes']}, результаты совпадают: {'да' if r['match'] else 'НЕТ'}")
+    print(f"  loop:       {r['loop']:8.3f} с")
+    print(f"  to_columns: {r['to_columns']:8.3f} с")
+    print(f"  diff:       {r['diff']:8.3f} с  (to_columns + diff: {r['to_columns'] + r['diff']:.3f} с)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,241 @@
+"""
+Нагрузочный прогон обработки апдейтов
+
+Синтетические апдейты прогоняются через настоящие обработчики бота
+(main.add_handlers) тем же путём, что и в рабочем цикле Application:
+update_processor.process_update(update, application.process_update(update)).
+Bot API и Asana заменены заглушками с задержкой, поэтому сеть не нужна.
+
+Смесь апдейтов: клиенты жмут /start и /positions из разных чатов, изредка
+админ запрашивает /analyze — первый раз это полная загрузка проекта из
+(заглушки) Asana. Для каждого режима печатаются пропускная способность и
+p50/p99 задержки от поступления апдейта до конца обработки — отдельно
+для клиентских апдейтов, которые и страдают от медленного /analyze.
+
+Запуск (из bot/):
+    python benchmarks/replay_updates.py
+    python benchmarks/replay_updates.py --updates 5000 --workers 16 --api-latency 0.03
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.ext import Application, SimpleUpdateProcessor
+from telegram.request import BaseRequest, RequestData
+
+import main
+from asana_client import SearchPagingError
+from roles import RoleCache
+from client_registry import ClientRegistry
+from update_processor import PerChatUpdateProcessor
+
+ADMIN_ID = 1
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+
+
+class StubBotAPI(BaseRequest):
+    """Bot API с фиксированной задержкой: любой метод успешен"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self._message_ids = iter(range(1, 10 ** 9))
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, **kwargs):
+        self.calls += 1
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            result = BOT_USER
+        else:
+            await asyncio.sleep(self.latency)
+            params = request_data.parameters if request_data else {}
+            result = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class StubAsana:
+    """Проект из tasks задач; страница по 100 отдаётся за page_latency"""
+
+    def __init__(self, tasks: int, page_latency: float):
+        self.page_latency = page_latency
+        self.tasks = [
+            {
+                "gid": str(i),
+                "name": f"Задача {i}",
+                "due_on": f"2026-01-{i % 28 + 1:02d}" if i % 4 else None,
+                "assignee": {"gid": str(i % 12), "name": f"Специалист {i % 12}"} if i % 9 else None,
+                "completed": False,
+            }
+            for i in range(tasks)
+        ]
+        self.stats = {"requests": 0, "throttled": 0, "retried": 0, "failed": 0, "wait_seconds": 0.0}
+
+    async def get_project(self, gid: str) -> Dict:
+        return {"gid": gid, "name": "Проект"}
+
+    async def get_events(self, resource: str, sync: Optional[str] = None) -> Dict:
+        await asyncio.sleep(self.page_latency)
+        return {"sync": "stub", "expired": sync is None, "data": [], "has_more": False}
+
+    async def iter_task_pages(self, project_id: str = None, **kwargs):
+        for start in range(0, len(self.tasks), 100):
+            await asyncio.sleep(self.page_latency)
+            yield self.tasks[start:start + 100]
+
+    async def iter_search_pages(self, workspace_id: str, filters: Dict, **kwargs):
+        raise SearchPagingError("search disabled in replay")
+        yield
+
+
+def synthetic_updates(count: int, chats: int, admin_share: float, seed: int = 1) -> List[Dict]:
+    """JSON апдейтов: клиентские команды из chats чатов и /analyze от админа"""
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(1, count + 1):
+        if rng.random() < admin_share:
+            chat, text = ADMIN_ID, "/analyze"
+        else:
+            chat, text = rng.randrange(1000, 1000 + chats), rng.choice(("/start", "/positions"))
+        updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat, "type": "private"},
+                "from": {"id": chat, "is_bot": False, "first_name": "User"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            },
+        })
+    return updates
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+async def replay(
+    updates: List[Dict],
+    workers: int,
+    api_latency: float = 0.02,
+    tasks: int = 2000,
+    page_latency: float = 0.05,
+    arrival_rate: Optional[float] = None
+) -> Dict:
+    """
+    Прогнать апдейты через Application; workers=1 — последовательная
+    обработка (как без concurrent_updates), иначе PerChatUpdateProcessor.
+
+    arrival_rate — апдейтов в секунду (None — все сразу).
+    Возвращает пропускную способность, задержки и порядок обработки по чатам.
+    """
+    main.ASANA_TOKEN = main.ASANA_TOKEN or "stub"
+    api = StubBotAPI(api_latency)
+    processor = PerChatUpdateProcessor(workers, max_pending=len(updates)) if workers > 1 else SimpleUpdateProcessor(1)
+    app = Application.builder().token("1:stub").request(api).get_updates_request(StubBotAPI(0)) \
+        .concurrent_updates(processor).build()
+    main.add_handlers(app)
+
+    analyzer = main.TaskAnalyzer(StubAsana(tasks, page_latency))
+    app.bot_data.update({
+        "asana": analyzer.asana,
+        "analyzer": analyzer,
+        "router": main.ReportRouter(analyzer),
+        "roles": RoleCache(static_admins=[ADMIN_ID]),
+        "clients": ClientRegistry(),
+    })
+
+    latencies: Dict[str, List[float]] = {"client": [], "admin": []}
+    order: Dict[int, List[int]] = {}
+
+    async with app:
+        await app.update_processor.initialize()
+
+        async def one(update: Update, arrived: float):
+            await app.update_processor.process_update(update, app.process_update(update))
+            kind = "admin" if update.effective_chat.id == ADMIN_ID else "client"
+            latencies[kind].append(time.perf_counter() - arrived)
+            order.setdefault(update.effective_chat.id, []).append(update.update_id)
+
+        started = time.perf_counter()
+        running = []
+        for i, data in enumerate(updates):
+            if arrival_rate:
+                delay = started + i / arrival_rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(data, app.bot)
+            running.append(asyncio.create_task(one(update, time.perf_counter())))
+        await asyncio.gather(*running)
+        elapsed = time.perf_counter() - started
+        await app.update_processor.shutdown()
+
+    return {
+        "updates": len(updates),
+        "elapsed": elapsed,
+        "throughput": len(updates) / elapsed,
+        "client_p50": percentile(latencies["client"], 50),
+        "client_p99": percentile(latencies["client"], 99),
+        "admin_p50": percentile(latencies["admin"], 50),
+        "admin_p99": percentile(latencies["admin"], 99),
+        "api_calls": api.calls,
+        "order": order,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработки апдейтов")
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--admin-share", type=float, default=0.01, help="доля /analyze от админа")
+    parser.add_argument("--workers", type=int, default=16, help="параллельных обработчиков (режим per-chat)")
+    parser.add_argument("--rate", type=float, default=500, help="апдейтов в секунду (0 — все сразу)")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка Bot API, с")
+    parser.add_argument("--tasks", type=int, default=2000, help="задач в проекте Asana")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="задержка страницы Asana, с")
+    args = parser.parse_args()
+
+    updates = synthetic_updates(args.updates, args.chats, args.admin_share)
+    print(f"{args.updates} апдейтов, {args.chats} чатов, Bot API {args.api_latency * 1000:.0f} мс, "
+          f"Asana {args.tasks} задач по {args.page_latency * 1000:.0f} мс/страница")
+    for label, workers in (("sequential", 1), (f"per-chat x{args.workers}", args.workers)):
+        result = asyncio.run(replay(
+            updates, workers, args.api_latency, args.tasks, args.page_latency, args.rate or None
+        ))
+        in_order = all(ids == sorted(ids) for ids in result["order"].values())
+        print(
+            f"{label:>16}: {result['throughput']:7.0f} апд/с  "
+            f"клиенты p50 {result['client_p50'] * 1000:7.1f} мс  p99 {result['client_p99'] * 1000:7.1f} мс  "
+            f"/analyze p50 {result['admin_p50'] * 1000:7.1f} мс  "
+            f"порядок в чатах: {'да' if in_order else 'НЕТ'}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,164 @@
+"""
+Микробенчмарк индекса загрузки (WorkloadIndex)
+
+Сравнивает то, что делает бот на каждый /analyze и /workload:
+
+- rescan — как было до индекса: проход по всем задачам со strptime
+  каждого due_on, а затем сортировка задач каждого исполнителя ради
+  двух ближайших дедлайнов;
+- index — WorkloadIndex: изменение одной задачи (upsert), готовый
+  snapshot(), N ближайших дедлайнов по всем исполнителям и подсчёт
+  просроченных после смены дня.
+
+Построение индекса с нуля (полная загрузка проекта) печатается отдельно —
+это разовая цена, которая дальше окупается.
+
+Запуск (из bot/):
+    python benchmarks/workload_index.py
+    python benchmarks/workload_index.py --sizes 1000 10000 100000 --assignees 40
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workload_index import WorkloadIndex
+
+TODAY = date(2026, 1, 15)
+
+
+def synthetic_tasks(count: int, assignees: int, seed: int = 1) -> List[Dict]:
+    """Задачи проекта: сроки ±60 дней, часть без срока и без исполнителя"""
+    rng = random.Random(seed)
+    people = [{"gid": str(i), "name": f"Специалист {i}"} for i in range(assignees)]
+    tasks = []
+    for i in range(count):
+        due = TODAY + timedelta(days=rng.randint(-60, 60))
+        tasks.append({
+            "gid": str(i),
+            "name": f"Задача {i}",
+            "completed": rng.random() < 0.05,
+            "due_on": due.isoformat() if rng.random() < 0.85 else None,
+            "assignee": rng.choice(people) if rng.random() < 0.9 else None,
+        })
+    return tasks
+
+
+def rescan(tasks: List[Dict], today: date) -> Dict:
+    """Анализ полным проходом (прежний analyze_workload)"""
+    by_assignee = {}
+    no_assignee = []
+    no_due_date = []
+    overdue = []
+    total_active = 0
+
+    for task in tasks:
+        if task.get("completed"):
+            continue
+        total_active += 1
+
+        assignee = task.get("assignee")
+        due_on = task.get("due_on")
+
+        if not assignee:
+            no_assignee.append(task)
+        else:
+            by_assignee.setdefault(assignee.get("name", "Unknown"), []).append(task)
+
+        if not due_on:
+            no_due_date.append(task)
+        elif datetime.strptime(due_on, "%Y-%m-%d").date() < today:
+            overdue.append(task)
+
+    return {
+        "by_assignee": by_assignee,
+        "no_assignee": no_assignee,
+        "no_due_date": no_due_date,
+        "overdue": overdue,
+        "total_active": total_active
+    }
+
+
+def rescan_upcoming(analysis: Dict, n: int) -> Dict[str, List[Dict]]:
+    """Ближайшие дедлайны сортировкой (прежний /workload)"""
+    result = {}
+    for name, tasks in analysis["by_assignee"].items():
+        upcoming = [t for t in tasks if t.get("due_on")]
+        upcoming.sort(key=lambda x: x["due_on"])
+        result[name] = upcoming[:n]
+    return result
+
+
+def best_of(fn: Callable, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(size: int, assignees: int, upcoming: int, repeat: int) -> Dict[str, float]:
+    tasks = synthetic_tasks(size, assignees)
+    rng = random.Random(2)
+
+    def build() -> WorkloadIndex:
+        index = WorkloadIndex(today=lambda: TODAY)
+        for task in tasks:
+            index.upsert(task)
+        return index
+
+    results = {"build": best_of(build, max(1, repeat // 5))}
+    index = build()
+    names = list(index.assignee_counts())
+
+    def rescan_analyze():
+        rescan_upcoming(rescan(tasks, TODAY), upcoming)
+
+    def index_analyze():
+        index.snapshot(TODAY)
+        for name in names:
+            index.upcoming(name, upcoming)
+
+    def index_update():
+        # Событие Asana: у одной задачи сменились срок и исполнитель
+        task = dict(rng.choice(tasks))
+        task["due_on"] = (TODAY + timedelta(days=rng.randint(-60, 60))).isoformat()
+        index.upsert(task)
+
+    results["rescan"] = best_of(rescan_analyze, repeat)
+    results["snapshot"] = best_of(index_analyze, repeat)
+    results["update"] = best_of(index_update, repeat * 20)
+    results["rescan_tomorrow"] = best_of(lambda: rescan(tasks, TODAY + timedelta(days=1)), repeat)
+    results["overdue_tomorrow"] = best_of(lambda: index.overdue_count(TODAY + timedelta(days=1)), repeat * 20)
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Микробенчмарк WorkloadIndex")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--assignees", type=int, default=25)
+    parser.add_argument("--upcoming", type=int, default=2, help="ближайших дедлайнов на исполнителя")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    def ms(seconds: float) -> str:
+        return f"{seconds * 1000:10.3f}"
+
+    print(f"{'задач':>8} | {'построение':>10} | {'rescan':>10} {'snapshot':>10} | "
+          f"{'upsert':>10} | {'день: rescan':>12} {'индекс':>10}   (мс)")
+    for size in args.sizes:
+        r = run(size, args.assignees, args.upcoming, args.repeat)
+        print(f"{size:>8} | {ms(r['build'])} | {ms(r['rescan'])} {ms(r['snapshot'])} | "
+              f"{ms(r['update'])} | {ms(r['rescan_tomorrow']):>12} {ms(r['overdue_tomorrow'])}")
+
+
+if __name__ == "__main__":
+    main_cli()
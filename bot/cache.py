@@ -0,0 +1,157 @@
+"""
+Кэш снимков с TTL и stale-while-revalidate
+
+- свежий снимок (моложе ttl) отдаётся сразу;
+- устаревший (моложе ttl + stale_ttl) отдаётся сразу, а в фоне запускается обновление;
+- при отсутствии снимка вызывающий ждёт загрузку.
+
+Одновременные запросы одного ключа разделяют одну загрузку (single-flight).
+С max_entries кэш ограничен по размеру: вытесняется давно не читавшийся ключ (LRU).
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """TTL-кэш снимков с фоновым обновлением и single-flight"""
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        max_entries: Optional[int] = None
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.max_entries = max_entries
+
+        # key -> {"value", "loaded_at", "version"}
+        self._entries: Dict[Hashable, Dict] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._version = 0
+
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0,
+            "evictions": 0,
+        }
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение по ключу (из кэша или через loader)"""
+        entry = self._entries.get(key)
+
+        if entry:
+            if self.max_entries:
+                # Порядок словаря — порядок использования
+                self._entries[key] = self._entries.pop(key)
+            age = self.clock() - entry["loaded_at"]
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return entry["value"]
+            if age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self._refresh(key, loader)
+                return entry["value"]
+
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+        return await asyncio.shield(self._refresh(key, loader))
+
+    def seed(self, key: Hashable, value: Any):
+        """
+        Положить значение, восстановленное извне (например, с диска).
+
+        Запись сразу считается устаревшей: первый же get отдаст её без
+        ожидания и запустит фоновое обновление.
+        """
+        self._version += 1
+        self._entries[key] = {
+            "value": value,
+            "loaded_at": self.clock() - self.ttl,
+            "version": self._version,
+        }
+
+    def entry(self, key: Hashable) -> Optional[Dict]:
+        """Текущая запись (value, loaded_at, version) без загрузки"""
+        return self._entries.get(key)
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Возраст снимка в секундах"""
+        entry = self._entries.get(key)
+        return self.clock() - entry["loaded_at"] if entry else None
+
+    def invalidate(self, key: Hashable = None):
+        """Сбросить ключ (или весь кэш)"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Запустить загрузку, если она ещё не идёт"""
+        task = self._inflight.get(key)
+        if task:
+            return task
+
+        task = asyncio.create_task(self._load(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        finally:
+            self._inflight.pop(key, None)
+
+        self._version += 1
+        self._entries.pop(key, None)
+        self._entries[key] = {
+            "value": value,
+            "loaded_at": self.clock(),
+            "version": self._version,
+        }
+        if self.max_entries:
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+                self.stats["evictions"] += 1
+        self.stats["refreshes"] += 1
+        return value
+
+    def _on_done(self, task: asyncio.Task):
+        """Ошибки фоновых обновлений не должны теряться"""
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc:
+            self.stats["errors"] += 1
+            logger.error(f"Snapshot refresh error: {exc}")
+
+    def format_stats(self) -> str:
+        """Счётчики для админов"""
+        s = self.stats
+        lookups = s["hits"] + s["stale_hits"] + s["misses"] + s["coalesced"]
+        hit_rate = (s["hits"] + s["stale_hits"]) / lookups * 100 if lookups else 0
+
+        lines = [
+            f"  ✅ Попадания: {s['hits']}",
+            f"  🕓 Устаревшие (фоновое обновление): {s['stale_hits']}",
+            f"  ❌ Промахи: {s['misses']}",
+            f"  🔗 Объединённые запросы: {s['coalesced']}",
+            f"  🔄 Загрузок: {s['refreshes']}, ошибок: {s['errors']}",
+            f"  📈 Hit rate: {hit_rate:.0f}%",
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,249 @@
+"""
+Реестр клиентов
+
+Собирает клиентов из clients/<статус>/<id>/client.json и таблицы clients
+в индексы по id, домену, telegram_chat_id и portal_token — поиск
+клиента по чату или токену стоит один dict lookup.
+
+Обновление ленивое:
+- файлы — по mtime, не чаще раза в file_check_interval секунд и только
+  при обращении к реестру;
+- база — дельтой по updated_at (refresh_db из JobQueue) и раз в
+  full_reload_interval секунд целиком: удалённые строки дельта не
+  увидит, как и строки, закоммиченные с updated_at старше курсора.
+
+Поля из базы приоритетнее полей из client.json.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLIENTS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "clients")
+
+FIELDS = ("name", "domain", "type", "status", "telegram_chat_id", "portal_token")
+
+
+def normalize_domain(domain: Optional[str]) -> Optional[str]:
+    """'https://www.Site.ru/' -> 'site.ru'"""
+    if not domain:
+        return None
+    domain = domain.strip().lower()
+    for prefix in ("https://", "http://"):
+        if domain.startswith(prefix):
+            domain = domain[len(prefix):]
+    domain = domain.split("/", 1)[0]
+    return domain[4:] if domain.startswith("www.") else domain
+
+
+class ClientRegistry:
+    """Индексы клиентов в памяти"""
+
+    def __init__(
+        self,
+        root: str = CLIENTS_ROOT,
+        db=None,
+        file_check_interval: float = 5,
+        full_reload_interval: float = 3600,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.root = root
+        self.db = db
+        self.file_check_interval = file_check_interval
+        self.full_reload_interval = full_reload_interval
+        self.clock = clock
+
+        self._files: Dict[str, Dict] = {}  # id -> поля из client.json
+        self._rows: Dict[str, Dict] = {}   # id -> поля из clients
+        self._mtimes: Dict[str, float] = {}  # путь -> mtime (каталоги и client.json)
+        self._checked_at = 0.0
+        self._db_cursor: Optional[str] = None
+        # id строк с updated_at == курсору: gte вернёт их снова
+        self._cursor_ids: Set[str] = set()
+        self._full_at: Optional[float] = None
+
+        self.by_id: Dict[str, Dict] = {}
+        self.by_domain: Dict[str, Dict] = {}
+        self.by_chat: Dict[int, Dict] = {}
+        self.by_token: Dict[str, Dict] = {}
+
+        self.stats = {
+            "file_loads": 0,
+            "db_refreshes": 0,
+            "db_full_reloads": 0,
+            "db_rows": 0,
+        }
+
+    def _scan(self) -> Dict[str, float]:
+        """mtime каталогов статусов, каталогов клиентов и client.json"""
+        mtimes = {}
+        if not os.path.isdir(self.root):
+            return mtimes
+        for status in os.listdir(self.root):
+            status_dir = os.path.join(self.root, status)
+            if not os.path.isdir(status_dir):
+                continue
+            mtimes[status_dir] = os.stat(status_dir).st_mtime
+            for slug in os.listdir(status_dir):
+                path = os.path.join(status_dir, slug, "client.json")
+                try:
+                    mtimes[path] = os.stat(path).st_mtime
+                except (FileNotFoundError, NotADirectoryError):
+                    pass
+        return mtimes
+
+    def load_files(self):
+        """Перечитать все client.json"""
+        mtimes = self._scan()
+        files = {}
+        for path in mtimes:
+            if not path.endswith("client.json"):
+                continue
+            slug = os.path.basename(os.path.dirname(path))
+            try:
+                with open(path, encoding="utf-8") as f:
+                    config = json.load(f)
+            except ValueError as e:
+                logger.error(f"Invalid {path}: {e}")
+                continue
+            files[slug] = {"id": slug, **{k: config.get(k) for k in FIELDS}}
+
+        self._files = files
+        self._mtimes = mtimes
+        self._checked_at = self.clock()
+        self.stats["file_loads"] += 1
+        self._reindex()
+
+    def check_files(self):
+        """Перечитать файлы, если что-то изменилось (с ограничением частоты)"""
+        if self.clock() - self._checked_at < self.file_check_interval:
+            return
+        self._checked_at = self.clock()
+        if self._scan() != self._mtimes:
+            self.load_files()
+
+    async def refresh_db(self, full: bool = False) -> int:
+        """Догрузить изменённые строки clients; возвращает число изменённых"""
+        if self.db is None:
+            return 0
+
+        full = (
+            full
+            or self._full_at is None
+            or self.clock() - self._full_at >= self.full_reload_interval
+        )
+        query = self.db.table("clients").select("id,updated_at," + ",".join(FIELDS))
+        if self._db_cursor and not full:
+            # gte, а не gt: строки с тем же updated_at, закоммиченные после
+            # прошлого запроса, иначе потерялись бы
+            query = query.gte("updated_at", self._db_cursor)
+        result = await query.order("updated_at").execute()
+        rows = result.data or []
+
+        if full:
+            changed = self._replace_rows(rows)
+            self._full_at = self.clock()
+            self.stats["db_full_reloads"] += 1
+        else:
+            changed = self._apply_rows(rows)
+
+        self.stats["db_refreshes"] += 1
+        self.stats["db_rows"] += changed
+        if changed:
+            self._reindex()
+        return changed
+
+    def _apply_rows(self, rows: List[Dict]) -> int:
+        """Дельта: новые и изменённые строки"""
+        changed = 0
+        for row in rows:
+            updated_at = row.get("updated_at")
+            if updated_at and updated_at == self._db_cursor and row["id"] in self._cursor_ids:
+                continue
+            self._rows[row["id"]] = {k: row.get(k) for k in ("id",) + FIELDS}
+            changed += 1
+            self._advance_cursor(row)
+        return changed
+
+    def _replace_rows(self, rows: List[Dict]) -> int:
+        """Полная загрузка: строки, которых больше нет в базе, уходят из реестра"""
+        fresh = {row["id"]: {k: row.get(k) for k in ("id",) + FIELDS} for row in rows}
+        changed = sum(1 for client_id, row in fresh.items() if self._rows.get(client_id) != row)
+        removed = self._rows.keys() - fresh.keys()
+        if removed:
+            logger.info(f"Clients removed from DB: {len(removed)}")
+
+        self._rows = fresh
+        self._db_cursor = None
+        self._cursor_ids = set()
+        for row in rows:
+            self._advance_cursor(row)
+        return changed + len(removed)
+
+    def _advance_cursor(self, row: Dict):
+        updated_at = row.get("updated_at")
+        if not updated_at:
+            return
+        if not self._db_cursor or updated_at > self._db_cursor:
+            self._db_cursor = updated_at
+            self._cursor_ids = {row["id"]}
+        elif updated_at == self._db_cursor:
+            self._cursor_ids.add(row["id"])
+
+    async def load(self):
+        """Полная загрузка при старте"""
+        self.load_files()
+        await self.refresh_db()
+
+    async def run_job(self, context):
+        """Колбэк JobQueue"""
+        try:
+            await self.refresh_db()
+        except Exception as e:
+            logger.error(f"Client registry refresh error: {e}")
+
+    def _reindex(self):
+        by_id: Dict[str, Dict] = {}
+        for client_id in self._files.keys() | self._rows.keys():
+            record = dict(self._files.get(client_id) or {"id": client_id})
+            for key, value in (self._rows.get(client_id) or {}).items():
+                if value is not None:
+                    record[key] = value
+            by_id[client_id] = record
+
+        by_domain, by_chat, by_token = {}, {}, {}
+        for record in by_id.values():
+            domain = normalize_domain(record.get("domain"))
+            if domain:
+                by_domain[domain] = record
+            if record.get("telegram_chat_id"):
+                by_chat[int(record["telegram_chat_id"])] = record
+            if record.get("portal_token"):
+                by_token[record["portal_token"]] = record
+
+        # Подмена целиком: читатели не видят полуобновлённых индексов
+        self.by_id, self.by_domain, self.by_chat, self.by_token = by_id, by_domain, by_chat, by_token
+
+    def get(self, client_id: str) -> Optional[Dict]:
+        self.check_files()
+        return self.by_id.get(client_id)
+
+    def for_domain(self, domain: str) -> Optional[Dict]:
+        self.check_files()
+        return self.by_domain.get(normalize_domain(domain))
+
+    def for_chat(self, chat_id: int) -> Optional[Dict]:
+        self.check_files()
+        return self.by_chat.get(chat_id)
+
+    def for_token(self, token: str) -> Optional[Dict]:
+        self.check_files()
+        return self.by_token.get(token)
+
+    def counts(self) -> Tuple[int, int]:
+        """(клиентов, привязанных чатов)"""
+        return len(self.by_id), len(self.by_chat)
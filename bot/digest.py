@@ -0,0 +1,183 @@
+"""
+Утренний дайджест задач
+
+Рассылается из самого бота через JobQueue по расписанию каждого чата
+(время + часовой пояс), данные берутся из тёплого кэша анализа.
+Чаты с одинаковым расписанием обслуживает одна задача, сообщения уходят
+пачкой с ограничением частоты (лимит Telegram на рассылку ~30 сообщений/с).
+
+Формат DIGEST_SCHEDULE: записи через запятую, `chat_id[@HH:MM[@Часовой/Пояс]]`,
+например `161261562@10:30@Europe/Moscow,161261652`.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time as dt_time
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import ContextTypes, JobQueue
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def parse_schedule(value: str, default_time: str, default_tz: str) -> List[Dict]:
+    """Разобрать DIGEST_SCHEDULE в список {"chat_id", "time", "tz"}"""
+    entries = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split("@")
+        chat_id = int(parts[0])
+        hh, mm = (parts[1] if len(parts) > 1 and parts[1] else default_time).split(":")
+        tz = ZoneInfo(parts[2] if len(parts) > 2 and parts[2] else default_tz)
+        entries.append({"chat_id": chat_id, "time": dt_time(int(hh), int(mm), tzinfo=tz), "tz": tz})
+    return entries
+
+
+def digest_tasks(analysis: Dict, today: date) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Просроченные и задачи на сегодня из готового анализа.
+
+    «Сегодня» — в поясе чатов, а список overdue анализа посчитан по дате
+    сервера, поэтому задачи отбираются заново из всех активных.
+    """
+    day = today.isoformat()
+    overdue: Dict[str, Dict] = {}
+    due_today: Dict[str, Dict] = {}
+    for tasks in (*analysis["by_assignee"].values(), analysis["no_assignee"]):
+        for task in tasks:
+            due_on = task.get("due_on")
+            if not due_on or due_on > day:
+                continue
+            (due_today if due_on == day else overdue).setdefault(task["gid"], task)
+
+    return (
+        sorted(overdue.values(), key=lambda t: t["due_on"]),
+        list(due_today.values())
+    )
+
+
+def format_digest(overdue: List[Dict], today_tasks: List[Dict]) -> str:
+    """Текст дайджеста"""
+    msg = ["🌅 *Доброе утро!*", ""]
+
+    if overdue:
+        msg.append("🔴 *Просрочено:*")
+        for t in overdue[:5]:
+            a = t["assignee"].get("name", "—") if t.get("assignee") else "—"
+            msg.append(f"• {t.get('name', 'Без названия')} ({a})")
+        if len(overdue) > 5:
+            msg.append(f"  ... и ещё {len(overdue) - 5}")
+        msg.append("")
+
+    if today_tasks:
+        msg.append("📋 *На сегодня:*")
+        for t in today_tasks[:10]:
+            a = t["assignee"].get("name", "—") if t.get("assignee") else "—"
+            msg.append(f"• {t.get('name', 'Без названия')} ({a})")
+        if len(today_tasks) > 10:
+            msg.append(f"  ... и ещё {len(today_tasks) - 10}")
+    else:
+        msg.append("✨ На сегодня задач нет!")
+
+    msg.extend(["", "_Хорошего дня!_ 🚀"])
+    return "\n".join(msg)
+
+
+class DigestScheduler:
+    """Расписание и рассылка утренних дайджестов"""
+
+    def __init__(
+        self,
+        analyzer,
+        entries: List[Dict],
+        days: Tuple[int, ...],
+        rate: float = 25,
+        clock: Callable[[ZoneInfo], datetime] = datetime.now
+    ):
+        self.analyzer = analyzer
+        self.entries = entries
+        self.days = days
+        self.bucket = TokenBucket(rate, rate)
+        self.clock = clock
+
+        self.stats = {
+            "runs": 0,
+            "sent": 0,
+            "failed": 0,
+        }
+
+    def groups(self) -> Dict[Tuple[dt_time, ZoneInfo], List[int]]:
+        """Чаты с одинаковым временем и поясом — одна пачка"""
+        # Пояс — отдельно в ключе: у time с ZoneInfo нет смещения без даты,
+        # и 09:00 в Москве равно 09:00 во Владивостоке
+        groups: Dict[Tuple[dt_time, ZoneInfo], List[int]] = {}
+        for entry in self.entries:
+            groups.setdefault((entry["time"], entry["tz"]), []).append(entry["chat_id"])
+        return groups
+
+    def schedule(self, job_queue: JobQueue):
+        """Зарегистрировать задачи в JobQueue"""
+        for (at, tz), chat_ids in self.groups().items():
+            job_queue.run_daily(
+                self.run_job,
+                time=at,
+                days=self.days,
+                data={"chat_ids": chat_ids, "tz": tz},
+                name=f"digest {at.isoformat()} {tz.key}"
+            )
+            logger.info(f"Digest scheduled at {at.isoformat()} {tz.key} for {len(chat_ids)} chats")
+
+    async def build(self, today: date) -> str:
+        """Дайджест на дату (из кэша анализа)"""
+        # Только из возвращённого снимка: полная перезагрузка проекта может
+        # очистить живые индексы, пока дайджест собирается
+        analysis = await self.analyzer.analyze_all()
+        overdue, today_tasks = digest_tasks(analysis, today)
+        return format_digest(overdue, today_tasks)
+
+    async def run_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Колбэк JobQueue"""
+        data = context.job.data
+        await self.run(context.bot, data["chat_ids"], data["tz"])
+
+    async def run(self, bot, chat_ids: List[int], tz: ZoneInfo, today: Optional[date] = None):
+        """Собрать дайджест на «сегодня» в поясе чатов и разослать"""
+        self.stats["runs"] += 1
+        today = today or self.clock(tz).date()
+        try:
+            text = await self.build(today)
+        except Exception as e:
+            logger.error(f"Digest build error: {e}")
+            self.stats["failed"] += len(chat_ids)
+            return
+        await self.send(bot, chat_ids, text)
+
+    async def send(self, bot, chat_ids: List[int], text: str):
+        """Разослать текст пачкой с ограничением частоты"""
+        for chat_id in chat_ids:
+            await self.bucket.acquire()
+            for attempt in range(3):
+                try:
+                    await bot.send_message(chat_id, text, parse_mode="Markdown")
+                    self.stats["sent"] += 1
+                    break
+                except RetryAfter as e:
+                    delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                    self.bucket.pause(delay)
+                    await asyncio.sleep(delay)
+                except Forbidden:
+                    logger.warning(f"Digest: chat {chat_id} blocked the bot")
+                    self.stats["failed"] += 1
+                    break
+                except TelegramError as e:
+                    logger.error(f"Digest send to {chat_id} failed: {e}")
+                    self.stats["failed"] += 1
+                    break
+            else:
+                self.stats["failed"] += 1
@@ -12,16 +12,27 @@ Mini App для клиентов + Анализатор задач для ком
     /workload - Кто перегружен
     /tasks - Задачи без сроков/исполнителей
     /overdue - Просроченные задачи
+    /digest - Утренний дайджест (рассылается по расписанию)
+    /cache - Статистика кэша анализа
+    /roles - Перечитать роли из portal_users
+    /stats - Время обработки (p50/p95/p99)
+    /trend - Динамика загрузки по неделям
 """
 
 import os
 import json
+import time
+import asyncio
+import secrets
+import functools
+import itertools
 import logging
-import httpx
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from typing import Optional, List, Dict, Tuple, Union
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -29,6 +40,26 @@ from telegram.ext import (
     ContextTypes,
 )
 
+from asana_client import (
+    ASANA_HTTP2, ASANA_MAX_CONNECTIONS, ASANA_WORKSPACE, AsanaClient, AsanaError, SearchPagingError,
+    create_http_client,
+)
+from cache import SnapshotCache
+from sync import TaskSync
+from workload_index import WorkloadIndex, merge_snapshots
+from update_processor import PerChatUpdateProcessor
+from digest import DigestScheduler, parse_schedule
+from notifications import NotificationDispatcher
+from position_summary import PositionSummaries, format_summary
+from position_changes import PositionChangeDetector
+from client_registry import ClientRegistry
+from roles import RoleCache, STAFF_ROLES
+from telemetry import telemetry
+from textutil import split_message
+from task_pages import TaskPages, NOOP, PREFIX as PAGE_PREFIX
+from warm_start import SnapshotStore, SupabaseSnapshotStore
+from workload_history import WorkloadHistory, format_trend
+
 # ═══════════════════════════════════════════════════════════════
 # КОНФИГУРАЦИЯ
 # ═══════════════════════════════════════════════════════════════
@@ -38,12 +69,80 @@ WEBAPP_URL = os.environ.get("WEBAPP_URL", "https://artvision-portal.vercel.app/w
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "")
 
-# Asana
+# Asana (воркспейс, HTTP-пул и лимиты на токен — в asana_client.py)
 ASANA_TOKEN = os.environ.get("ASANA_TOKEN", "")
-ASANA_WORKSPACE = os.environ.get("ASANA_WORKSPACE", "860693669973770")
 ASANA_PROJECT = os.environ.get("ASANA_PROJECT", "1212305892582815")  # Задачи - Artvision
 
-# Админы (Telegram user IDs)
+# Проекты для /analyze и /workload: gid через запятую или "all" — все проекты воркспейса
+ASANA_PROJECTS = [x.strip() for x in os.environ.get("ASANA_PROJECTS", ASANA_PROJECT).split(",") if x.strip()]
+ASANA_PROJECT_CONCURRENCY = int(os.environ.get("ASANA_PROJECT_CONCURRENCY", "4"))
+ASANA_PROJECT_TIMEOUT = float(os.environ.get("ASANA_PROJECT_TIMEOUT", "60"))
+ASANA_PROJECTS_TTL = float(os.environ.get("ASANA_PROJECTS_TTL", "3600"))  # как часто перечитывать список
+
+# Узкие отчёты (/overdue, /tasks, /nodue) при холодном кэше — через поиск Asana
+# вместо загрузки проектов целиком (поиск доступен на платных планах)
+ASANA_SEARCH = os.environ.get("ASANA_SEARCH", "1") == "1"
+ASANA_SEARCH_MAX_PROJECTS = int(os.environ.get("ASANA_SEARCH_MAX_PROJECTS", "20"))
+
+# Кэш анализа: свежий снимок (сек) + сколько ещё отдавать устаревший, обновляя в фоне
+ANALYSIS_TTL = float(os.environ.get("ANALYSIS_TTL", "60"))
+ANALYSIS_STALE_TTL = float(os.environ.get("ANALYSIS_STALE_TTL", "600"))
+
+# Списки задач: задач на странице и сколько снимков списков держать для листания
+TASK_PAGE_SIZE = int(os.environ.get("TASK_PAGE_SIZE", "15"))
+TASK_PAGES_MAX = int(os.environ.get("TASK_PAGES_MAX", "200"))
+
+# Снимок задач и анализа для тёплого старта после рестарта. С Supabase
+# снимок хранится в таблице bot_snapshots (диск Render эфемерный), без
+# него — в этом SQLite-файле (пусто — отключён)
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", ".cache/bot-snapshot.sqlite3")
+# Не чаще раза в столько секунд на проект (изменения за паузу — одним сохранением)
+SNAPSHOT_SAVE_INTERVAL = float(os.environ.get("SNAPSHOT_SAVE_INTERVAL", "300"))
+
+# Утренний дайджест: chat_id[@HH:MM[@Часовой/Пояс]] через запятую
+DIGEST_SCHEDULE = os.environ.get("DIGEST_SCHEDULE", "161261652,161261562")
+DIGEST_TIME = os.environ.get("DIGEST_TIME", "10:30")
+DIGEST_TZ = os.environ.get("DIGEST_TZ", "Europe/Moscow")
+DIGEST_DAYS = tuple(int(x) for x in os.environ.get("DIGEST_DAYS", "1,2,3,4,5").split(",") if x)  # 0 — воскресенье
+DIGEST_RATE = float(os.environ.get("DIGEST_RATE", "25"))  # сообщений в секунду
+
+# Уведомления из таблицы notifications
+NOTIFY_INTERVAL = float(os.environ.get("NOTIFY_INTERVAL", "30"))  # сек между пачками
+NOTIFY_BATCH = int(os.environ.get("NOTIFY_BATCH", "500"))
+NOTIFY_RATE = float(os.environ.get("NOTIFY_RATE", "30"))  # сообщений в секунду на бота
+
+# Сводка позиций (/positions): TTL кэша (сек) и сколько клиентов держать в памяти
+POSITIONS_TTL = float(os.environ.get("POSITIONS_TTL", "600"))
+POSITIONS_CACHE_SIZE = int(os.environ.get("POSITIONS_CACHE_SIZE", "256"))
+
+# Уведомления об изменении позиций: как часто проверять новые снимки и порог просадки
+POSITION_CHANGE_INTERVAL = float(os.environ.get("POSITION_CHANGE_INTERVAL", "3600"))
+POSITION_DROP_THRESHOLD = int(os.environ.get("POSITION_DROP_THRESHOLD", "5"))
+
+# Реестр клиентов: как часто догружать изменения таблицы clients (сек)
+CLIENTS_REFRESH_INTERVAL = float(os.environ.get("CLIENTS_REFRESH_INTERVAL", "300"))
+# ... и как часто перечитывать её целиком (удалённые клиенты)
+CLIENTS_FULL_RELOAD_INTERVAL = float(os.environ.get("CLIENTS_FULL_RELOAD_INTERVAL", "3600"))
+
+# История загрузки для /trend: как часто обновлять строки текущего дня, сколько недель показывать
+WORKLOAD_HISTORY_INTERVAL = float(os.environ.get("WORKLOAD_HISTORY_INTERVAL", "3600"))
+TREND_WEEKS = int(os.environ.get("TREND_WEEKS", "12"))
+
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+BOT_CONCURRENT_UPDATES = int(os.environ.get("BOT_CONCURRENT_UPDATES", "16"))  # 1 — последовательно
+BOT_MAX_PENDING_UPDATES = int(os.environ.get("BOT_MAX_PENDING_UPDATES", "256"))
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")  # публичный адрес; пусто — не регистрировать в Telegram
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "") or secrets.token_urlsafe(32)
+PORT = int(os.environ.get("PORT", "8080"))
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")  # экспорт Prometheus в webhook-режиме; пусто — выключен
+
+# Роли из portal_users: как часто перечитывать и сколько помнить неизвестных (сек)
+ROLES_TTL = float(os.environ.get("ROLES_TTL", "300"))
+ROLES_NEGATIVE_TTL = float(os.environ.get("ROLES_NEGATIVE_TTL", "60"))
+
+# Админы (Telegram user IDs), действуют всегда — даже без базы
 ADMIN_IDS = [int(x) for x in os.environ.get("ADMIN_IDS", "161261562").split(",") if x]
 # Кирилл: 161261562
 
@@ -55,145 +154,306 @@ logger = logging.getLogger(__name__)
 
 
 # ═══════════════════════════════════════════════════════════════
-# ASANA API
+# АНАЛИЗАТОР ЗАДАЧ
 # ═══════════════════════════════════════════════════════════════
 
-class AsanaClient:
-    """Клиент для работы с Asana API"""
+# Список анализа -> фильтры поиска Asana на дату (остальное считается по полному снимку)
+SEARCH_FILTERS = {
+    "overdue": lambda today: {"due_on.before": today.isoformat()},
+    "no_due_date": lambda today: {"due_on": "null"},
+    "no_assignee": lambda today: {"assignee.any": "null"},
+}
+
+
+class TaskAnalyzer:
+    """Анализатор загрузки и задач"""
+    
+    def __init__(
+        self,
+        asana: AsanaClient,
+        cache: Optional[SnapshotCache] = None,
+        snapshots: Optional[Union[SnapshotStore, SupabaseSnapshotStore]] = None
+    ):
+        self.asana = asana
+        self.cache = cache or SnapshotCache(ANALYSIS_TTL, ANALYSIS_STALE_TTL)
+        self.snapshot_store = snapshots
+        self.syncs: Dict[str, TaskSync] = {}
+        self.indexes: Dict[str, WorkloadIndex] = {}
+        self.projects: Dict[str, str] = {}
+        self._projects_loaded_at = 0.0
+        self._versions = itertools.count(1)
+        self._merged: Optional[Dict] = None
+        self._snapshots: Dict[str, Tuple] = {}
+        # Списки, для которых поиск не подошёл (400/402) — больше не пробуем
+        self._search_disabled: set = set()
+        # Отложенные сохранения снимков: project_id -> задача, время последнего
+        self._persist_tasks: Dict[str, asyncio.Task] = {}
+        self._persisted_at: Dict[str, float] = {}
     
-    BASE_URL = "https://app.asana.com/api/1.0"
+    async def get_analysis(self, project_id: str = ASANA_PROJECT) -> Dict:
+        """Анализ из кэша (обновляется в фоне, когда устаревает)"""
+        return await self.cache.get(
+            project_id,
+            lambda: self.analyze_workload(project_id)
+        )
     
-    def __init__(self, token: str):
-        self.token = token
-        self.headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+    def is_warm(self) -> bool:
+        """Все проекты уже есть в кэше"""
+        return bool(self.projects) and all(
+            self.cache.entry(gid) is not None for gid in self.projects
+        )
     
-    async def get_tasks(
-        self, 
-        project_id: str = None,
-        assignee: str = None,
-        completed: bool = False,
-        opt_fields: str = "name,due_on,assignee,assignee.name,completed,created_at,notes"
-    ) -> List[Dict]:
-        """Получить задачи"""
-        params = {
-            "opt_fields": opt_fields,
-            "completed_since": "now" if not completed else None
-        }
+    async def list_projects(self) -> Dict[str, str]:
+        """Проекты для анализа: gid -> название"""
+        if self.projects and time.monotonic() - self._projects_loaded_at < ASANA_PROJECTS_TTL:
+            return self.projects
         
-        if project_id:
-            params["project"] = project_id
-        if assignee:
-            params["assignee"] = assignee
-            params["workspace"] = ASANA_WORKSPACE
-            
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/tasks",
-                headers=self.headers,
-                params={k: v for k, v in params.items() if v}
+        if ASANA_PROJECTS == ["all"]:
+            found = await self.asana.get_projects(ASANA_WORKSPACE)
+            projects = {p["gid"]: p.get("name") or p["gid"] for p in found}
+        else:
+            found = await asyncio.gather(
+                *(self.asana.get_project(gid) for gid in ASANA_PROJECTS),
+                return_exceptions=True
             )
-            data = resp.json()
-            return data.get("data", [])
-    
-    async def get_users(self, workspace_id: str) -> List[Dict]:
-        """Получить пользователей воркспейса"""
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/workspaces/{workspace_id}/users",
-                headers=self.headers,
-                params={"opt_fields": "name,email"}
+            projects = {
+                gid: (p.get("name") if isinstance(p, dict) else None) or gid
+                for gid, p in zip(ASANA_PROJECTS, found)
+            }
+        
+        self.projects = projects
+        self._projects_loaded_at = time.monotonic()
+        return projects
+    
+    async def analyze_all(self) -> Dict:
+        """
+        Анализ по всем проектам.
+        
+        Проекты грузятся параллельно (не больше ASANA_PROJECT_CONCURRENCY
+        одновременно, каждый с таймаутом). Упавшие проекты попадают в отчёт
+        с ошибкой, остальные анализируются как обычно.
+        """
+        projects = await self.list_projects()
+        semaphore = asyncio.Semaphore(ASANA_PROJECT_CONCURRENCY)
+        
+        async def analyze_project(gid: str) -> Dict:
+            async with semaphore:
+                return await asyncio.wait_for(self.get_analysis(gid), ASANA_PROJECT_TIMEOUT)
+        
+        results = await asyncio.gather(
+            *(analyze_project(gid) for gid in projects),
+            return_exceptions=True
+        )
+        
+        snapshots = []
+        breakdown = []
+        version = []
+        for (gid, name), result in zip(projects.items(), results):
+            if isinstance(result, BaseException):
+                error = "таймаут" if isinstance(result, asyncio.TimeoutError) else str(result)
+                logger.error(f"Project {gid} analyze error: {error}")
+                breakdown.append({"gid": gid, "name": name, "error": error})
+                version.append((gid, error))
+                continue
+            snapshots.append(result)
+            breakdown.append({
+                "gid": gid,
+                "name": name,
+                "total_active": result["total_active"],
+                "overdue": len(result["overdue"]),
+                "no_due": len(result["no_due_date"])
+            })
+            version.append((gid, result["version"]))
+        
+        if not snapshots:
+            raise RuntimeError("не удалось загрузить ни один проект")
+        
+        # Те же снимки проектов — тот же объединённый анализ
+        version = tuple(version)
+        if self._merged and self._merged["version"] == version:
+            return self._merged
+        
+        with telemetry.timer("analyze_seconds", step="merge"):
+            analysis = merge_snapshots(snapshots)
+        restored = [s["restored_at"] for s in snapshots if s.get("restored_at")]
+        if restored:
+            analysis["restored_at"] = min(restored)
+        analysis["projects"] = breakdown
+        analysis["version"] = version
+        self._merged = analysis
+        return analysis
+    
+    async def search_list(self, key: str) -> Optional[List[Dict]]:
+        """
+        Планировщик узких отчётов.
+        
+        Пока полного снимка нет, список (просроченные, без срока, без
+        исполнителя) запрашивается поиском Asana с фильтрами на стороне
+        сервера — приходят только нужные задачи, а не проекты целиком.
+        Когда снимок тёплый (или восстановлен с диска), отчёт дешевле
+        собрать из него — тогда и при любой ошибке поиска возвращается
+        None, и вызывающий строит отчёт по полному снимку.
+        """
+        if not ASANA_SEARCH or key not in SEARCH_FILTERS or key in self._search_disabled:
+            return None
+        if self.is_warm():
+            return None
+        
+        try:
+            projects = await self.list_projects()
+            if len(projects) > ASANA_SEARCH_MAX_PROJECTS:
+                return None
+            return await self.cache.get(
+                ("search", key),
+                lambda: self._search(key, list(projects), date.today())
             )
-            data = resp.json()
-            return data.get("data", [])
+        except SearchPagingError as e:
+            # Массовый импорт никуда не денется — дальше строим по снимку
+            logger.warning(f"Asana search for {key} incomplete, using full snapshot: {e}")
+            self._search_disabled.add(key)
+            return None
+        except AsanaError as e:
+            if e.status in (400, 402):
+                # 402 — поиск не входит в план, 400 — фильтр не поддерживается
+                logger.warning(f"Asana search unavailable for {key}: {e}")
+                self._search_disabled.update(SEARCH_FILTERS if e.status == 402 else (key,))
+            else:
+                logger.error(f"Asana search error for {key}: {e}")
+            return None
     
-    async def search_tasks(
-        self,
-        workspace_id: str,
-        text: str = None,
-        assignee: str = None,
-        due_on_before: str = None,
-        completed: bool = False
-    ) -> List[Dict]:
-        """Поиск задач"""
-        params = {
-            "opt_fields": "name,due_on,assignee,assignee.name,completed"
+    async def _search(self, key: str, projects: List[str], today: date) -> List[Dict]:
+        filters = {
+            **SEARCH_FILTERS[key](today),
+            "projects.any": ",".join(projects),
+            "completed": "false"
         }
-        if text:
-            params["text"] = text
-        if assignee:
-            params["assignee.any"] = assignee
-        if due_on_before:
-            params["due_on.before"] = due_on_before
-        if not completed:
-            params["completed"] = "false"
-            
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/workspaces/{workspace_id}/tasks/search",
-                headers=self.headers,
-                params=params
-            )
-            data = resp.json()
-            return data.get("data", [])
-
-
-# ═══════════════════════════════════════════════════════════════
-# АНАЛИЗАТОР ЗАДАЧ
-# ═══════════════════════════════════════════════════════════════
-
-class TaskAnalyzer:
-    """Анализатор загрузки и задач"""
+        tasks = []
+        with telemetry.timer("analyze_seconds", step="search"):
+            async for page in self.asana.iter_search_pages(ASANA_WORKSPACE, filters):
+                tasks.extend(page)
+        
+        # Порядок как в снимке: просроченные — по сроку, остальные — по созданию
+        if key == "overdue":
+            tasks.sort(key=lambda t: t.get("due_on") or "")
+        return tasks
     
-    def __init__(self, asana: AsanaClient):
-        self.asana = asana
+    def get_sync(self, project_id: str = ASANA_PROJECT) -> TaskSync:
+        """Синхронизатор проекта (создаётся при первом обращении)"""
+        if project_id not in self.syncs:
+            sync = TaskSync(self.asana, project_id)
+            index = WorkloadIndex()
+            sync.store.listeners.append(index)
+            self.syncs[project_id] = sync
+            self.indexes[project_id] = index
+        return self.syncs[project_id]
     
-    async def analyze_workload(self) -> Dict:
+    async def analyze_workload(self, project_id: str = ASANA_PROJECT) -> Dict:
         """Анализ загрузки команды"""
-        tasks = await self.asana.get_tasks(project_id=ASANA_PROJECT)
+        # Подтягиваем только изменения с прошлого раза — индекс
+        # обновляется по каждой изменённой задаче
+        sync = self.get_sync(project_id)
+        with telemetry.timer("analyze_seconds", step="sync"):
+            await sync.refresh()
+        
+        # Ничего не изменилось — тот же снимок (и те же готовые отчёты)
+        key = (sync.store.version, date.today())
+        previous = self._snapshots.get(project_id)
+        if previous and previous[0] == key:
+            return previous[1]
         
-        # Группируем по исполнителям
-        by_assignee = {}
-        no_assignee = []
-        no_due_date = []
-        overdue = []
+        with telemetry.timer("analyze_seconds", step="snapshot"):
+            analysis = self.indexes[project_id].snapshot()
+        analysis["version"] = next(self._versions)
+        self._snapshots[project_id] = (key, analysis)
         
-        today = datetime.now().date()
+        if self.snapshot_store:
+            self._schedule_persist(project_id)
+        return analysis
+    
+    def _schedule_persist(self, project_id: str):
+        """
+        Сохранить снимок в фоне, не задерживая ответ.
         
-        for task in tasks:
-            if task.get("completed"):
+        Не чаще раза в SNAPSHOT_SAVE_INTERVAL на проект: пока сохранение
+        ждёт своей очереди, новые версии анализа не ставят ещё одно — уйдёт
+        последняя на момент записи.
+        """
+        if project_id in self._persist_tasks:
+            return
+        self._persist_tasks[project_id] = asyncio.create_task(self._persist_later(project_id))
+    
+    async def _persist_later(self, project_id: str):
+        try:
+            last = self._persisted_at.get(project_id)
+            if last is not None:
+                wait = last + SNAPSHOT_SAVE_INTERVAL - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            # Изменения во время записи поставят следующее сохранение
+            del self._persist_tasks[project_id]
+            await self._save_current(project_id)
+        finally:
+            if self._persist_tasks.get(project_id) is asyncio.current_task():
+                del self._persist_tasks[project_id]
+    
+    async def _save_current(self, project_id: str):
+        self._persisted_at[project_id] = time.monotonic()
+        await self._persist(project_id, self.syncs[project_id], self._snapshots[project_id][1])
+    
+    async def flush_snapshots(self):
+        """Записать отложенные сохранения сразу (при остановке)"""
+        pending = list(self._persist_tasks)
+        for project_id in pending:
+            self._persist_tasks.pop(project_id).cancel()
+        await asyncio.gather(*(self._save_current(gid) for gid in pending))
+    
+    async def _persist(self, project_id: str, sync: TaskSync, analysis: Dict):
+        """Сохранить снимок проекта для тёплого старта (ошибки не мешают анализу)"""
+        try:
+            # Сериализация и сжатие — в потоке хранилища; здесь только копии
+            await self.snapshot_store.save(
+                project_id,
+                self.projects.get(project_id, project_id),
+                sync.sync_token,
+                list(sync.store.tasks()),
+                dict(analysis)
+            )
+        except Exception as e:
+            logger.error(f"Snapshot save error for project {project_id}: {e}")
+    
+    async def restore(self) -> int:
+        """
+        Поднять сохранённые снимки: задачи и sync-токены — в синхронизаторы,
+        анализ — в кэш как устаревший (отдаётся сразу, обновляется в фоне).
+        """
+        if not self.snapshot_store:
+            return 0
+        
+        names: Dict[str, str] = {}
+        for row in await self.snapshot_store.load():
+            gid = row["gid"]
+            if ASANA_PROJECTS != ["all"] and gid not in ASANA_PROJECTS:
                 continue
-                
-            assignee = task.get("assignee")
-            due_on = task.get("due_on")
             
-            # Без исполнителя
-            if not assignee:
-                no_assignee.append(task)
-            else:
-                name = assignee.get("name", "Unknown")
-                if name not in by_assignee:
-                    by_assignee[name] = []
-                by_assignee[name].append(task)
+            sync = self.get_sync(gid)
+            for task in row["tasks"]:
+                sync.store.upsert(task)
+            sync.sync_token = row["sync_token"]
             
-            # Без дедлайна
-            if not due_on:
-                no_due_date.append(task)
-            else:
-                # Просроченные
-                due = datetime.strptime(due_on, "%Y-%m-%d").date()
-                if due < today:
-                    overdue.append(task)
-        
-        return {
-            "by_assignee": by_assignee,
-            "no_assignee": no_assignee,
-            "no_due_date": no_due_date,
-            "overdue": overdue,
-            "total_active": len([t for t in tasks if not t.get("completed")])
-        }
+            analysis = row["analysis"]
+            analysis["version"] = next(self._versions)
+            analysis["restored_at"] = row["saved_at"]
+            self.cache.seed(gid, analysis)
+            names[gid] = row["name"] or gid
+        
+        # Список проектов берём из снимков, только если в них есть все
+        # настроенные; иначе (новый проект, несохранённый снимок, режим
+        # "all") list_projects перечитает его — восстановленные проекты
+        # всё равно отдадутся из кэша сразу
+        if ASANA_PROJECTS != ["all"] and all(gid in names for gid in ASANA_PROJECTS):
+            self.projects = {gid: names[gid] for gid in ASANA_PROJECTS}
+            self._projects_loaded_at = time.monotonic()
+        return len(names)
     
     def format_workload_report(self, analysis: Dict) -> str:
         """Форматирование отчёта о загрузке"""
@@ -223,48 +483,242 @@ class TaskAnalyzer:
         
         lines.append(f"\n📈 Всего активных: {analysis['total_active']}")
         
+        lines.extend(self.format_projects_breakdown(analysis))
+        
         return "\n".join(lines)
     
-    def format_tasks_list(self, tasks: List[Dict], title: str) -> str:
-        """Форматирование списка задач"""
-        if not tasks:
-            return f"✅ {title}: нет задач"
-        
-        lines = [f"📋 *{title}* ({len(tasks)})\n"]
+    def format_workload(self, analysis: Dict) -> str:
+        """Форматирование загрузки по специалистам"""
+        lines = ["👥 *Загрузка специалистов*\n"]
         
-        for i, task in enumerate(tasks[:15], 1):  # Максимум 15
-            name = task.get("name", "Без названия")[:40]
-            due = task.get("due_on", "без срока")
-            assignee = task.get("assignee", {})
-            who = assignee.get("name", "—") if assignee else "—"
+        for name, tasks in sorted(
+            analysis["by_assignee"].items(),
+            key=lambda x: -len(x[1])
+        ):
+            count = len(tasks)
+            bar = "█" * min(count, 15) + "░" * max(0, 15 - count)
+            emoji = "🔴" if count > 10 else "🟡" if count > 5 else "🟢"
+            lines.append(f"{emoji} *{name}*: {count}")
+            lines.append(f"  `{bar}`")
             
-            lines.append(f"{i}. {name}")
-            lines.append(f"   📅 {due} | 👤 {who}")
+            # Ближайшие дедлайны (задачи уже упорядочены по сроку)
+            upcoming = [t for t in tasks[:2] if t.get("due_on")]
+            if upcoming:
+                lines.append("  Ближайшее:")
+                for t in upcoming:
+                    lines.append(f"  • {t['name'][:30]} ({t['due_on']})")
+            lines.append("")
         
-        if len(tasks) > 15:
-            lines.append(f"\n... и ещё {len(tasks) - 15}")
+        lines.extend(self.format_projects_breakdown(analysis))
         
         return "\n".join(lines)
+    
+    def format_projects_breakdown(self, analysis: Dict) -> List[str]:
+        """Разбивка по проектам (если их несколько или какой-то не загрузился)"""
+        projects = analysis.get("projects", [])
+        if len(projects) < 2 and not any("error" in p for p in projects):
+            return []
+        
+        lines = ["\n🗂 *По проектам:*"]
+        for p in projects:
+            if "error" in p:
+                lines.append(f"  ⚠️ {p['name']}: не загружен ({p['error']})")
+            else:
+                lines.append(f"  • {p['name']}: {p['total_active']} активных, {p['overdue']} просрочено")
+        return lines
+
+
+# ═══════════════════════════════════════════════════════════════
+# ОТЧЁТЫ
+# ═══════════════════════════════════════════════════════════════
+
+class ReportRouter:
+    """
+    Единая точка для админских отчётов.
+    
+    Команды и кнопки получают один и тот же текст. Готовые тексты
+    кэшируются по версии снимка анализа, поэтому повторное нажатие не
+    форматирует отчёт заново, а новый снимок сбрасывает кэш.
+    
+    Списки задач фиксируются в TaskPages и листаются кнопками без
+    обращения к Asana.
+    """
+    
+    # report -> (сообщение о загрузке, заголовок списка или None)
+    REPORTS = {
+        "analyze": ("⏳ Анализирую задачи...", None),
+        "workload": ("⏳ Считаю загрузку...", None),
+        "no_assignee": ("⏳ Ищу задачи без исполнителя...", "Без исполнителя"),
+        "overdue": ("⏳ Ищу просроченные...", "🔥 Просроченные задачи"),
+        "no_due": ("⏳ Ищу задачи без срока...", "Без дедлайна"),
+    }
+    
+    # report -> ключ списка в анализе
+    LISTS = {
+        "no_assignee": "no_assignee",
+        "overdue": "overdue",
+        "no_due": "no_due_date",
+    }
+    
+    def __init__(self, analyzer: TaskAnalyzer, pages: Optional[TaskPages] = None):
+        self.analyzer = analyzer
+        self.pages = pages or TaskPages(TASK_PAGE_SIZE, TASK_PAGES_MAX)
+        self._version = None
+        # report -> текст отчёта или id снимка списка
+        self._rendered: Dict[str, str] = {}
+        # report -> (результат поиска, id снимка) для списков без полного анализа
+        self._searched: Dict[str, Tuple[List[Dict], str]] = {}
+    
+    def is_warm(self) -> bool:
+        """Есть ли снимок, который отдаётся без ожидания Asana"""
+        return self.analyzer.is_warm()
+    
+    async def render(self, report: str) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Текст отчёта для текущего снимка и кнопки под ним"""
+        # Узкий список при холодном кэше — поиском Asana, без полной загрузки
+        if report in self.LISTS:
+            tasks = await self.analyzer.search_list(self.LISTS[report])
+            if tasks is not None:
+                searched = self._searched.get(report)
+                if not searched or searched[0] is not tasks or searched[1] not in self.pages:
+                    with telemetry.timer("format_seconds", report=report):
+                        searched = (tasks, self.pages.capture(self.REPORTS[report][1], tasks))
+                    self._searched[report] = searched
+                return self.page(searched[1], 0)
+        
+        analysis = await self.analyzer.analyze_all()
+        
+        if analysis["version"] != self._version:
+            self._version = analysis["version"]
+            self._rendered = {}
+        
+        # Снимок списка мог быть вытеснен из LRU — фиксируем заново
+        if report in self.LISTS and report in self._rendered and self._rendered[report] not in self.pages:
+            del self._rendered[report]
+        
+        if report not in self._rendered:
+            with telemetry.timer("format_seconds", report=report):
+                self._rendered[report] = self._format(report, analysis)
+        
+        if report in self.LISTS:
+            text, keyboard = self.page(self._rendered[report], 0)
+        else:
+            text, keyboard = self._rendered[report], self.keyboard(report)
+        
+        # Снимок с диска после рестарта — показываем, насколько он старый
+        if analysis.get("restored_at"):
+            text += self._restored_note(analysis["restored_at"])
+        return text, keyboard
+    
+    def page(self, sid: str, page: int) -> Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+        """Страница зафиксированного списка (None — снимок устарел)"""
+        snapshot = self.pages.get(sid)
+        if snapshot is None:
+            return None
+        page = min(max(page, 0), snapshot.pages - 1)
+        return snapshot.render(page), self._page_keyboard(sid, page, snapshot.pages)
+    
+    @staticmethod
+    def _page_keyboard(sid: str, page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+        if pages < 2:
+            return None
+        row = []
+        if page > 0:
+            row.append(InlineKeyboardButton("◀️", callback_data=TaskPages.callback(sid, page - 1)))
+        row.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=NOOP))
+        if page < pages - 1:
+            row.append(InlineKeyboardButton("▶️", callback_data=TaskPages.callback(sid, page + 1)))
+        return InlineKeyboardMarkup([row])
+    
+    @staticmethod
+    def _restored_note(saved_at: float) -> str:
+        minutes = max(0, int((time.time() - saved_at) // 60))
+        age = f"{minutes} мин" if minutes < 120 else f"{minutes // 60} ч"
+        saved = datetime.fromtimestamp(saved_at, ZoneInfo(DIGEST_TZ)).strftime("%d.%m %H:%M")
+        return f"\n\n🕓 _Данные на {saved} ({age} назад), обновляются в фоне_"
+    
+    def _format(self, report: str, analysis: Dict) -> str:
+        if report == "analyze":
+            return self.analyzer.format_workload_report(analysis)
+        if report == "workload":
+            return self.analyzer.format_workload(analysis)
+        _, title = self.REPORTS[report]
+        return self.pages.capture(title, analysis[self.LISTS[report]])
+    
+    def keyboard(self, report: str) -> Optional[InlineKeyboardMarkup]:
+        """Кнопки детализации под отчётом"""
+        if report != "analyze":
+            return None
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("❌ Без исполнителя", callback_data="show_no_assignee"),
+                InlineKeyboardButton("📅 Без дедлайна", callback_data="show_no_due")
+            ],
+            [
+                InlineKeyboardButton("🔥 Просроченные", callback_data="show_overdue")
+            ]
+        ])
+
+
+def instrumented(func):
+    """Замер времени обработчика (метка handler — имя функции)"""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with telemetry.timer("handler_seconds", handler=func.__name__) as labels:
+            try:
+                result = await func(update, context)
+            except Exception:
+                labels["status"] = "error"
+                raise
+            labels["status"] = "ok"
+            return result
+    return wrapper
 
 
 # ═══════════════════════════════════════════════════════════════
 # ПРОВЕРКА ПРАВ
 # ═══════════════════════════════════════════════════════════════
 
-def is_admin(user_id: int) -> bool:
-    """Проверка админских прав"""
-    return user_id in ADMIN_IDS
+def get_asana(context: ContextTypes.DEFAULT_TYPE) -> AsanaClient:
+    """Общий AsanaClient, созданный в post_init"""
+    return context.application.bot_data["asana"]
+
+
+def get_analyzer(context: ContextTypes.DEFAULT_TYPE) -> TaskAnalyzer:
+    """Общий TaskAnalyzer с кэшем анализа"""
+    return context.application.bot_data["analyzer"]
+
+
+def get_db(context: ContextTypes.DEFAULT_TYPE):
+    """Асинхронный клиент Supabase (None, если не настроен)"""
+    return context.application.bot_data.get("db")
+
+
+def get_router(context: ContextTypes.DEFAULT_TYPE) -> ReportRouter:
+    """Общий ReportRouter"""
+    return context.application.bot_data["router"]
+
+
+def get_roles(context: ContextTypes.DEFAULT_TYPE) -> RoleCache:
+    """Кэш ролей portal_users"""
+    return context.application.bot_data["roles"]
+
+
+def is_admin(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> bool:
+    """Проверка админских прав (админ или менеджер, из кэша)"""
+    return get_roles(context).is_staff(user_id)
 
 
 def admin_required(func):
     """Декоратор для админских команд"""
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        if not is_admin(user_id):
+        if await get_roles(context).resolve(user_id) not in STAFF_ROLES:
             await update.message.reply_text(
                 "⛔ Эта команда доступна только администраторам.\n\n"
                 f"Ваш ID: `{user_id}`\n"
-                "Попросите админа добавить вас в ADMIN_IDS.",
+                "Попросите админа выдать вам роль manager в портале.",
                 parse_mode="Markdown"
             )
             return
@@ -291,7 +745,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     
     # Дополнительные кнопки для админов
-    if is_admin(user_id):
+    if is_admin(context, user_id):
         keyboard.append([
             InlineKeyboardButton("⚙️ Админ-панель", callback_data="admin_panel")
         ])
@@ -309,24 +763,94 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def resolve_client(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> Optional[str]:
+    """Клиент чата: привязанный к чату (clients.telegram_chat_id) или к пользователю (portal_users)"""
+    registry = context.application.bot_data.get("clients")
+    if registry:
+        client = registry.for_chat(chat_id)
+        if client:
+            return client["id"]
+
+    return await get_roles(context).client_for(user_id)
+
+
+async def positions_text(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> str:
+    """Сводка позиций клиента, к которому привязан чат или пользователь"""
+    summaries = context.application.bot_data.get("positions")
+    if summaries is None:
+        return "📈 *Позиции в поиске*\n\nОткройте портал для подробностей."
+
+    try:
+        client_id = await resolve_client(context, chat_id, user_id)
+        summary = await summaries.get(client_id) if client_id else None
+    except Exception as e:
+        logger.error(f"Positions summary error: {e}")
+        return "❌ Не удалось загрузить позиции, попробуйте позже."
+
+    if summary is None:
+        return (
+            "📈 *Позиции в поиске*\n\n"
+            "Ваш аккаунт не привязан к проекту.\n"
+            f"Сообщите менеджеру ваш ID: `{user_id}`"
+        )
+    return format_summary(summary)
+
+
 async def positions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать позиции"""
-    await update.message.reply_text(
-        "📈 *Позиции в поиске*\n\n"
-        "Данные обновляются ежедневно.\n"
-        "Откройте портал для подробностей.",
-        parse_mode="Markdown"
+    text = await positions_text(context, update.effective_chat.id, update.effective_user.id)
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+REPORT_STATUSES = {
+    "draft": "Готовится",
+    "sent": "Готов к просмотру",
+    "approved": "Согласован",
+}
+
+
+async def reports_text(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> str:
+    """Последний отчёт клиента, к которому привязан чат или пользователь"""
+    db = get_db(context)
+    if db is None:
+        return "📄 *Ваши отчёты*\n\nОткройте портал для подробностей."
+
+    try:
+        client_id = await resolve_client(context, chat_id, user_id)
+        if not client_id:
+            return (
+                "📄 *Ваши отчёты*\n\n"
+                "Ваш аккаунт не привязан к проекту.\n"
+                f"Сообщите менеджеру ваш ID: `{user_id}`"
+            )
+        result = await (
+            db.table("reports")
+            .select("title,type,month,status,created_at")
+            .eq("client_id", client_id)
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+    except Exception as e:
+        logger.error(f"Reports lookup error: {e}")
+        return "❌ Не удалось загрузить отчёты, попробуйте позже."
+
+    if not result.data:
+        return "📄 *Ваши отчёты*\n\nОтчётов пока нет."
+
+    report = result.data[0]
+    return (
+        "📄 *Ваши отчёты*\n\n"
+        f"Последний отчёт: {report['title']}\n"
+        f"Статус: {REPORT_STATUSES.get(report.get('status'), report.get('status') or '—')}\n\n"
+        "Откройте портал для просмотра."
     )
 
 
 async def reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать отчёты"""
-    await update.message.reply_text(
-        "📄 *Ваши отчёты*\n\n"
-        "Последний отчёт: Декабрь 2025\n"
-        "Статус: Готов к просмотру",
-        parse_mode="Markdown"
-    )
+    text = await reports_text(context, update.effective_chat.id, update.effective_user.id)
+    await update.message.reply_text(text, parse_mode="Markdown")
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -340,14 +864,19 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔹 /help — эта справка"
     )
     
-    if is_admin(user_id):
+    if is_admin(context, user_id):
         text += (
             "\n\n*Админ-команды:*\n"
             "🔸 /analyze — анализ загрузки\n"
             "🔸 /workload — кто перегружен\n"
             "🔸 /tasks — без исполнителя\n"
             "🔸 /overdue — просроченные\n"
-            "🔸 /nodue — без дедлайна"
+            "🔸 /nodue — без дедлайна\n"
+            "🔸 /digest — утренний дайджест\n"
+            "🔸 /cache — статистика кэша\n"
+            "🔸 /roles — перечитать роли\n"
+            "🔸 /stats — время обработки\n"
+            "🔸 /trend — динамика загрузки"
         )
     
     await update.message.reply_text(text, parse_mode="Markdown")
@@ -357,169 +886,221 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # КОМАНДЫ АДМИНОВ
 # ═══════════════════════════════════════════════════════════════
 
-@admin_required
-async def analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Полный анализ загрузки"""
-    await update.message.reply_text("⏳ Анализирую задачи...")
+async def send_report(update: Update, context: ContextTypes.DEFAULT_TYPE, report: str):
+    """Отправить админский отчёт (общий путь для команд и кнопок)"""
+    message = update.effective_message
+    router = get_router(context)
+    
+    if report not in router.REPORTS:
+        await message.reply_text("❓ Неизвестное действие")
+        return
     
     if not ASANA_TOKEN:
-        await update.message.reply_text(
+        await message.reply_text(
             "❌ ASANA_TOKEN не настроен!\n"
             "Добавьте токен в переменные окружения."
         )
         return
     
+    # Сообщение о загрузке — только когда действительно придётся ждать Asana
+    if not router.is_warm():
+        await message.reply_text(router.REPORTS[report][0])
+    
     try:
-        asana = AsanaClient(ASANA_TOKEN)
-        analyzer = TaskAnalyzer(asana)
-        
-        analysis = await analyzer.analyze_workload()
-        report = analyzer.format_workload_report(analysis)
-        
-        # Кнопки для детализации
-        keyboard = [
-            [
-                InlineKeyboardButton("❌ Без исполнителя", callback_data="show_no_assignee"),
-                InlineKeyboardButton("📅 Без дедлайна", callback_data="show_no_due")
-            ],
-            [
-                InlineKeyboardButton("🔥 Просроченные", callback_data="show_overdue")
-            ]
-        ]
-        
-        await update.message.reply_text(
-            report,
+        text, keyboard = await router.render(report)
+        await message.reply_text(
+            text,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=keyboard
         )
-        
     except Exception as e:
-        logger.error(f"Analyze error: {e}")
-        await update.message.reply_text(f"❌ Ошибка: {e}")
+        logger.error(f"Report {report} error: {e}")
+        await message.reply_text(f"❌ Ошибка: {e}")
+
+
+@admin_required
+async def analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Полный анализ загрузки"""
+    await send_report(update, context, "analyze")
 
 
 @admin_required
 async def workload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Загрузка по специалистам"""
-    await update.message.reply_text("⏳ Считаю загрузку...")
-    
-    if not ASANA_TOKEN:
-        await update.message.reply_text("❌ ASANA_TOKEN не настроен!")
-        return
-    
-    try:
-        asana = AsanaClient(ASANA_TOKEN)
-        analyzer = TaskAnalyzer(asana)
-        
-        analysis = await analyzer.analyze_workload()
-        
-        lines = ["👥 *Загрузка специалистов*\n"]
-        
-        for name, tasks in sorted(
-            analysis["by_assignee"].items(),
-            key=lambda x: -len(x[1])
-        ):
-            count = len(tasks)
-            bar = "█" * min(count, 15) + "░" * max(0, 15 - count)
-            emoji = "🔴" if count > 10 else "🟡" if count > 5 else "🟢"
-            lines.append(f"{emoji} *{name}*: {count}")
-            lines.append(f"  `{bar}`")
-            
-            # Ближайшие дедлайны
-            upcoming = [t for t in tasks if t.get("due_on")]
-            upcoming.sort(key=lambda x: x["due_on"])
-            if upcoming[:2]:
-                lines.append("  Ближайшее:")
-                for t in upcoming[:2]:
-                    lines.append(f"  • {t['name'][:30]} ({t['due_on']})")
-            lines.append("")
-        
-        await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
-        
-    except Exception as e:
-        logger.error(f"Workload error: {e}")
-        await update.message.reply_text(f"❌ Ошибка: {e}")
+    await send_report(update, context, "workload")
 
 
 @admin_required
 async def tasks_no_assignee(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Задачи без исполнителя"""
-    await update.message.reply_text("⏳ Ищу задачи без исполнителя...")
-    
-    if not ASANA_TOKEN:
-        await update.message.reply_text("❌ ASANA_TOKEN не настроен!")
-        return
-    
+    await send_report(update, context, "no_assignee")
+
+
+@admin_required
+async def tasks_overdue(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Просроченные задачи"""
+    await send_report(update, context, "overdue")
+
+
+@admin_required
+async def tasks_no_due(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Задачи без дедлайна"""
+    await send_report(update, context, "no_due")
+
+
+@admin_required
+async def digest_preview(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Утренний дайджест прямо сейчас (только вызвавшему)"""
+    digest: DigestScheduler = context.application.bot_data["digest"]
     try:
-        asana = AsanaClient(ASANA_TOKEN)
-        analyzer = TaskAnalyzer(asana)
-        
-        analysis = await analyzer.analyze_workload()
-        report = analyzer.format_tasks_list(
-            analysis["no_assignee"],
-            "Без исполнителя"
-        )
-        
-        await update.message.reply_text(report, parse_mode="Markdown")
-        
+        text = await digest.build(datetime.now(ZoneInfo(DIGEST_TZ)).date())
+        await update.message.reply_text(text, parse_mode="Markdown")
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {e}")
 
 
 @admin_required
-async def tasks_overdue(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Просроченные задачи"""
-    await update.message.reply_text("⏳ Ищу просроченные...")
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Статистика кэша анализа"""
+    analyzer = get_analyzer(context)
+    cache = analyzer.cache
     
-    if not ASANA_TOKEN:
-        await update.message.reply_text("❌ ASANA_TOKEN не настроен!")
-        return
+    lines = ["🗄 *Кэш анализа*\n", cache.format_stats()]
+    if analyzer.projects:
+        lines.append("\n⏱ *Возраст снимков:*")
+        for gid, name in list(analyzer.projects.items())[:15]:
+            age = cache.age(gid)
+            lines.append(f"  {name}: {age:.0f} с" if age is not None else f"  {name}: снимка ещё нет")
+        if len(analyzer.projects) > 15:
+            lines.append(f"  ... и ещё {len(analyzer.projects) - 15}")
+    else:
+        lines.append("\n⏱ Снимков ещё нет")
+    lines.append(f"TTL: {ANALYSIS_TTL:.0f} с, stale: {ANALYSIS_STALE_TTL:.0f} с")
     
-    try:
-        asana = AsanaClient(ASANA_TOKEN)
-        analyzer = TaskAnalyzer(asana)
-        
-        analysis = await analyzer.analyze_workload()
-        report = analyzer.format_tasks_list(
-            analysis["overdue"],
-            "🔥 Просроченные задачи"
+    asana = get_asana(context).stats
+    lines.append(
+        f"\n🌐 *Asana:* запросов {asana['requests']}, 429: {asana['throttled']}, "
+        f"повторов {asana['retried']}, ошибок {asana['failed']}, "
+        f"ожидание лимита {asana['wait_seconds']:.1f} с"
+    )
+    
+    # Только уже созданные синхронизаторы: статистика не должна их заводить
+    syncs = [analyzer.syncs[gid] for gid in analyzer.projects if gid in analyzer.syncs]
+    lines.append(
+        f"\n🔁 *Синхронизация:* проектов {len(syncs)}, "
+        f"задач {sum(len(sync.store) for sync in syncs)}, "
+        f"полных {sum(sync.stats['full_resyncs'] for sync in syncs)}, "
+        f"дельт {sum(sync.stats['delta_syncs'] for sync in syncs)}, "
+        f"событий {sum(sync.stats['events'] for sync in syncs)}"
+    )
+    
+    registry = context.application.bot_data.get("clients")
+    if registry:
+        clients, chats = registry.counts()
+        lines.append(
+            f"\n👥 *Клиенты:* {clients}, привязанных чатов {chats}, "
+            f"загрузок файлов {registry.stats['file_loads']}, из базы {registry.stats['db_rows']} строк"
         )
-        
-        await update.message.reply_text(report, parse_mode="Markdown")
-        
+    
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
+@admin_required
+async def roles_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Перечитать роли из portal_users"""
+    roles = get_roles(context)
+    try:
+        users = await roles.preload()
     except Exception as e:
-        await update.message.reply_text(f"❌ Ошибка: {e}")
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+        return
+    
+    counts = roles.counts()
+    await update.message.reply_text(
+        f"🔄 *Роли обновлены:* {users} пользователей\n"
+        f"Админов: {counts.get('admin', 0)}, менеджеров: {counts.get('manager', 0)}, "
+        f"клиентов: {counts.get('client', 0)}\n"
+        f"Админов из ADMIN_IDS: {len(ADMIN_IDS)}",
+        parse_mode="Markdown"
+    )
 
 
 @admin_required
-async def tasks_no_due(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Задачи без дедлайна"""
-    await update.message.reply_text("⏳ Ищу задачи без срока...")
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Время обработчиков, запросов к Asana и шагов анализа"""
+    lines = ["⏱ *Время обработки*\n", telemetry.format_summary()]
     
-    if not ASANA_TOKEN:
-        await update.message.reply_text("❌ ASANA_TOKEN не настроен!")
+    lines.append("\n🗄 *Попадания в кэш:*")
+    for name, cache in cache_registry(context).items():
+        s = cache.stats
+        lookups = s["hits"] + s["stale_hits"] + s["misses"] + s["coalesced"]
+        hit_rate = (s["hits"] + s["stale_hits"]) / lookups * 100 if lookups else 0
+        lines.append(f"• {name}: {hit_rate:.0f}% из {lookups}")
+    
+    for part in split_message("\n".join(lines)):
+        await update.message.reply_text(part, parse_mode="Markdown")
+
+
+@admin_required
+async def trend_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Динамика загрузки за последние недели (/trend [недель])"""
+    history: Optional[WorkloadHistory] = context.application.bot_data.get("workload_history")
+    if history is None:
+        await update.message.reply_text("❌ История загрузки не ведётся: нужны Supabase и ASANA_TOKEN.")
         return
     
+    weeks = TREND_WEEKS
+    if context.args and context.args[0].isdigit():
+        weeks = max(2, min(int(context.args[0]), 104))
+    
     try:
-        asana = AsanaClient(ASANA_TOKEN)
-        analyzer = TaskAnalyzer(asana)
-        
-        analysis = await analyzer.analyze_workload()
-        report = analyzer.format_tasks_list(
-            analysis["no_due_date"],
-            "Без дедлайна"
-        )
-        
-        await update.message.reply_text(report, parse_mode="Markdown")
-        
+        trend = await history.trend(weeks)
     except Exception as e:
-        await update.message.reply_text(f"❌ Ошибка: {e}")
+        logger.error(f"Trend error: {e}")
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+        return
+    
+    for part in split_message(format_trend(trend)):
+        await update.message.reply_text(part, parse_mode="Markdown")
+
+
+def cache_registry(context_or_app) -> Dict[str, SnapshotCache]:
+    """Кэши бота для /stats и экспорта метрик"""
+    bot_data = getattr(context_or_app, "application", context_or_app).bot_data
+    caches = {}
+    analyzer = bot_data.get("analyzer")
+    if analyzer:
+        caches["analysis"] = analyzer.cache
+    summaries = bot_data.get("positions")
+    if summaries:
+        caches["positions"] = summaries.summaries
+    return caches
 
 
 # ═══════════════════════════════════════════════════════════════
 # CALLBACK HANDLERS
 # ═══════════════════════════════════════════════════════════════
 
+async def turn_page(query, context: ContextTypes.DEFAULT_TYPE):
+    """Показать другую страницу списка в том же сообщении"""
+    parsed = TaskPages.parse(query.data)
+    if parsed is None:
+        return  # кнопка с номером страницы
+    
+    view = get_router(context).page(*parsed)
+    if view is None:
+        await query.message.reply_text("⌛ Список устарел — запросите отчёт заново.")
+        return
+    
+    text, keyboard = view
+    try:
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
+    except BadRequest as e:
+        # Двойное нажатие — страница уже показана
+        if "not modified" not in str(e).lower():
+            raise
+
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатий кнопок"""
     query = update.callback_query
@@ -529,22 +1110,18 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
     
     if data == "positions":
-        await query.message.reply_text(
-            "📈 *Позиции в поиске*\n\n"
-            "Данные обновляются ежедневно.\n"
-            "Откройте портал для подробностей.",
-            parse_mode="Markdown"
-        )
+        text = await positions_text(context, query.message.chat_id, user_id)
+        await query.message.reply_text(text, parse_mode="Markdown")
     
     elif data == "reports":
-        await query.message.reply_text(
-            "📄 *Ваши отчёты*\n\n"
-            "Последний отчёт: Декабрь 2025\n"
-            "Статус: Готов к просмотру",
-            parse_mode="Markdown"
-        )
+        text = await reports_text(context, query.message.chat_id, user_id)
+        await query.message.reply_text(text, parse_mode="Markdown")
     
-    elif data == "admin_panel" and is_admin(user_id):
+    # Листание списка задач: только правка сообщения из снимка, без Asana
+    elif data.startswith(PAGE_PREFIX) and is_admin(context, user_id):
+        await turn_page(query, context)
+    
+    elif data == "admin_panel" and is_admin(context, user_id):
         keyboard = [
             [InlineKeyboardButton("📊 Анализ загрузки", callback_data="run_analyze")],
             [InlineKeyboardButton("👥 По специалистам", callback_data="run_workload")],
@@ -560,96 +1137,216 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
     
-    # Админские callback-и
-    elif data.startswith("run_") and is_admin(user_id):
-        action = data.replace("run_", "")
-        
-        if not ASANA_TOKEN:
-            await query.message.reply_text("❌ ASANA_TOKEN не настроен!")
-            return
-        
-        await query.message.reply_text("⏳ Загружаю данные...")
+    # Админские callback-и: run_* из админ-панели, show_* под /analyze
+    elif data.startswith(("run_", "show_")) and is_admin(context, user_id):
+        report = data.split("_", 1)[1]
+        await send_report(update, context, report)
+
+
+# ═══════════════════════════════════════════════════════════════
+# MAIN
+# ═══════════════════════════════════════════════════════════════
+
+async def post_init(app: Application):
+    """Создание общих ресурсов при старте"""
+    asana = AsanaClient(ASANA_TOKEN, http=create_http_client())
+    app.bot_data["asana"] = asana
+    
+    db = None
+    if SUPABASE_URL and SUPABASE_KEY:
+        from supabase import acreate_client
         
+        db = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        app.bot_data["db"] = db
+    
+    snapshots = None
+    if db is not None:
+        snapshots = SupabaseSnapshotStore(db)
+    elif SNAPSHOT_PATH:
         try:
-            asana = AsanaClient(ASANA_TOKEN)
-            analyzer = TaskAnalyzer(asana)
-            analysis = await analyzer.analyze_workload()
-            
-            if action == "analyze":
-                report = analyzer.format_workload_report(analysis)
-            elif action == "workload":
-                lines = ["👥 *Загрузка:*\n"]
-                for name, tasks in sorted(analysis["by_assignee"].items(), key=lambda x: -len(x[1])):
-                    emoji = "🔴" if len(tasks) > 10 else "🟡" if len(tasks) > 5 else "🟢"
-                    lines.append(f"{emoji} {name}: {len(tasks)}")
-                report = "\n".join(lines)
-            elif action == "no_assignee":
-                report = analyzer.format_tasks_list(analysis["no_assignee"], "Без исполнителя")
-            elif action == "no_due":
-                report = analyzer.format_tasks_list(analysis["no_due_date"], "Без дедлайна")
-            elif action == "overdue":
-                report = analyzer.format_tasks_list(analysis["overdue"], "🔥 Просроченные")
-            else:
-                report = "❓ Неизвестное действие"
-            
-            await query.message.reply_text(report, parse_mode="Markdown")
-            
+            os.makedirs(os.path.dirname(SNAPSHOT_PATH) or ".", exist_ok=True)
+            snapshots = SnapshotStore(SNAPSHOT_PATH)
         except Exception as e:
-            await query.message.reply_text(f"❌ Ошибка: {e}")
+            logger.error(f"Snapshot store disabled: {e}")
+    analyzer = TaskAnalyzer(asana, snapshots=snapshots)
+    app.bot_data["analyzer"] = analyzer
     
-    elif data.startswith("show_") and is_admin(user_id):
-        # Для кнопок после /analyze
-        action = data.replace("show_", "")
-        
+    if snapshots and ASANA_TOKEN:
+        started = time.perf_counter()
         try:
-            asana = AsanaClient(ASANA_TOKEN)
-            analyzer = TaskAnalyzer(asana)
-            analysis = await analyzer.analyze_workload()
-            
-            if action == "no_assignee":
-                report = analyzer.format_tasks_list(analysis["no_assignee"], "Без исполнителя")
-            elif action == "no_due":
-                report = analyzer.format_tasks_list(analysis["no_due_date"], "Без дедлайна")
-            elif action == "overdue":
-                report = analyzer.format_tasks_list(analysis["overdue"], "🔥 Просроченные")
-            else:
-                report = "❓"
-            
-            await query.message.reply_text(report, parse_mode="Markdown")
-            
+            restored = await analyzer.restore()
+        except Exception as e:
+            logger.error(f"Snapshot restore error: {e}")
+            restored = 0
+        if restored:
+            logger.info(f"Restored {restored} project snapshots in {time.perf_counter() - started:.2f}s")
+            # Сразу обновляем в фоне, не дожидаясь первого запроса
+            app.bot_data["warm_up"] = asyncio.create_task(warm_up(analyzer))
+    app.bot_data["router"] = ReportRouter(analyzer)
+    telemetry.collector("cache_events_total", lambda: {
+        (("cache", name), ("event", event)): value
+        for name, cache in cache_registry(app).items()
+        for event, value in cache.stats.items()
+    })
+    
+    registry = ClientRegistry(full_reload_interval=CLIENTS_FULL_RELOAD_INTERVAL)
+    registry.load_files()
+    app.bot_data["clients"] = registry
+    
+    roles = RoleCache(static_admins=ADMIN_IDS, ttl=ROLES_TTL, negative_ttl=ROLES_NEGATIVE_TTL)
+    app.bot_data["roles"] = roles
+    
+    digest = DigestScheduler(
+        analyzer,
+        parse_schedule(DIGEST_SCHEDULE, DIGEST_TIME, DIGEST_TZ),
+        DIGEST_DAYS,
+        rate=DIGEST_RATE
+    )
+    app.bot_data["digest"] = digest
+    if not ASANA_TOKEN:
+        logger.warning("Digest disabled: ASANA_TOKEN is not set")
+    elif app.job_queue is None:
+        logger.warning("Digest disabled: install python-telegram-bot[job-queue]")
+    else:
+        digest.schedule(app.job_queue)
+    
+    # Supabase
+    if db is not None:
+        registry.db = db
+        try:
+            await registry.refresh_db()
         except Exception as e:
-            await query.message.reply_text(f"❌ Ошибка: {e}")
+            logger.error(f"Client registry load error: {e}")
+        
+        roles.db = db
+        await roles.run_job(None)
+        if app.job_queue is not None:
+            app.job_queue.run_repeating(roles.run_job, interval=ROLES_TTL, first=ROLES_TTL, name="roles")
+            app.job_queue.run_repeating(
+                registry.run_job, interval=CLIENTS_REFRESH_INTERVAL, first=CLIENTS_REFRESH_INTERVAL, name="clients"
+            )
+        app.bot_data["positions"] = PositionSummaries(db, ttl=POSITIONS_TTL, max_clients=POSITIONS_CACHE_SIZE)
+        
+        notifier = NotificationDispatcher(db, batch_size=NOTIFY_BATCH, global_rate=NOTIFY_RATE)
+        app.bot_data["notifier"] = notifier
+        if app.job_queue is not None:
+            app.job_queue.run_repeating(notifier.run_job, interval=NOTIFY_INTERVAL, first=10, name="notifications")
+        
+        detector = PositionChangeDetector(db, threshold=POSITION_DROP_THRESHOLD)
+        app.bot_data["position_changes"] = detector
+        if app.job_queue is not None:
+            app.job_queue.run_repeating(
+                detector.run_job, interval=POSITION_CHANGE_INTERVAL, first=60, name="position changes"
+            )
+        
+        if ASANA_TOKEN:
+            workload_history = WorkloadHistory(db, analyzer)
+            app.bot_data["workload_history"] = workload_history
+            if app.job_queue is not None:
+                app.job_queue.run_repeating(
+                    workload_history.run_job, interval=WORKLOAD_HISTORY_INTERVAL, first=300, name="workload history"
+                )
+    else:
+        logger.warning("Supabase is not configured: notifications, positions and /trend disabled")
 
 
-# ═══════════════════════════════════════════════════════════════
-# MAIN
-# ═══════════════════════════════════════════════════════════════
+async def warm_up(analyzer: TaskAnalyzer):
+    """Фоновое обновление восстановленных снимков"""
+    try:
+        await analyzer.analyze_all()
+    except Exception as e:
+        logger.error(f"Warm-up error: {e}")
 
-def main():
-    """Запуск бота"""
-    app = Application.builder().token(BOT_TOKEN).build()
+
+async def post_shutdown(app: Application):
+    """Освобождение ресурсов при остановке"""
+    analyzer = app.bot_data.get("analyzer")
+    if analyzer:
+        await analyzer.flush_snapshots()
+    asana = app.bot_data.pop("asana", None)
+    if asana:
+        await asana.http.aclose()
+
+
+async def run_webhook(app: Application):
+    """Webhook-режим: апдейты приходят через ASGI-сервер"""
+    import uvicorn
+    from webhook import TelegramWebhookApp
+    
+    asgi = TelegramWebhookApp(app, WEBHOOK_SECRET, WEBHOOK_PATH)
+    if METRICS_PATH:
+        async def metrics():
+            return 200, "text/plain; version=0.0.4", telemetry.render_prometheus()
+        asgi.add_route(METRICS_PATH, metrics)
+    server = uvicorn.Server(uvicorn.Config(asgi, host="0.0.0.0", port=PORT, log_level="warning"))
     
+    async with app:
+        await post_init(app)
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await app.start()
+        try:
+            await server.serve()
+        finally:
+            await app.stop()
+            await post_shutdown(app)
+
+
+def add_handlers(app: Application):
+    """Команды и кнопки бота"""
     # Команды клиентов
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("positions", positions))
-    app.add_handler(CommandHandler("reports", reports))
-    app.add_handler(CommandHandler("help", help_command))
+    app.add_handler(CommandHandler("start", instrumented(start)))
+    app.add_handler(CommandHandler("positions", instrumented(positions)))
+    app.add_handler(CommandHandler("reports", instrumented(reports)))
+    app.add_handler(CommandHandler("help", instrumented(help_command)))
     
     # Команды админов
-    app.add_handler(CommandHandler("analyze", analyze))
-    app.add_handler(CommandHandler("workload", workload))
-    app.add_handler(CommandHandler("tasks", tasks_no_assignee))
-    app.add_handler(CommandHandler("overdue", tasks_overdue))
-    app.add_handler(CommandHandler("nodue", tasks_no_due))
+    app.add_handler(CommandHandler("analyze", instrumented(analyze)))
+    app.add_handler(CommandHandler("workload", instrumented(workload)))
+    app.add_handler(CommandHandler("tasks", instrumented(tasks_no_assignee)))
+    app.add_handler(CommandHandler("overdue", instrumented(tasks_overdue)))
+    app.add_handler(CommandHandler("nodue", instrumented(tasks_no_due)))
+    app.add_handler(CommandHandler("cache", instrumented(cache_stats)))
+    app.add_handler(CommandHandler("digest", instrumented(digest_preview)))
+    app.add_handler(CommandHandler("roles", instrumented(roles_refresh)))
+    app.add_handler(CommandHandler("stats", instrumented(stats_command)))
+    app.add_handler(CommandHandler("trend", instrumented(trend_command)))
     
     # Callback для кнопок
-    app.add_handler(CallbackQueryHandler(button_callback))
+    app.add_handler(CallbackQueryHandler(instrumented(button_callback)))
+
+
+def main():
+    """Запуск бота"""
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if BOT_CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(
+            PerChatUpdateProcessor(BOT_CONCURRENT_UPDATES, BOT_MAX_PENDING_UPDATES)
+        )
+    app = builder.build()
+    add_handlers(app)
     
     logger.info("🚀 Artvision Portal Bot v2.0 starting...")
     logger.info(f"   Admins: {ADMIN_IDS}")
     logger.info(f"   Asana: {'✓' if ASANA_TOKEN else '✗'}")
+    logger.info(f"   Supabase: {'✓' if SUPABASE_URL and SUPABASE_KEY else '✗'}")
+    logger.info(f"   Asana pool: {ASANA_MAX_CONNECTIONS} conn, HTTP/2: {'✓' if ASANA_HTTP2 else '✗'}")
+    logger.info(f"   Mode: {BOT_MODE}, concurrent updates: {BOT_CONCURRENT_UPDATES}")
     
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        logger.info(f"   Webhook: 0.0.0.0:{PORT}{WEBHOOK_PATH}")
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,391 @@
+"""
+Месячные отчёты клиентов
+
+Для каждого клиента из clients/active/*/client.json собирает за месяц
+позиции (витрина positions_daily, снимки первого/последнего дня и
+перцентили позиций из локального кэша истории position_history),
+метрики и завершённые задачи Asana (если в client.json указан
+asana_project), рендерит отчёт в clients/active/<id>/reports/<месяц>.md
+и пишет строки в reports одним upsert (status в нём не передаётся:
+новый отчёт получает DEFAULT 'draft', а у пересобранного остаётся
+sent/approved).
+
+- входные данные грузятся асинхронно, рендер идёт в пуле процессов;
+- хэш входных данных хранится в reports/.build-cache.json, поэтому
+  повторный запуск пересобирает только клиентов, у которых что-то
+  изменилось (--force — пересобрать всё);
+- история позиций клиента перед сборкой досинхронизируется в
+  --history-dir (POSITION_HISTORY_DIR), снимки дней читаются из неё, а
+  не постранично из positions; пустое значение — читать из Supabase;
+  раз в POSITION_HISTORY_REBUILD_DAYS история перечитывается целиком.
+
+Запуск:
+    python monthly_reports.py                 # прошлый месяц
+    python monthly_reports.py --month 2026-01 --workers 4
+"""
+
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from position_changes import diff_snapshots, to_columns, KEY_SEP, UNRANKED
+from position_history import PositionHistoryCache
+from task_records import TASK_FIELDS
+
+logger = logging.getLogger(__name__)
+
+CLIENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "clients", "active")
+BUILD_CACHE = ".build-cache.json"
+HISTORY_DIR = os.environ.get("POSITION_HISTORY_DIR", ".cache/positions")
+# Раз в столько дней история клиента перечитывается целиком (удалённые в Supabase строки)
+HISTORY_REBUILD_DAYS = float(os.environ.get("POSITION_HISTORY_REBUILD_DAYS", "7"))
+
+MONTHS = [
+    "январь", "февраль", "март", "апрель", "май", "июнь",
+    "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь",
+]
+
+
+def month_bounds(month: str) -> Tuple[date, date]:
+    """'2026-01' -> (первый день, первый день следующего месяца)"""
+    start = date.fromisoformat(f"{month}-01")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def previous_month(today: date) -> str:
+    return (today.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+
+def report_title(month: str) -> str:
+    start, _ = month_bounds(month)
+    return f"Отчёт за {MONTHS[start.month - 1]} {start.year}"
+
+
+def discover_clients(root: str = CLIENTS_DIR) -> List[Dict]:
+    """Клиенты из clients/active (id — имя каталога)"""
+    clients = []
+    for slug in sorted(os.listdir(root)):
+        path = os.path.join(root, slug, "client.json")
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        clients.append({"id": slug, "dir": os.path.join(root, slug), "config": config})
+    return clients
+
+
+def inputs_hash(inputs: Dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def render_report(job: Dict) -> str:
+    """Текст отчёта (выполняется в пуле процессов)"""
+    client, month, inputs = job["client"], job["month"], job["inputs"]
+    config = client["config"]
+    lines = [f"# {report_title(month)}", "", f"**{config.get('name', client['id'])}**"]
+    if config.get("domain"):
+        lines.append(f"Сайт: {config['domain']}")
+
+    # Позиции
+    daily = inputs["positions_daily"]
+    lines += ["", "## Позиции", ""]
+    if daily:
+        first, last = daily[0], daily[-1]
+        lines += [
+            "| Показатель | " + first["checked_on"] + " | " + last["checked_on"] + " |",
+            "|---|---|---|",
+            f"| Запросов | {first['keywords']} | {last['keywords']} |",
+            f"| Средняя позиция | {first['avg_position']} | {last['avg_position']} |",
+            f"| Топ-3 | {first['top3']} | {last['top3']} |",
+            f"| Топ-10 | {first['top10']} | {last['top10']} |",
+            f"| Видимость, % | {first['visibility']} | {last['visibility']} |",
+        ]
+        percentiles = inputs.get("positions_percentiles") or {}
+        before = percentiles.get(first["checked_on"])
+        after = percentiles.get(last["checked_on"])
+        if before and after:
+            for p in ("p50", "p90"):
+                lines.append(f"| Позиция, {p} | {before[p]} | {after[p]} |")
+
+        changes = diff_snapshots(
+            to_columns(inputs["positions_first"]),
+            to_columns(inputs["positions_last"]),
+            threshold=5
+        )
+        if len(changes["kind"]):
+            lines += ["", "Значимые изменения за месяц:", ""]
+            for i in range(min(20, len(changes["kind"]))):
+                keyword = changes["keys"][i].split(KEY_SEP, 1)[0]
+                before, after = int(changes["previous"][i]), int(changes["current"][i])
+                lines.append(
+                    f"- {keyword}: {'—' if before >= UNRANKED else before} → {'—' if after >= UNRANKED else after}"
+                )
+    else:
+        lines.append("Данных по позициям за месяц нет.")
+
+    # Метрики
+    lines += ["", "## Трафик и заявки", ""]
+    if inputs["metrics"]:
+        by_source: Dict[str, Dict[str, int]] = {}
+        for row in inputs["metrics"]:
+            totals = by_source.setdefault(row.get("source") or "other", {"visitors": 0, "leads": 0, "calls": 0})
+            for key in totals:
+                totals[key] += row.get(key) or 0
+        lines += ["| Источник | Визиты | Заявки | Звонки |", "|---|---|---|---|"]
+        for source, totals in sorted(by_source.items()):
+            lines.append(f"| {source} | {totals['visitors']} | {totals['leads']} | {totals['calls']} |")
+    else:
+        lines.append("Данных по метрикам за месяц нет.")
+
+    # Работы
+    tasks = inputs["tasks"]
+    if tasks is not None:
+        lines += ["", "## Выполненные работы", ""]
+        if tasks:
+            for task in tasks:
+                lines.append(f"- {task['completed_at'][:10]} — {task['name']}")
+        else:
+            lines.append("Завершённых задач за месяц нет.")
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+class MonthlyReportBuilder:
+    """Пакетная сборка месячных отчётов"""
+
+    def __init__(self, db, asana=None, workers: Optional[int] = None, concurrency: int = 4,
+                 history: Optional[PositionHistoryCache] = None):
+        self.db = db
+        self.asana = asana
+        self.history = history
+        self.workers = workers
+        self.concurrency = concurrency
+
+        self.stats = {
+            "clients": 0,
+            "built": 0,
+            "unchanged": 0,
+            "failed": 0,
+        }
+
+    async def load_inputs(self, client: Dict, month: str) -> Dict:
+        """Входные данные отчёта клиента"""
+        start, end = month_bounds(month)
+        client_id = client["id"]
+
+        daily, metrics, tasks = await asyncio.gather(
+            self.db.table("positions_daily")
+            .select("checked_on,keywords,avg_position,top3,top10,visibility")
+            .eq("client_id", client_id)
+            .gte("checked_on", start.isoformat())
+            .lt("checked_on", end.isoformat())
+            .order("checked_on")
+            .execute(),
+            self.db.table("metrics")
+            .select("date,visitors,leads,calls,source")
+            .eq("client_id", client_id)
+            .gte("date", start.isoformat())
+            .lt("date", end.isoformat())
+            .order("date")
+            .execute(),
+            self._completed_tasks(client, start, end),
+        )
+        daily = daily.data or []
+
+        positions_first: List[Dict] = []
+        positions_last: List[Dict] = []
+        percentiles: Dict[str, Dict] = {}
+        if len(daily) > 1 and self.history:
+            await self.history.sync(client_id)
+            month_history = self.history.load(client_id).window(
+                (end - start).days, until=end - timedelta(days=1)
+            )
+            positions_first = month_history.day_rows(daily[0]["checked_on"])
+            positions_last = month_history.day_rows(daily[-1]["checked_on"])
+            percentiles = {
+                row["day"]: {"p50": row["p50"], "p90": row["p90"]}
+                for row in month_history.daily_stats()
+                if row["day"] in (daily[0]["checked_on"], daily[-1]["checked_on"])
+            }
+        elif len(daily) > 1:
+            positions_first, positions_last = await asyncio.gather(
+                self._positions(client_id, daily[0]["checked_on"]),
+                self._positions(client_id, daily[-1]["checked_on"]),
+            )
+
+        return {
+            "positions_daily": daily,
+            "positions_first": positions_first,
+            "positions_last": positions_last,
+            "positions_percentiles": percentiles,
+            "metrics": metrics.data or [],
+            "tasks": tasks,
+        }
+
+    async def _positions(self, client_id: str, day: str, page_size: int = 1000) -> List[Dict]:
+        rows: List[Dict] = []
+        while True:
+            result = await (
+                self.db.table("positions")
+                .select("keyword,search_engine,region,position")
+                .eq("client_id", client_id)
+                .eq("checked_on", day)
+                .order("id")
+                .range(len(rows), len(rows) + page_size - 1)
+                .execute()
+            )
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    async def _completed_tasks(self, client: Dict, start: date, end: date) -> Optional[List[Dict]]:
+        """Задачи проекта клиента, завершённые в месяце (None — проект не задан)"""
+        project = client["config"].get("asana_project")
+        if not project or not self.asana:
+            return None
+
+        tasks = await self.asana.get_tasks(
+            project_id=project,
+            opt_fields=TASK_FIELDS["monthly"],
+            completed_since=start.isoformat()
+        )
+        done = [
+            {"name": t.get("name", "Без названия"), "completed_at": t["completed_at"]}
+            for t in tasks
+            if t.get("completed") and t.get("completed_at")
+            and start.isoformat() <= t["completed_at"][:10] < end.isoformat()
+        ]
+        return sorted(done, key=lambda t: t["completed_at"])
+
+    @staticmethod
+    def _read_cache(client: Dict) -> Dict:
+        try:
+            with open(os.path.join(client["dir"], "reports", BUILD_CACHE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_cache(client: Dict, cache: Dict):
+        path = os.path.join(client["dir"], "reports", BUILD_CACHE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    async def build(self, clients: List[Dict], month: str, force: bool = False) -> List[Dict]:
+        """Собрать отчёты за месяц; возвращает строки reports для пересобранных"""
+        self.stats["clients"] += len(clients)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def load(client: Dict):
+            async with semaphore:
+                try:
+                    return client, await self.load_inputs(client, month)
+                except Exception as e:
+                    logger.error(f"Report inputs for {client['id']} failed: {e}")
+                    self.stats["failed"] += 1
+                    return client, None
+
+        jobs = []
+        for client, inputs in await asyncio.gather(*(load(c) for c in clients)):
+            if inputs is None:
+                continue
+            digest = inputs_hash(inputs)
+            path = os.path.join(client["dir"], "reports", f"{month}.md")
+            if not force and self._read_cache(client).get(month) == digest and os.path.exists(path):
+                self.stats["unchanged"] += 1
+                continue
+            jobs.append({"client": client, "month": month, "inputs": inputs, "hash": digest, "path": path})
+
+        if not jobs:
+            return []
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            texts = await asyncio.gather(*(
+                loop.run_in_executor(pool, render_report, {k: job[k] for k in ("client", "month", "inputs")})
+                for job in jobs
+            ))
+
+        rows = []
+        for job, text in zip(jobs, texts):
+            client = job["client"]
+            os.makedirs(os.path.dirname(job["path"]), exist_ok=True)
+            with open(job["path"], "w", encoding="utf-8") as f:
+                f.write(text)
+            cache = self._read_cache(client)
+            cache[month] = job["hash"]
+            self._write_cache(client, cache)
+
+            rows.append({
+                "client_id": client["id"],
+                "title": report_title(month),
+                "type": "monthly",
+                "month": month,
+                # Путь от корня репозитория: clients/active/<id>/reports/<месяц>.md
+                "file_url": os.path.relpath(job["path"], os.path.join(client["dir"], "..", "..", "..")),
+            })
+
+        await self.db.table("reports").upsert(rows, on_conflict="client_id,type,month").execute()
+        self.stats["built"] += len(rows)
+        return rows
+
+
+async def run(args) -> Dict:
+    from supabase import acreate_client
+
+    db = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+    asana = None
+    if os.environ.get("ASANA_TOKEN"):
+        from asana_client import AsanaClient, create_http_client
+        asana = AsanaClient(os.environ["ASANA_TOKEN"], http=create_http_client())
+
+    clients = discover_clients(args.clients_dir)
+    if args.client:
+        clients = [c for c in clients if c["id"] in args.client]
+
+    history = PositionHistoryCache(
+        db, args.history_dir, full_rebuild_interval=HISTORY_REBUILD_DAYS * 86400
+    ) if args.history_dir else None
+    builder = MonthlyReportBuilder(db, asana, workers=args.workers, history=history)
+    try:
+        await builder.build(clients, args.month, force=args.force)
+    finally:
+        if asana:
+            await asana.http.aclose()
+    return builder.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Месячные отчёты клиентов")
+    parser.add_argument("--month", default=previous_month(date.today()), help="YYYY-MM, по умолчанию прошлый месяц")
+    parser.add_argument("--client", action="append", help="только эти клиенты (можно несколько раз)")
+    parser.add_argument("--clients-dir", default=CLIENTS_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="процессов рендера")
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help="кэш истории позиций ('' — без кэша)")
+    parser.add_argument("--force", action="store_true", help="пересобрать без учёта кэша")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    stats = asyncio.run(run(args))
+    logger.info(f"Monthly reports: {stats}")
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
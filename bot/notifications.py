@@ -0,0 +1,256 @@
+"""
+Рассылка уведомлений клиентам
+
+Забирает неотправленные строки из таблицы notifications пачкой,
+группирует по чатам получателей (clients.telegram_chat_id и
+portal_users.telegram_id клиента), склеивает несколько событий в одно
+сообщение и отправляет с ограничением частоты:
+
+- не больше ~30 сообщений/с на бота в целом;
+- не больше 1 сообщения/с в один чат;
+- RetryAfter (flood wait) — пауза и повтор.
+
+Заголовок и текст уведомления приходят из БД как есть, поэтому
+экранируются под MarkdownV2; если Telegram всё же не разобрал разметку,
+сообщение уходит простым текстом.
+
+Отправленные строки отмечаются sent_at пакетными UPDATE.
+"""
+
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Set
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.helpers import escape_markdown
+
+from ratelimit import TokenBucket
+from textutil import split_message
+
+logger = logging.getLogger(__name__)
+
+TYPE_LABELS = {
+    "report_ready": "📄 Отчёт готов",
+    "position_change": "📈 Изменение позиций",
+    "new_lead": "🎯 Новая заявка",
+}
+
+# Сколько id передавать в одном .in_() (ограничение длины URL PostgREST)
+ID_CHUNK = 200
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def _escape(value) -> str:
+    return escape_markdown(str(value), version=2)
+
+
+def _plain(text: str) -> str:
+    """MarkdownV2 -> простой текст (жирное без звёздочек, без экранирования)"""
+    return re.sub(r"\\(.)", r"\1", re.sub(r"(?<!\\)\*", "", text))
+
+
+def format_notifications(rows: List[Dict]) -> str:
+    """Одно сообщение из нескольких уведомлений (MarkdownV2)"""
+    if len(rows) == 1:
+        row = rows[0]
+        label = _escape(TYPE_LABELS.get(row["type"], "🔔 Уведомление"))
+        lines = [f"{label}: *{_escape(row['title'])}*"]
+        if row.get("message"):
+            lines.append(_escape(row["message"]))
+        return "\n".join(lines)
+
+    lines = [f"🔔 *Уведомления* \\({len(rows)}\\)\n"]
+    for row in rows:
+        label = _escape(TYPE_LABELS.get(row["type"], "🔔"))
+        lines.append(f"{label}: *{_escape(row['title'])}*")
+        if row.get("message"):
+            lines.append(f"   {_escape(row['message'])}")
+    return "\n".join(lines)
+
+
+class NotificationDispatcher:
+    """Пакетная отправка уведомлений из Supabase в Telegram"""
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 500,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        concurrency: int = 20,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock=clock)
+        self.chat_rate = chat_rate
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.concurrency = concurrency
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            "runs": 0,
+            "notifications": 0,
+            "messages": 0,
+            "flood_waits": 0,
+            "failed": 0,
+        }
+
+    async def run_job(self, context):
+        """Колбэк JobQueue"""
+        await self.run_once(context.bot)
+
+    async def run_once(self, bot) -> Dict:
+        """Разослать одну пачку неотправленных уведомлений"""
+        # Не запускаем следующую пачку, пока идёт предыдущая
+        if self._lock.locked():
+            return {"skipped": True}
+
+        async with self._lock:
+            self.stats["runs"] += 1
+            self._prune_buckets()
+            result = await (
+                self.db.table("notifications")
+                .select("id,client_id,type,title,message,created_at")
+                .is_("sent_at", "null")
+                .order("created_at")
+                .limit(self.batch_size)
+                .execute()
+            )
+            rows = result.data or []
+            if not rows:
+                return {"notifications": 0, "messages": 0}
+
+            recipients = await self._recipients({row["client_id"] for row in rows if row.get("client_id")})
+
+            # chat_id -> уведомления (в порядке создания)
+            by_chat: Dict[int, List[Dict]] = {}
+            no_recipients = []
+            for row in rows:
+                chats = recipients.get(row.get("client_id"), set())
+                if not chats:
+                    no_recipients.append(row["id"])
+                for chat_id in chats:
+                    by_chat.setdefault(chat_id, []).append(row)
+
+            # Уведомление отправлено, если дошло хотя бы до одного чата;
+            # отклонено — если все чаты отказали (бот заблокирован и т.п.)
+            delivered: Set[str] = set()
+            rejected: Set[str] = set()
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(chat_id: int, chat_rows: List[Dict]):
+                async with semaphore:
+                    status = await self._send(bot, chat_id, format_notifications(chat_rows))
+                ids = {row["id"] for row in chat_rows}
+                if status == "sent":
+                    delivered.update(ids)
+                elif status == "rejected":
+                    rejected.update(ids)
+
+            await asyncio.gather(*(deliver(c, r) for c, r in by_chat.items()))
+
+            rejected -= delivered
+            now = datetime.now(timezone.utc).isoformat()
+            await self._mark(list(delivered), {"sent_at": now, "send_error": None})
+            await self._mark(list(rejected), {"sent_at": now, "send_error": "rejected"})
+            await self._mark(no_recipients, {"sent_at": now, "send_error": "no recipients"})
+
+            failed = len(rows) - len(delivered) - len(rejected) - len(no_recipients)
+            if failed:
+                logger.warning(f"Notifications not delivered, will retry: {failed}")
+
+            self.stats["notifications"] += len(delivered)
+            return {
+                "notifications": len(delivered),
+                "messages": len(by_chat),
+                "rejected": len(rejected),
+                "no_recipients": len(no_recipients),
+                "failed": failed,
+            }
+
+    async def _recipients(self, client_ids: Set[str]) -> Dict[str, Set[int]]:
+        """client_id -> чаты получателей"""
+        recipients: Dict[str, Set[int]] = {cid: set() for cid in client_ids}
+        if not client_ids:
+            return recipients
+
+        ids = list(client_ids)
+        clients, users = await asyncio.gather(
+            self.db.table("clients").select("id,telegram_chat_id").in_("id", ids).execute(),
+            self.db.table("portal_users").select("client_id,telegram_id").in_("client_id", ids).execute(),
+        )
+        for row in clients.data or []:
+            if row.get("telegram_chat_id"):
+                recipients[row["id"]].add(row["telegram_chat_id"])
+        for row in users.data or []:
+            if row.get("telegram_id"):
+                recipients[row["client_id"]].add(row["telegram_id"])
+        return recipients
+
+    async def _mark(self, ids: List[str], values: Dict):
+        """Пакетно обновить строки notifications"""
+        for i in range(0, len(ids), ID_CHUNK):
+            chunk = ids[i:i + ID_CHUNK]
+            await self.db.table("notifications").update(values).in_("id", chunk).execute()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, 1, clock=self.clock)
+        return bucket
+
+    def _prune_buckets(self):
+        """Выбросить вёдра чатов, которые снова полные: новое будет таким же"""
+        for chat_id in [c for c, bucket in self.chat_buckets.items() if bucket.idle()]:
+            del self.chat_buckets[chat_id]
+
+    async def _send(self, bot, chat_id: int, text: str, retries: int = 3) -> str:
+        """
+        Отправить (с разбиением по длине) с учётом лимитов.
+
+        Возвращает "sent", "rejected" (повторять бессмысленно) или "failed".
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+
+        for part in split_message(text):
+            parse_mode = "MarkdownV2"
+            for attempt in range(retries + 1):
+                await chat_bucket.acquire()
+                await self.global_bucket.acquire()
+                try:
+                    await bot.send_message(chat_id, part, parse_mode=parse_mode)
+                    self.stats["messages"] += 1
+                    break
+                except RetryAfter as e:
+                    self.stats["flood_waits"] += 1
+                    chat_bucket.pause(_retry_seconds(e))
+                except BadRequest as e:
+                    if parse_mode and "parse entities" in str(e).lower():
+                        # Разметка не разобралась — это не повод терять уведомление
+                        logger.warning(f"Notification to {chat_id}: {e}, resending as plain text")
+                        part, parse_mode = _plain(part), None
+                        continue
+                    logger.warning(f"Notification to {chat_id} rejected: {e}")
+                    self.stats["failed"] += 1
+                    return "rejected"
+                except Forbidden as e:
+                    logger.warning(f"Notification to {chat_id} rejected: {e}")
+                    self.stats["failed"] += 1
+                    return "rejected"
+                except TelegramError as e:
+                    logger.error(f"Notification to {chat_id} failed: {e}")
+                    self.stats["failed"] += 1
+                    return "failed"
+            else:
+                self.stats["failed"] += 1
+                return "failed"
+        return "sent"
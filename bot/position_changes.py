@@ -0,0 +1,248 @@
+"""
+Уведомления об изменении позиций
+
+Сравнивает последний снимок positions клиента с предыдущим днём проверки
+(по ключу keyword + search_engine + region) и пишет в notifications одну
+строку position_change на клиента. Сравнение векторное (NumPy): снимки
+превращаются в колонки, совпадающие ключи находятся через сортировку,
+флаги считаются над массивами целиком.
+
+Значимые изменения:
+- запрос вошёл в топ-10;
+- запрос выпал из топ-10;
+- просадка на DROP_THRESHOLD позиций и больше.
+
+Обработанный день клиента запоминается в position_change_checks, поэтому
+задачу можно запускать сколь угодно часто.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Позиция вне выдачи (position IS NULL)
+UNRANKED = 101
+TOP = 10
+
+ENTERED = 1
+LEFT = 2
+DROPPED = 3
+
+KIND_LABELS = {
+    ENTERED: "⬆️ в топ-10",
+    LEFT: "⬇️ из топ-10",
+    DROPPED: "🔻 просадка",
+}
+
+KEY_SEP = "\x1f"
+
+
+def to_columns(rows: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Строки positions -> (ключи, позиции)"""
+    # Ключи — массив объектов: сравниваются через хэши, в <U копировать незачем
+    keys = np.array(
+        [f"{r['keyword']}{KEY_SEP}{r.get('search_engine')}{KEY_SEP}{r.get('region')}" for r in rows],
+        dtype=object
+    )
+    # None -> NaN при сборке массива, дальше — одной операцией
+    positions = np.array([r.get("position") for r in rows], dtype=np.float64)
+    positions = np.where(np.isnan(positions), UNRANKED, positions).astype(np.int32)
+    return keys, positions
+
+
+def _match(prev_keys: np.ndarray, cur_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы совпадающих ключей в обоих снимках"""
+    # Сортировать строки дорого (в NumPy — посимвольно), поэтому ключи
+    # сопоставляются по 64-битным хэшам и затем сверяются. Совпадение хэшей
+    # разных ключей практически невозможно и лишь выкидывает пару из сравнения.
+    prev_hash = np.fromiter(map(hash, prev_keys), dtype=np.int64, count=len(prev_keys))
+    cur_hash = np.fromiter(map(hash, cur_keys), dtype=np.int64, count=len(cur_keys))
+    _, prev_idx, cur_idx = np.intersect1d(prev_hash, cur_hash, return_indices=True)
+    same = prev_keys[prev_idx] == cur_keys[cur_idx]
+    return prev_idx[same], cur_idx[same]
+
+
+def diff_snapshots(
+    previous: Tuple[np.ndarray, np.ndarray],
+    current: Tuple[np.ndarray, np.ndarray],
+    threshold: int = 5
+) -> Dict[str, np.ndarray]:
+    """
+    Значимые изменения между двумя снимками.
+
+    Возвращает колонки keys, previous, current, kind (только помеченные
+    строки), отсортированные по величине изменения. Ключи, которых нет в
+    одном из снимков, не сравниваются.
+    """
+    prev_keys, prev_pos = previous
+    cur_keys, cur_pos = current
+
+    prev_idx, cur_idx = _match(prev_keys, cur_keys)
+    before = prev_pos[prev_idx]
+    after = cur_pos[cur_idx]
+
+    kind = np.zeros(len(after), dtype=np.int8)
+    kind[(after - before >= threshold)] = DROPPED
+    kind[(before > TOP) & (after <= TOP)] = ENTERED
+    kind[(before <= TOP) & (after > TOP)] = LEFT
+
+    flagged = np.flatnonzero(kind)
+    order = flagged[np.argsort(-np.abs(after[flagged] - before[flagged]), kind="stable")]
+    return {
+        "keys": cur_keys[cur_idx[order]],
+        "previous": before[order],
+        "current": after[order],
+        "kind": kind[order],
+    }
+
+
+def _position(value: int) -> str:
+    return "—" if value >= UNRANKED else str(value)
+
+
+def format_changes(changes: Dict[str, np.ndarray], day: str, limit: int = 10) -> Tuple[str, str]:
+    """(title, message) уведомления"""
+    kinds = changes["kind"]
+    counts = {kind: int(np.count_nonzero(kinds == kind)) for kind in KIND_LABELS}
+    summary = ", ".join(f"{KIND_LABELS[k]}: {n}" for k, n in counts.items() if n)
+
+    lines = [f"{day} — {summary}"]
+    for i in range(min(limit, len(kinds))):
+        keyword = changes["keys"][i].split(KEY_SEP, 1)[0]
+        lines.append(
+            f"• {keyword}: {_position(int(changes['previous'][i]))} → {_position(int(changes['current'][i]))}"
+        )
+    if len(kinds) > limit:
+        lines.append(f"... и ещё {len(kinds) - limit}")
+
+    return f"Изменились позиции: {len(kinds)} запросов", "\n".join(lines)
+
+
+class PositionChangeDetector:
+    """Пакетный поиск значимых изменений позиций"""
+
+    def __init__(
+        self,
+        db,
+        threshold: int = 5,
+        lookback_days: int = 30,
+        page_size: int = 1000,
+        concurrency: int = 4
+    ):
+        self.db = db
+        self.threshold = threshold
+        self.lookback_days = lookback_days
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            "runs": 0,
+            "clients": 0,
+            "changes": 0,
+            "notifications": 0,
+        }
+
+    async def run_job(self, context):
+        """Колбэк JobQueue"""
+        await self.run_once()
+
+    async def run_once(self, today: Optional[date] = None) -> Dict:
+        """Проверить всех клиентов с новым днём проверки"""
+        if self._lock.locked():
+            return {"skipped": True}
+
+        async with self._lock:
+            self.stats["runs"] += 1
+            pending = await self._pending_clients(today or date.today())
+            if not pending:
+                return {"clients": 0, "notifications": 0}
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def check(client_id: str, prev_day: str, cur_day: str):
+                async with semaphore:
+                    snapshots = await self._snapshots(client_id, [prev_day, cur_day])
+                changes = diff_snapshots(
+                    to_columns(snapshots.get(prev_day, [])),
+                    to_columns(snapshots.get(cur_day, [])),
+                    self.threshold
+                )
+                return client_id, cur_day, changes
+
+            results = await asyncio.gather(*(check(*p) for p in pending))
+
+            now = datetime.now(timezone.utc).isoformat()
+            notifications = []
+            checks = []
+            for client_id, cur_day, changes in results:
+                count = len(changes["kind"])
+                checks.append({"client_id": client_id, "checked_on": cur_day, "changes": count, "processed_at": now})
+                if count:
+                    title, message = format_changes(changes, cur_day)
+                    notifications.append({
+                        "client_id": client_id,
+                        "type": "position_change",
+                        "title": title,
+                        "message": message,
+                    })
+                    self.stats["changes"] += count
+
+            if notifications:
+                await self.db.table("notifications").insert(notifications).execute()
+            await self.db.table("position_change_checks").upsert(checks, on_conflict="client_id").execute()
+
+            self.stats["clients"] += len(results)
+            self.stats["notifications"] += len(notifications)
+            return {"clients": len(results), "notifications": len(notifications)}
+
+    async def _pending_clients(self, today: date) -> List[Tuple[str, str, str]]:
+        """(client_id, предыдущий день, последний день) для необработанных клиентов"""
+        since = (today - timedelta(days=self.lookback_days)).isoformat()
+        daily, checks = await asyncio.gather(
+            self.db.table("positions_daily")
+            .select("client_id,checked_on")
+            .gte("checked_on", since)
+            .order("checked_on", desc=True)
+            .execute(),
+            self.db.table("position_change_checks").select("client_id,checked_on").execute(),
+        )
+
+        days: Dict[str, List[str]] = {}
+        for row in daily.data or []:
+            days.setdefault(row["client_id"], []).append(row["checked_on"])
+        processed = {row["client_id"]: row["checked_on"] for row in checks.data or []}
+
+        pending = []
+        for client_id, client_days in days.items():
+            client_days.sort(reverse=True)
+            if len(client_days) < 2 or processed.get(client_id) == client_days[0]:
+                continue
+            pending.append((client_id, client_days[1], client_days[0]))
+        return pending
+
+    async def _snapshots(self, client_id: str, days: List[str]) -> Dict[str, List[Dict]]:
+        """Строки positions клиента за дни (постранично)"""
+        snapshots: Dict[str, List[Dict]] = {}
+        start = 0
+        while True:
+            result = await (
+                self.db.table("positions")
+                .select("keyword,search_engine,region,position,checked_on")
+                .eq("client_id", client_id)
+                .in_("checked_on", days)
+                .order("id")
+                .range(start, start + self.page_size - 1)
+                .execute()
+            )
+            rows = result.data or []
+            for row in rows:
+                snapshots.setdefault(row["checked_on"], []).append(row)
+            if len(rows) < self.page_size:
+                return snapshots
+            start += self.page_size
@@ -0,0 +1,332 @@
+"""
+Локальный колоночный кэш истории позиций
+
+История positions клиента хранится на диске тремя колонками (день,
+номер запроса, позиция) в сыром бинарном виде и читается через
+np.memmap. Строки упорядочены по дню, поэтому окно «последние N дней»
+находится двоичным поиском и отдаётся срезом без копирования.
+
+Синхронизация инкрементальная по updated_at (миграция 010): берётся
+самый ранний день среди строк, изменённых начиная с курсора, хвост кэша
+с этого дня перечитывается из Supabase. Курсор сравнивается нестрого —
+строки с тем же updated_at, записанные позже, не теряются, — поэтому
+день курсора перечитывается каждый раз; если хвост не изменился, файлы
+не трогаются. При перезаливке старых дней хвост переписывается в новое
+поколение файлов (уже открытые memmap старого поколения остаются
+валидными).
+
+Удаления дельта по updated_at не видит: строка, удалённая в Supabase из
+дня раньше перечитываемого хвоста, осталась бы в кэше навсегда. Поэтому
+раз в full_rebuild_interval (и при первой синхронизации) история клиента
+перечитывается целиком и переписывается в новое поколение; время
+последней полной пересборки хранится в meta.json.
+
+Кэш читает генератор месячных отчётов (monthly_reports.py): снимки
+первого и последнего дня месяца и перцентили позиций.
+
+Структура каталога клиента:
+    meta.json        — поколение, число строк, курсор updated_at, full_at
+    keywords.json    — ключи запросов (keyword␟search_engine␟region)
+    <gen>.day.i4     — день (число дней от 1970-01-01)
+    <gen>.kw.i4      — номер ключа в keywords.json
+    <gen>.pos.i2     — позиция (UNRANKED — вне выдачи)
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from position_changes import KEY_SEP, UNRANKED
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+
+COLUMNS = {
+    "day": np.int32,
+    "kw": np.int32,
+    "pos": np.int16,
+}
+
+
+def day_number(value) -> int:
+    """date / 'YYYY-MM-DD' -> номер дня"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - EPOCH).days
+
+
+def day_date(number: int) -> date:
+    return EPOCH + timedelta(days=int(number))
+
+
+class ClientHistory:
+    """Снимок истории клиента поверх memmap (только чтение)"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], keywords: List[str]):
+        self.day = columns["day"]
+        self.kw = columns["kw"]
+        self.pos = columns["pos"]
+        self.keywords = keywords
+        self._keyword_ids = {key: i for i, key in enumerate(keywords)}
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def window(self, days: int, until: Optional[date] = None) -> "ClientHistory":
+        """Последние days дней (срез без копирования)"""
+        if not len(self):
+            return self
+        end_day = day_number(until) if until else int(self.day[-1])
+        lo = np.searchsorted(self.day, end_day - days + 1, side="left")
+        hi = np.searchsorted(self.day, end_day, side="right")
+        return ClientHistory(
+            {"day": self.day[lo:hi], "kw": self.kw[lo:hi], "pos": self.pos[lo:hi]},
+            self.keywords
+        )
+
+    def day_rows(self, day) -> List[Dict]:
+        """Строки одного дня в формате positions (keyword, search_engine, region, position)"""
+        number = day_number(day)
+        lo = np.searchsorted(self.day, number, side="left")
+        hi = np.searchsorted(self.day, number, side="right")
+        rows = []
+        for kid, position in zip(self.kw[lo:hi].tolist(), self.pos[lo:hi].tolist()):
+            keyword, search_engine, region = self.keywords[kid].split(KEY_SEP)
+            rows.append({
+                "keyword": keyword,
+                "search_engine": search_engine,
+                "region": region,
+                "position": position if position < UNRANKED else None,
+            })
+        return rows
+
+    def keyword_ids(self, keyword: str) -> List[int]:
+        """Номера ключей запроса (по всем поисковикам/регионам)"""
+        prefix = keyword + KEY_SEP
+        return [i for key, i in self._keyword_ids.items() if key == keyword or key.startswith(prefix)]
+
+    def keyword_trend(self, keyword: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(дни, позиции) запроса; UNRANKED — вне выдачи"""
+        mask = np.isin(self.kw, self.keyword_ids(keyword))
+        return self.day[mask], self.pos[mask]
+
+    def daily_stats(self, percentiles: Tuple[int, ...] = (50, 90)) -> List[Dict]:
+        """По дням: число запросов, средняя позиция, перцентили, доля топ-10"""
+        if not len(self):
+            return []
+
+        starts = np.flatnonzero(np.diff(self.day, prepend=self.day[0] - 1))
+        ends = np.append(starts[1:], len(self.day))
+        ranked = self.pos < UNRANKED
+        ranked_counts = np.add.reduceat(ranked.astype(np.int32), starts)
+        top10 = np.add.reduceat((self.pos <= 10).astype(np.int32), starts)
+        sums = np.add.reduceat(np.where(ranked, self.pos, 0).astype(np.int64), starts)
+
+        stats = []
+        for i, (lo, hi) in enumerate(zip(starts, ends)):
+            positions = self.pos[lo:hi]
+            positions = positions[positions < UNRANKED]
+            row = {
+                "day": day_date(self.day[lo]).isoformat(),
+                "keywords": int(hi - lo),
+                "avg_position": round(float(sums[i]) / int(ranked_counts[i]), 1) if ranked_counts[i] else None,
+                "visibility": round(100.0 * int(top10[i]) / int(hi - lo), 1),
+            }
+            for p in percentiles:
+                row[f"p{p}"] = float(np.percentile(positions, p)) if len(positions) else None
+            stats.append(row)
+        return stats
+
+
+class PositionHistoryCache:
+    """Колоночный кэш positions по клиентам с инкрементальной синхронизацией"""
+
+    def __init__(self, db, root: str, page_size: int = 1000, full_rebuild_interval: float = 7 * 86400,
+                 clock: Callable[[], float] = time.time):
+        self.db = db
+        self.root = root
+        self.page_size = page_size
+        self.full_rebuild_interval = full_rebuild_interval
+        # Время в meta.json переживает процесс, поэтому часы — настенные
+        self.clock = clock
+
+        self.stats = {
+            "syncs": 0,
+            "rows_fetched": 0,
+            "rewrites": 0,
+            "full_rebuilds": 0,
+        }
+
+    def _dir(self, client_id: str) -> str:
+        return os.path.join(self.root, client_id)
+
+    def _meta(self, client_id: str) -> Dict:
+        try:
+            with open(os.path.join(self._dir(client_id), "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "rows": 0, "cursor": None, "full_at": None}
+
+    def _write_json(self, client_id: str, name: str, data):
+        path = os.path.join(self._dir(client_id), name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _keywords(self, client_id: str) -> List[str]:
+        try:
+            with open(os.path.join(self._dir(client_id), "keywords.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _column_path(self, client_id: str, generation: int, name: str) -> str:
+        return os.path.join(self._dir(client_id), f"{generation}.{name}.{np.dtype(COLUMNS[name]).str[1:]}")
+
+    def load(self, client_id: str) -> ClientHistory:
+        """История клиента (memmap, без чтения файлов в память)"""
+        meta = self._meta(client_id)
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if meta["rows"]:
+                columns[name] = np.memmap(
+                    self._column_path(client_id, meta["generation"], name),
+                    dtype=dtype, mode="r", shape=(meta["rows"],)
+                )
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        return ClientHistory(columns, self._keywords(client_id))
+
+    async def sync(self, client_id: str, full: bool = False) -> int:
+        """Догрузить изменения клиента; возвращает число прочитанных строк
+
+        full=True (или истёкший full_rebuild_interval) — перечитать всю
+        историю, чтобы из кэша ушли строки, удалённые в Supabase.
+        """
+        self.stats["syncs"] += 1
+        meta = self._meta(client_id)
+
+        now = self.clock()
+        if full or not meta["cursor"] or now - (meta.get("full_at") or 0) >= self.full_rebuild_interval:
+            rows = await self._fetch(client_id)
+            self.stats["rows_fetched"] += len(rows)
+            self.stats["full_rebuilds"] += 1
+            self._store(client_id, {**meta, "full_at": now}, None, rows)
+            return len(rows)
+
+        # Самый ранний день среди строк, изменённых начиная с курсора
+        result = await (
+            self.db.table("positions")
+            .select("checked_on")
+            .eq("client_id", client_id)
+            .gte("updated_at", meta["cursor"])
+            .order("checked_on")
+            .limit(1)
+            .execute()
+        )
+        if not result.data:
+            return 0
+        since = result.data[0]["checked_on"]
+
+        rows = await self._fetch(client_id, since)
+        self.stats["rows_fetched"] += len(rows)
+        self._store(client_id, meta, day_number(since), rows)
+        return len(rows)
+
+    async def _fetch(self, client_id: str, since: Optional[str] = None) -> List[Dict]:
+        """Все строки клиента с дня since, без since — вся история (постранично, по дню)"""
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            query = (
+                self.db.table("positions")
+                .select("id,keyword,search_engine,region,position,checked_on,updated_at")
+                .eq("client_id", client_id)
+            )
+            if since:
+                query = query.gte("checked_on", since)
+            result = await (
+                query
+                .order("checked_on")
+                .order("id")
+                .range(start, start + self.page_size - 1)
+                .execute()
+            )
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
+
+    def _store(self, client_id: str, meta: Dict, since: Optional[int], rows: List[Dict]):
+        """Заменить строки с дня since (None — все) на rows"""
+        os.makedirs(self._dir(client_id), exist_ok=True)
+
+        keywords = self._keywords(client_id)
+        keyword_ids = {key: i for i, key in enumerate(keywords)}
+        kw = np.empty(len(rows), dtype=COLUMNS["kw"])
+        for i, row in enumerate(rows):
+            key = f"{row['keyword']}{KEY_SEP}{row.get('search_engine')}{KEY_SEP}{row.get('region')}"
+            kid = keyword_ids.get(key)
+            if kid is None:
+                kid = keyword_ids[key] = len(keywords)
+                keywords.append(key)
+            kw[i] = kid
+        new = {
+            "day": np.fromiter((day_number(r["checked_on"]) for r in rows), dtype=COLUMNS["day"], count=len(rows)),
+            "kw": kw,
+            "pos": np.fromiter(
+                (r["position"] if r.get("position") is not None else UNRANKED for r in rows),
+                dtype=COLUMNS["pos"], count=len(rows)
+            ),
+        }
+        self._write_json(client_id, "keywords.json", keywords)
+
+        current = self.load(client_id)
+        keep = int(np.searchsorted(current.day, since, side="left")) if since is not None else 0
+        generation = meta["generation"]
+        cursor = max((r["updated_at"] for r in rows if r.get("updated_at")), default=None)
+        if not cursor or (meta["cursor"] and meta["cursor"] > cursor):
+            cursor = meta["cursor"]
+
+        if len(current) - keep == len(rows) and all(
+            np.array_equal(getattr(current, name)[keep:], values) for name, values in new.items()
+        ):
+            # Перечитанный день курсора не изменился
+            self._write_json(client_id, "meta.json", {**meta, "cursor": cursor})
+            return
+
+        if keep == len(current):
+            # Только новые дни — дописываем в текущее поколение
+            for name, values in new.items():
+                with open(self._column_path(client_id, generation, name), "ab") as f:
+                    f.write(values.tobytes())
+        else:
+            # Перезаписанные дни — новое поколение: сохранённое начало + свежий хвост
+            self.stats["rewrites"] += 1
+            generation += 1
+            for name, values in new.items():
+                old = getattr(current, name)[:keep]
+                with open(self._column_path(client_id, generation, name), "wb") as f:
+                    f.write(np.asarray(old).tobytes())
+                    f.write(values.tobytes())
+
+        self._write_json(client_id, "meta.json", {
+            **meta,
+            "generation": generation,
+            "rows": keep + len(rows),
+            "cursor": cursor,
+        })
+
+        if generation != meta["generation"]:
+            for name in COLUMNS:
+                try:
+                    os.remove(self._column_path(client_id, meta["generation"], name))
+                except FileNotFoundError:
+                    pass
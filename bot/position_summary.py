@@ -0,0 +1,118 @@
+"""
+Сводка позиций клиента для /positions
+
+Данные берутся из заранее посчитанных витрин (миграция 005):
+positions_daily — дневные агрегаты, position_movers — изменения последней
+проверки. На запрос читается пара десятков строк, сырые positions не
+сканируются. Готовые сводки держатся в LRU-кэше, так что повторные
+нажатия не ходят в базу.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from cache import SnapshotCache
+
+logger = logging.getLogger(__name__)
+
+SPARK = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: List[float]) -> str:
+    """Мини-график ряда значений"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK[len(SPARK) // 2] * len(values)
+    return "".join(SPARK[round((v - low) / (high - low) * (len(SPARK) - 1))] for v in values)
+
+
+def format_summary(summary: Optional[Dict]) -> str:
+    """Текст сводки"""
+    if not summary or not summary["days"]:
+        return (
+            "📈 *Позиции в поиске*\n\n"
+            "Данных по позициям пока нет.\n"
+            "Откройте портал для подробностей."
+        )
+
+    days = summary["days"]
+    last = days[-1]
+    msg = [f"📈 *Позиции в поиске* ({last['checked_on']})\n"]
+    msg.append(f"🔎 Запросов: {last['keywords']}")
+    msg.append(f"📊 Средняя позиция: {last['avg_position']}")
+    msg.append(f"🥇 Топ-3: {last['top3']} | 🔟 Топ-10: {last['top10']}")
+
+    visibility = f"👁 Видимость: {last['visibility']}%"
+    if len(days) > 1:
+        diff = float(last["visibility"]) - float(days[0]["visibility"])
+        visibility += f" ({diff:+.1f} за {len(days) - 1} дн.)"
+    msg.append(visibility)
+    if len(days) > 2:
+        msg.append(f"   {sparkline([float(d['visibility']) for d in days])}")
+
+    movers = summary["movers"]
+    up = [m for m in movers if m["delta"] > 0]
+    down = [m for m in movers if m["delta"] < 0]
+    if up:
+        msg.append("\n⬆️ *Выросли:*")
+        for m in up:
+            msg.append(f"• {m['keyword']}: {m['previous']} → {m['current']} (+{m['delta']})")
+    if down:
+        msg.append("\n⬇️ *Упали:*")
+        for m in down:
+            msg.append(f"• {m['keyword']}: {m['previous']} → {m['current']} ({m['delta']})")
+
+    return "\n".join(msg)
+
+
+class PositionSummaries:
+    """Сводки позиций по клиентам с LRU-кэшем"""
+
+    def __init__(
+        self,
+        db,
+        ttl: float = 600,
+        max_clients: int = 256,
+        days: int = 14,
+        movers: int = 5
+    ):
+        self.db = db
+        self.days = days
+        self.movers = movers
+        self.summaries = SnapshotCache(ttl, ttl, max_entries=max_clients)
+
+    async def get(self, client_id: str) -> Dict:
+        """Сводка клиента (из кэша или витрин)"""
+        return await self.summaries.get(client_id, lambda: self._load(client_id))
+
+    def invalidate(self, client_id: str = None):
+        self.summaries.invalidate(client_id)
+
+    async def _load(self, client_id: str) -> Dict:
+        daily, movers = await asyncio.gather(
+            self.db.table("positions_daily")
+            .select("checked_on,keywords,avg_position,top3,top10,visibility")
+            .eq("client_id", client_id)
+            .order("checked_on", desc=True)
+            .limit(self.days)
+            .execute(),
+            # По movers перемешаны рост и падение — берём с запасом
+            self.db.table("position_movers")
+            .select("keyword,previous,current,delta")
+            .eq("client_id", client_id)
+            .order("abs_delta", desc=True)
+            .limit(self.movers * 4)
+            .execute(),
+        )
+
+        rows = movers.data or []
+        up = [m for m in rows if m["delta"] > 0][:self.movers]
+        down = [m for m in rows if m["delta"] < 0][:self.movers]
+        return {
+            "client_id": client_id,
+            "days": list(reversed(daily.data or [])),
+            "movers": up + down,
+        }
@@ -0,0 +1,257 @@
+"""
+Загрузка позиций в таблицу positions
+
+Потоково читает выгрузки позиций и пишет их в Supabase пачками через
+upsert по (client_id, keyword, search_engine, region, checked_on), поэтому
+повторная загрузка того же файла ничего не дублирует. В памяти держится
+не больше concurrency * 2 пачек, так что объём файла не ограничен.
+После загрузки пересчитываются витрины сводки позиций для бота.
+
+Форматы:
+    csv        — колонки keyword (или query), position, [url, search_engine,
+                 region, date/checked_at, client_id]
+    jsonl      — по объекту с теми же полями на строку
+    webmaster  — ответ Яндекс.Вебмастера search-queries/popular
+                 (как в app/api/positions/[domain]/route.ts)
+
+Запуск:
+    python positions_ingest.py --client tvorim --format csv export.csv
+    python positions_ingest.py --client ant --format webmaster --date 2026-01-15 popular.json
+"""
+
+import os
+import csv
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from postgrest.types import ReturnMethod
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_KEY = "client_id,keyword,search_engine,region,checked_on"
+
+
+def _checked_at(value: Optional[str], default: str) -> str:
+    """
+    Дата/время проверки -> timestamptz в UTC.
+
+    Дата без времени — полночь UTC, время без пояса считается UTC (как его
+    прочитает Postgres). Время с поясом переводится в UTC: ключ upsert —
+    день по UTC (checked_on), и checked_at[:10] должен с ним совпадать.
+    """
+    value = (value or default).strip()
+    if "T" not in value and " " not in value:
+        return f"{value[:10]}T00:00:00+00:00"
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+def normalize(raw: Dict, defaults: Dict) -> Optional[Dict]:
+    """Строка выгрузки -> строка positions (None — пропустить)"""
+    keyword = (raw.get("keyword") or raw.get("query") or "").strip()
+    position = raw.get("position")
+    if not keyword or position in (None, ""):
+        return None
+
+    try:
+        position = round(float(position))
+        checked_at = _checked_at(raw.get("checked_at") or raw.get("date"), defaults["date"])
+    except (TypeError, ValueError):
+        return None
+
+    return {
+        "client_id": raw.get("client_id") or defaults["client_id"],
+        "keyword": keyword,
+        "position": position,
+        "url": raw.get("url") or None,
+        "search_engine": raw.get("search_engine") or defaults["search_engine"],
+        "region": raw.get("region") or defaults["region"],
+        "checked_at": checked_at,
+    }
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_webmaster(path: str) -> Iterator[Dict]:
+    """Ответ popular search-queries: средняя позиция показа по запросу"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    checked = data.get("date_to")
+    for q in data.get("queries", []):
+        position = (q.get("indicators") or {}).get("AVG_SHOW_POSITION")
+        if position is None:
+            continue
+        yield {"keyword": q.get("query_text"), "position": position, "date": checked}
+
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+    "webmaster": read_webmaster,
+}
+
+
+def batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """
+    Пачки по size строк.
+
+    Внутри пачки ключ upsert должен быть уникален (иначе Postgres откажет
+    «cannot affect row a second time») — дубликаты схлопываются, побеждает
+    последняя строка.
+    """
+    batch: Dict[tuple, Dict] = {}
+    for row in rows:
+        key = (row["client_id"], row["keyword"], row["search_engine"], row["region"], row["checked_at"][:10])
+        batch[key] = row
+        if len(batch) >= size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+class PositionIngestor:
+    """Пакетный upsert позиций с ограничением параллельности"""
+
+    def __init__(self, db, batch_size: int = 1000, concurrency: int = 4, retries: int = 3):
+        self.db = db
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+
+        self.stats = {
+            "rows": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "failed_rows": 0,
+        }
+
+    async def ingest(self, rows: Iterable[Dict]) -> Dict:
+        """Загрузить строки (уже нормализованные)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                batch = await queue.get()
+                try:
+                    if batch is None:
+                        return
+                    await self._upsert(batch)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for batch in batched(rows, self.batch_size):
+                await queue.put(batch)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        return self.stats
+
+    async def _upsert(self, batch: List[Dict]):
+        for attempt in range(self.retries + 1):
+            try:
+                await (
+                    self.db.table("positions")
+                    .upsert(batch, on_conflict=CONFLICT_KEY, returning=ReturnMethod.minimal)
+                    .execute()
+                )
+                self.stats["rows"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"Positions batch failed ({len(batch)} rows): {e}")
+                    self.stats["failed_batches"] += 1
+                    self.stats["failed_rows"] += len(batch)
+                    return
+                await asyncio.sleep(2 ** attempt)
+
+
+async def ingest_files(
+    db,
+    paths: List[str],
+    fmt: str,
+    defaults: Dict,
+    batch_size: int = 1000,
+    concurrency: int = 4
+) -> Dict:
+    """Загрузить файлы выгрузок и пересчитать витрины сводки позиций"""
+
+    def rows() -> Iterator[Dict]:
+        for path in paths:
+            for raw in READERS[fmt](path):
+                row = normalize(raw, defaults)
+                if row and row["client_id"]:
+                    yield row
+
+    ingestor = PositionIngestor(db, batch_size=batch_size, concurrency=concurrency)
+    stats = await ingestor.ingest(rows())
+
+    # Пересчитать витрины сводки позиций (миграция 005)
+    if stats["rows"]:
+        await db.rpc("refresh_position_rollups").execute()
+    return stats
+
+
+async def run(args) -> Dict:
+    from supabase import acreate_client
+
+    db = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    defaults = {
+        "client_id": args.client,
+        "search_engine": args.engine,
+        "region": args.region,
+        "date": args.date,
+    }
+    return await ingest_files(db, args.files, args.format, defaults, args.batch_size, args.concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка позиций в Supabase")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--format", choices=sorted(READERS), default="csv")
+    parser.add_argument("--client", help="client_id, если его нет в файле")
+    parser.add_argument("--engine", default="yandex")
+    parser.add_argument("--region", default="spb")
+    parser.add_argument("--date", default=date.today().isoformat(), help="дата проверки по умолчанию")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    stats = asyncio.run(run(args))
+    logger.info(f"Positions ingested: {stats}")
+    if stats["failed_rows"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
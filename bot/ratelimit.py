@@ -0,0 +1,77 @@
+"""
+Ограничители частоты запросов
+
+TokenBucket — классическое «ведро токенов»: rate токенов в секунду,
+не больше capacity впрок. Ожидающие обслуживаются по очереди (FIFO).
+pause() блокирует ведро целиком — так обрабатывается Retry-After.
+"""
+
+import time
+import asyncio
+from typing import Callable
+
+# Допуск на округление: после ожидания ровно delay() в ведре может оказаться
+# 0.9999999999999998 токена, а следующая пауза — меньше шага часов
+EPSILON = 1e-9
+
+
+class TokenBucket:
+    """Асинхронное ведро токенов"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Взять токен без ожидания"""
+        now = self.clock()
+        if now < self.blocked_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1 - EPSILON:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена"""
+        now = self.clock()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 - EPSILON else (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> float:
+        """Дождаться токена; возвращает время ожидания в секундах"""
+        waited = 0.0
+        async with self._lock:
+            while not self.try_acquire():
+                wait = self.delay()
+                waited += wait
+                await asyncio.sleep(wait)
+        return waited
+
+    def idle(self) -> bool:
+        """Ведро полное, не заблокировано и никто не ждёт"""
+        now = self.clock()
+        if now < self.blocked_until or self._lock.locked():
+            return False
+        self._refill(now)
+        return self.tokens >= self.capacity - EPSILON
+
+    def pause(self, seconds: float):
+        """Заблокировать ведро на seconds (например, по Retry-After)"""
+        now = self.clock()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
@@ -0,0 +1,160 @@
+"""
+Роли пользователей из portal_users
+
+Все привязанные пользователи (telegram_id -> role, client_id) грузятся
+одним запросом при старте и обновляются раз в ttl секунд, поэтому
+проверка прав — поиск в множестве без обращения к базе на каждый апдейт.
+
+Неизвестный пользователь проверяется в базе точечно (resolve) и
+запоминается как отсутствующий на negative_ttl секунд: новый менеджер
+получает доступ сразу, а посторонние не порождают запросов.
+
+ADMIN_IDS остаются «аварийными» админами на случай недоступной базы.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAFF_ROLES = ("admin", "manager")
+
+
+class RoleCache:
+    """Кэш ролей portal_users"""
+
+    def __init__(
+        self,
+        db=None,
+        static_admins: Iterable[int] = (),
+        ttl: float = 300,
+        negative_ttl: float = 60,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.db = db
+        self.static_admins = frozenset(static_admins)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        # telegram_id -> (role, client_id)
+        self._users: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._admins: Set[int] = set(self.static_admins)
+        self._staff: Set[int] = set(self.static_admins)
+        # telegram_id -> когда не нашли
+        self._missing: Dict[int, float] = {}
+        self._loaded_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "preloads": 0,
+            "lookups": 0,
+            "negative_hits": 0,
+        }
+
+    async def preload(self) -> int:
+        """Загрузить всех пользователей с telegram_id"""
+        if self.db is None:
+            return 0
+
+        result = await (
+            self.db.table("portal_users")
+            .select("telegram_id,role,client_id")
+            .not_.is_("telegram_id", "null")
+            .execute()
+        )
+        users = {
+            row["telegram_id"]: (row.get("role") or "client", row.get("client_id"))
+            for row in result.data or []
+        }
+
+        # Подмена целиком, чтобы проверки не видели полуобновлённых множеств
+        self._users = users
+        self._admins = set(self.static_admins) | {uid for uid, (role, _) in users.items() if role == "admin"}
+        self._staff = set(self.static_admins) | {uid for uid, (role, _) in users.items() if role in STAFF_ROLES}
+        self._missing = {}
+        self._loaded_at = self.clock()
+        self.stats["preloads"] += 1
+        return len(users)
+
+    async def run_job(self, context):
+        """Колбэк JobQueue"""
+        try:
+            await self.preload()
+        except Exception as e:
+            logger.error(f"Roles preload error: {e}")
+
+    def _refresh_if_stale(self):
+        """Фоновое обновление, если снимок устарел (без ожидания)"""
+        if self.db is None or (self._refreshing and not self._refreshing.done()):
+            return
+        if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+            return
+        try:
+            self._refreshing = asyncio.get_running_loop().create_task(self.run_job(None))
+        except RuntimeError:
+            pass
+
+    def role(self, user_id: int) -> Optional[str]:
+        """Роль из кэша (None — неизвестен)"""
+        self._refresh_if_stale()
+        if user_id in self.static_admins:
+            return "admin"
+        entry = self._users.get(user_id)
+        return entry[0] if entry else None
+
+    def is_staff(self, user_id: int) -> bool:
+        """Админ или менеджер"""
+        self._refresh_if_stale()
+        return user_id in self._staff
+
+    def is_admin(self, user_id: int) -> bool:
+        self._refresh_if_stale()
+        return user_id in self._admins
+
+    async def resolve(self, user_id: int) -> Optional[str]:
+        """Роль с точечной проверкой в базе для тех, кого нет в кэше"""
+        role = self.role(user_id)
+        if role or self.db is None:
+            return role
+
+        missing_at = self._missing.get(user_id)
+        if missing_at is not None and self.clock() - missing_at < self.negative_ttl:
+            self.stats["negative_hits"] += 1
+            return None
+
+        self.stats["lookups"] += 1
+        result = await (
+            self.db.table("portal_users")
+            .select("telegram_id,role,client_id")
+            .eq("telegram_id", user_id)
+            .limit(1)
+            .execute()
+        )
+        if not result.data:
+            self._missing[user_id] = self.clock()
+            return None
+
+        row = result.data[0]
+        role = row.get("role") or "client"
+        self._users[user_id] = (role, row.get("client_id"))
+        if role == "admin":
+            self._admins.add(user_id)
+        if role in STAFF_ROLES:
+            self._staff.add(user_id)
+        return role
+
+    async def client_for(self, user_id: int) -> Optional[str]:
+        """Клиент, к которому привязан пользователь"""
+        await self.resolve(user_id)
+        entry = self._users.get(user_id)
+        return entry[1] if entry else None
+
+    def counts(self) -> Dict[str, int]:
+        """Число пользователей по ролям"""
+        counts: Dict[str, int] = {}
+        for role, _ in self._users.values():
+            counts[role] = counts.get(role, 0) + 1
+        return counts
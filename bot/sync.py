@@ -0,0 +1,179 @@
+"""
+Инкрементальная синхронизация задач Asana
+
+Локальное хранилище активных задач проекта (gid -> задача), которое
+подтягивает только изменения через /events и sync-токены. Полная
+перезагрузка проекта выполняется только при первом запуске и когда Asana
+сообщает, что токен истёк (412 Precondition Failed).
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStore:
+    """
+    Локальное хранилище активных задач по gid.
+
+    Слушатели (например, WorkloadIndex) получают каждое изменение через
+    upsert(task) / remove(gid) / clear().
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict] = {}
+        self.version = 0
+        self.listeners: List = []
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, gid: str) -> bool:
+        return gid in self._tasks
+
+    def get(self, gid: str) -> Optional[Dict]:
+        return self._tasks.get(gid)
+
+    def tasks(self) -> Iterable[Dict]:
+        return self._tasks.values()
+
+    def upsert(self, task: Dict):
+        """Добавить/обновить задачу; завершённые удаляются"""
+        if task.get("completed"):
+            self.remove(task["gid"])
+            return
+        self._tasks[task["gid"]] = task
+        self.version += 1
+        for listener in self.listeners:
+            listener.upsert(task)
+
+    def remove(self, gid: str):
+        if self._tasks.pop(gid, None) is not None:
+            self.version += 1
+            for listener in self.listeners:
+                listener.remove(gid)
+
+    def clear(self):
+        self._tasks.clear()
+        self.version += 1
+        for listener in self.listeners:
+            listener.clear()
+
+
+class TaskSync:
+    """Синхронизация TaskStore с проектом Asana по событиям"""
+
+    # События, после которых задачу нужно перечитать
+    REFETCH_ACTIONS = {"added", "changed", "undeleted"}
+
+    def __init__(
+        self,
+        asana,
+        project_id: str,
+        store: Optional[TaskStore] = None,
+        fetch_concurrency: int = 10
+    ):
+        self.asana = asana
+        self.project_id = project_id
+        self.store = store or TaskStore()
+        self.sync_token: Optional[str] = None
+        self.fetch_concurrency = fetch_concurrency
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            "full_resyncs": 0,
+            "delta_syncs": 0,
+            "events": 0,
+            "refetched": 0,
+        }
+
+    async def refresh(self) -> Dict:
+        """Подтянуть изменения (или перезагрузить проект целиком)"""
+        async with self._lock:
+            if self.sync_token is None:
+                return await self._full_resync()
+
+            events = []
+            sync = self.sync_token
+            while True:
+                result = await self.asana.get_events(self.project_id, sync)
+                if result.get("expired"):
+                    logger.info(f"Sync token expired for project {self.project_id}, full resync")
+                    return await self._full_resync(result.get("sync"))
+                events.extend(result.get("data", []))
+                sync = result.get("sync") or sync
+                if not result.get("has_more"):
+                    break
+
+            changed = await self._apply_events(events)
+            self.sync_token = sync
+            self.stats["delta_syncs"] += 1
+            self.stats["events"] += len(events)
+            return {"mode": "delta", "events": len(events), "changed": changed}
+
+    async def _full_resync(self, sync_token: Optional[str] = None) -> Dict:
+        """Полная загрузка проекта"""
+        # Токен берём до загрузки: изменения, случившиеся во время обхода
+        # страниц, придут следующей дельтой
+        if sync_token is None:
+            result = await self.asana.get_events(self.project_id, None)
+            sync_token = result.get("sync")
+
+        self.store.clear()
+        async for page in self.asana.iter_task_pages(project_id=self.project_id):
+            for task in page:
+                self.store.upsert(task)
+
+        self.sync_token = sync_token
+        self.stats["full_resyncs"] += 1
+        return {"mode": "full", "events": 0, "changed": len(self.store)}
+
+    async def _apply_events(self, events: List[Dict]) -> int:
+        """Применить события к хранилищу"""
+        to_fetch = set()
+        to_remove = set()
+
+        for event in events:
+            resource = event.get("resource") or {}
+            if resource.get("resource_type") != "task":
+                continue
+            gid = resource.get("gid")
+            action = event.get("action")
+            parent = event.get("parent") or {}
+
+            if action == "deleted" or (
+                action == "removed" and parent.get("gid") == self.project_id
+            ):
+                to_remove.add(gid)
+                to_fetch.discard(gid)
+            elif action in self.REFETCH_ACTIONS:
+                to_fetch.add(gid)
+                to_remove.discard(gid)
+
+        for gid in to_remove:
+            self.store.remove(gid)
+
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def fetch(gid: str):
+            async with semaphore:
+                return gid, await self.asana.get_task(gid)
+
+        results = await asyncio.gather(*(fetch(gid) for gid in to_fetch))
+        for gid, task in results:
+            if task is None or not self._in_project(task):
+                self.store.remove(gid)
+            else:
+                self.store.upsert(task)
+
+        self.stats["refetched"] += len(to_fetch)
+        return len(to_fetch) + len(to_remove)
+
+    def _in_project(self, task: Dict) -> bool:
+        """Задача всё ещё в проекте (если Asana вернула список проектов)"""
+        projects = task.get("projects")
+        if projects is None:
+            return True
+        return any(p.get("gid") == self.project_id for p in projects)
@@ -0,0 +1,136 @@
+"""
+Постраничные списки задач
+
+Список фиксируется один раз — неизменяемый снимок строк задач, — а
+страницы собираются из него по запросу. Кнопки навигации несут только
+id снимка и номер страницы (callback_data "pg:<sid>:<page>"), поэтому
+листание не ходит в Asana и не пересчитывает анализ.
+
+Страница ограничена и числом задач, и длиной текста: границы считаются
+при захвате снимка так, чтобы текст страницы с заголовком укладывался
+в лимит сообщения Telegram.
+
+Снимки держатся в LRU; после вытеснения (или рестарта) кнопка сообщает,
+что список устарел.
+"""
+
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from textutil import MESSAGE_LIMIT, split_message
+
+PREFIX = "pg:"
+NOOP = "pg:-"
+
+# Запас под заголовок и пометку о возрасте данных
+RESERVE = 300
+
+
+def format_task(number: int, task: Dict) -> str:
+    """Две строки задачи: название и срок/исполнитель"""
+    name = (task.get("name") or "Без названия")[:40]
+    due = task.get("due_on") or "без срока"
+    assignee = task.get("assignee") or {}
+    who = assignee.get("name") or "—"
+    return f"{number}. {name}\n   📅 {due} | 👤 {who}"
+
+
+class TaskListSnapshot:
+    """Зафиксированный список: строки задач и границы страниц"""
+
+    def __init__(self, title: str, tasks: List[Dict], page_size: int, limit: int = MESSAGE_LIMIT):
+        self.title = title
+        self.items: Tuple[str, ...] = tuple(format_task(i, t) for i, t in enumerate(tasks, 1))
+        self.bounds: Tuple[Tuple[int, int], ...] = self._paginate(page_size, limit - RESERVE)
+        self._rendered: Dict[int, str] = {}
+
+    def _paginate(self, page_size: int, budget: int) -> Tuple[Tuple[int, int], ...]:
+        bounds = []
+        start = size = 0
+        for i, item in enumerate(self.items):
+            if i > start and (i - start >= page_size or size + len(item) + 1 > budget):
+                bounds.append((start, i))
+                start, size = i, 0
+            size += len(item) + 1
+        if start < len(self.items):
+            bounds.append((start, len(self.items)))
+        return tuple(bounds)
+
+    @property
+    def pages(self) -> int:
+        return max(1, len(self.bounds))
+
+    def render(self, page: int) -> str:
+        """Текст страницы (собирается при первом обращении)"""
+        if not self.items:
+            return f"✅ {self.title}: нет задач"
+
+        page = min(max(page, 0), self.pages - 1)
+        text = self._rendered.get(page)
+        if text is None:
+            header = f"📋 *{self.title}* ({len(self.items)})"
+            if self.pages > 1:
+                header += f" — стр. {page + 1}/{self.pages}"
+            start, end = self.bounds[page]
+            text = "\n".join((header, "", *self.items[start:end]))
+            # Строка длиннее лимита (чего при обрезке названий быть не должно)
+            text = split_message(text, MESSAGE_LIMIT - RESERVE)[0]
+            self._rendered[page] = text
+        return text
+
+
+class TaskPages:
+    """LRU снимков списков по id"""
+
+    def __init__(self, page_size: int = 15, max_snapshots: int = 200):
+        self.page_size = page_size
+        self.max_snapshots = max_snapshots
+        self._snapshots: Dict[str, TaskListSnapshot] = {}
+
+        self.stats = {
+            "captured": 0,
+            "pages": 0,
+            "expired": 0,
+        }
+
+    def capture(self, title: str, tasks: List[Dict]) -> str:
+        """Зафиксировать список; возвращает id снимка"""
+        sid = secrets.token_urlsafe(4)
+        while sid in self._snapshots:
+            sid = secrets.token_urlsafe(4)
+
+        self._snapshots[sid] = TaskListSnapshot(title, tasks, self.page_size)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.pop(next(iter(self._snapshots)))
+        self.stats["captured"] += 1
+        return sid
+
+    def get(self, sid: str) -> Optional[TaskListSnapshot]:
+        snapshot = self._snapshots.get(sid)
+        if snapshot is None:
+            self.stats["expired"] += 1
+            return None
+        # Порядок словаря — порядок использования
+        self._snapshots[sid] = self._snapshots.pop(sid)
+        self.stats["pages"] += 1
+        return snapshot
+
+    @staticmethod
+    def callback(sid: str, page: int) -> str:
+        return f"{PREFIX}{sid}:{page}"
+
+    @staticmethod
+    def parse(data: str) -> Optional[Tuple[str, int]]:
+        """'pg:<sid>:<page>' -> (sid, page); None для чужих и служебных данных"""
+        if not data.startswith(PREFIX) or data == NOOP:
+            return None
+        sid, _, page = data[len(PREFIX):].rpartition(":")
+        if not sid or not page.isdigit():
+            return None
+        return sid, int(page)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._snapshots
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
@@ -0,0 +1,62 @@
+"""
+Проекции полей и разбор ответов Asana
+
+Каждому потребителю — только те поля, которые он показывает или по
+которым считает: описания задач (notes) не нужны ни одному отчёту, а на
+больших проектах это основная часть ответа.
+
+Ответы разбираются orjson (если установлен, иначе стандартный json), а
+задачи ужимаются: одинаковые исполнители — один общий объект на всех,
+служебные resource_type отбрасываются.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+# Потребитель -> opt_fields
+TASK_FIELDS = {
+    # Хранилище задач для анализа, списков, дайджеста и /trend
+    "sync": "name,due_on,assignee.name,completed",
+    # Перечитывание по событию: плюс проекты — осталась ли задача в проекте
+    "refetch": "name,due_on,assignee.name,completed,projects",
+    # Поиск узких отчётов: created_at нужен для листания
+    "search": "name,due_on,assignee.name,created_at",
+    # Месячные отчёты клиентов
+    "monthly": "name,completed,completed_at",
+}
+
+
+def loads(content: bytes):
+    """JSON из тела ответа"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class TaskRecords:
+    """Ужатие задач с общими объектами исполнителей"""
+
+    def __init__(self):
+        # gid исполнителя -> общий {"gid", "name"}
+        self._assignees: Dict[str, Dict] = {}
+
+    def compact(self, task: Optional[Dict]) -> Optional[Dict]:
+        if task is None:
+            return None
+        task.pop("resource_type", None)
+        assignee = task.get("assignee")
+        if assignee:
+            shared = self._assignees.get(assignee.get("gid"))
+            if shared is None or shared.get("name") != assignee.get("name"):
+                shared = {"gid": assignee.get("gid"), "name": assignee.get("name")}
+                self._assignees[shared["gid"]] = shared
+            task["assignee"] = shared
+        return task
+
+    def compact_page(self, page: List[Dict]) -> List[Dict]:
+        return [self.compact(task) for task in page]
@@ -0,0 +1,180 @@
+"""
+Метрики времени выполнения
+
+Гистограммы длительностей (обработчики, запросы к Asana, шаги анализа)
+и счётчики в памяти процесса. Гистограмма хранит только счётчики по
+фиксированным корзинам, поэтому память не растёт с числом наблюдений,
+а p50/p95/p99 оцениваются интерполяцией внутри корзины.
+
+Экспорт:
+- render_prometheus() — текстовый формат Prometheus (/metrics в webhook-режиме);
+- format_summary() — сводка для /stats.
+
+Использование:
+    with telemetry.timer("analyze_seconds", step="merge"):
+        ...
+    telemetry.count("asana_response_bytes_total", len(body), endpoint="/tasks")
+"""
+
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин, секунды: от 1 мс до 60 с
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.35, 0.5,
+    0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Оценка перцентиля (q от 0 до 100)"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Telemetry:
+    """Реестр гистограмм и счётчиков"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        # Внешние счётчики (кэши и т.п.): name -> () -> {labels: value}
+        self.collectors: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = self._labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = self._labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def collector(self, name: str, collect: Callable[[], Dict[Labels, float]]):
+        """Счётчик, значение которого читается при экспорте"""
+        self.collectors[name] = collect
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[Dict]:
+        """
+        Замер блока. Метки можно дополнить внутри блока через
+        возвращаемый словарь (например, статус ответа).
+        """
+        extra: Dict = {}
+        started = self.clock()
+        try:
+            yield extra
+        finally:
+            self.observe(name, self.clock() - started, **labels, **extra)
+
+    def render_prometheus(self, prefix: str = "artvision_bot_") -> str:
+        """Текстовый формат Prometheus"""
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines: List[str] = []
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for labels, h in sorted(series.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f"{prefix}{name}_bucket{fmt(labels, (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{prefix}{name}_bucket{fmt(labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{prefix}{name}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{prefix}{name}_count{fmt(labels)} {h.count}")
+
+        counters = dict(self.counters)
+        for name, collect in self.collectors.items():
+            try:
+                counters[name] = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {e}")
+        for name, series in sorted(counters.items()):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{prefix}{name}{fmt(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self, limit: int = 25) -> str:
+        """Сводка для Telegram: самые частые серии с p50/p95/p99"""
+        rows = []
+        for name, series in self.histograms.items():
+            for labels, h in series.items():
+                rows.append((h.count, name, labels, h))
+        rows.sort(key=lambda r: -r[0])
+
+        if not rows:
+            return "Замеров пока нет."
+
+        lines = []
+        for count, name, labels, h in rows[:limit]:
+            title = name + (" " + " ".join(v for _, v in labels) if labels else "")
+            lines.append(
+                f"• `{title}` ×{count}: "
+                f"p50 {_ms(h.percentile(50))}, p95 {_ms(h.percentile(95))}, "
+                f"p99 {_ms(h.percentile(99))}, max {_ms(h.max)}"
+            )
+        if len(rows) > limit:
+            lines.append(f"... и ещё {len(rows) - limit} серий")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ms(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    return f"{seconds * 1000:.0f} мс" if seconds < 10 else f"{seconds:.1f} с"
+
+
+# Общий реестр процесса
+telemetry = Telemetry()
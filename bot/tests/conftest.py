@@ -0,0 +1,40 @@
+"""
+Общие фикстуры тестов бота
+
+Модули бота импортируются как из рабочей директории bot/ (так их
+запускает Render), поэтому каталог добавляется в sys.path.
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REAL_SLEEP = asyncio.sleep
+
+
+class FakeTime:
+    """Часы и asyncio.sleep без реального ожидания: сон сдвигает часы"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float, result=None):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await REAL_SLEEP(0)
+        return result
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(asyncio, "sleep", fake.sleep)
+    return fake
@@ -0,0 +1,256 @@
+"""
+Supabase в памяти для тестов
+
+Повторяет ту часть асинхронного клиента, которой пользуется бот:
+db.table(...).select/eq/.../execute(), upsert/insert/update/delete и
+db.rpc(...).execute(). Фильтры, сортировка и range работают как в
+PostgREST; upsert проверяет ключ конфликта так же строго, как Postgres
+(два раза одну строку в одном запросе — ошибка).
+
+- generated: вычисляемые колонки таблицы (как checked_on в positions);
+- rpcs: обработчики RPC по имени;
+- latency / fail_next: задержка и отказ следующих execute();
+- calls и max_in_flight — журнал запросов и пик параллельных.
+"""
+
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+
+class APIError(Exception):
+    """Ошибка PostgREST"""
+
+
+def utc_day(value: str) -> str:
+    """(checked_at AT TIME ZONE 'UTC')::date"""
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).date().isoformat()
+
+
+POSITIONS_GENERATED = {"checked_on": lambda row: utc_day(row["checked_at"])}
+
+
+class Result:
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class Query:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns: Optional[List[str]] = None
+        self.filters: List[Callable[[Dict], bool]] = []
+        self.orders: List[tuple] = []
+        self.limit_to: Optional[int] = None
+        self.range_to: Optional[tuple] = None
+        self.values = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self._negate = False
+
+    # ─── построение ───
+
+    def select(self, columns: str = "*", **kwargs):
+        if columns != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def _filter(self, column: str, test: Callable):
+        negate, self._negate = self._negate, False
+        self.filters.append(lambda row: negate != test(row.get(column)))
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: v != value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(column, lambda v: v in values)
+
+    def is_(self, column, value):
+        expected = None if value in (None, "null") else value
+        return self._filter(column, lambda v: v is expected if expected is None else v == expected)
+
+    def gt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v > value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v >= value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v < value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v <= value)
+
+    def order(self, column, desc: bool = False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.limit_to = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.range_to = (start, end)
+        return self
+
+    def upsert(self, values, on_conflict: Optional[str] = None, ignore_duplicates: bool = False, **kwargs):
+        self.op = "upsert"
+        self.values = values if isinstance(values, list) else [values]
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def insert(self, values, **kwargs):
+        self.op = "insert"
+        self.values = values if isinstance(values, list) else [values]
+        return self
+
+    def update(self, values, **kwargs):
+        self.op = "update"
+        self.values = values
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    # ─── выполнение ───
+
+    async def execute(self) -> Result:
+        return await self.db._execute(self)
+
+    def _matches(self, row: Dict) -> bool:
+        return all(test(row) for test in self.filters)
+
+    def _project(self, row: Dict) -> Dict:
+        if self.columns is None:
+            return dict(row)
+        return {c: row.get(c) for c in self.columns}
+
+
+class FakeSupabase:
+    def __init__(
+        self,
+        tables: Optional[Dict[str, List[Dict]]] = None,
+        generated: Optional[Dict[str, Dict[str, Callable]]] = None,
+        rpcs: Optional[Dict[str, Callable]] = None,
+        latency: float = 0.0,
+        defaults: Optional[Dict[str, Dict]] = None
+    ):
+        self.tables: Dict[str, List[Dict]] = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.generated = generated or {}
+        self.rpcs = rpcs or {}
+        self.defaults = defaults or {}  # DEFAULT колонок: применяются только к новым строкам
+        self.latency = latency
+        self.fail_next = 0
+        self.calls: List[tuple] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._ids = itertools.count(1)
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None):
+        db = self
+
+        class Call:
+            async def execute(self):
+                db.calls.append(("rpc", name, "call"))
+                handler = db.rpcs.get(name)
+                return Result(handler(db, params or {}) if handler else [])
+
+        return Call()
+
+    def _generate(self, table: str, row: Dict) -> Dict:
+        for column, compute in self.generated.get(table, {}).items():
+            row[column] = compute(row)
+        return row
+
+    async def _execute(self, query: Query) -> Result:
+        self.calls.append((query.table, query.op, len(query.values) if isinstance(query.values, list) else None))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.fail_next:
+                self.fail_next -= 1
+                raise APIError("injected failure")
+            return getattr(self, f"_{query.op}")(query, self.tables.setdefault(query.table, []))
+        finally:
+            self.in_flight -= 1
+
+    def _select(self, query: Query, rows: List[Dict]) -> Result:
+        found = [row for row in rows if query._matches(row)]
+        for column, desc in reversed(query.orders):
+            found.sort(key=lambda r: (r.get(column) is None, r.get(column) if r.get(column) is not None else ""), reverse=desc)
+        if query.range_to:
+            start, end = query.range_to
+            found = found[start:end + 1]
+        if query.limit_to is not None:
+            found = found[:query.limit_to]
+        return Result([query._project(row) for row in found])
+
+    def _insert(self, query: Query, rows: List[Dict]) -> Result:
+        inserted = []
+        for values in query.values:
+            row = self._generate(query.table, {"id": next(self._ids), **self.defaults.get(query.table, {}), **values})
+            rows.append(row)
+            inserted.append(dict(row))
+        return Result(inserted)
+
+    def _upsert(self, query: Query, rows: List[Dict]) -> Result:
+        keys = (query.on_conflict or "id").split(",")
+        index = {tuple(row.get(k) for k in keys): row for row in rows}
+        seen = set()
+        written = []
+        for values in query.values:
+            row = self._generate(query.table, dict(values))
+            key = tuple(row.get(k) for k in keys)
+            if key in seen:
+                raise APIError("ON CONFLICT DO UPDATE command cannot affect row a second time")
+            seen.add(key)
+            existing = index.get(key)
+            if existing is None:
+                row = {**self.defaults.get(query.table, {}), **row}
+                row.setdefault("id", next(self._ids))
+                rows.append(row)
+                index[key] = row
+            elif not query.ignore_duplicates:
+                existing.update(values)
+                self._generate(query.table, existing)
+            written.append(dict(index[key]))
+        return Result(written)
+
+    def _update(self, query: Query, rows: List[Dict]) -> Result:
+        updated = []
+        for row in rows:
+            if query._matches(row):
+                row.update(query.values)
+                self._generate(query.table, row)
+                updated.append(dict(row))
+        return Result(updated)
+
+    def _delete(self, query: Query, rows: List[Dict]) -> Result:
+        kept = [row for row in rows if not query._matches(row)]
+        deleted = [dict(row) for row in rows if query._matches(row)]
+        rows[:] = kept
+        return Result(deleted)
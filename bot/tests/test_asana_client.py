@@ -0,0 +1,348 @@
+"""AsanaClient: повторы по 429/5xx и постраничный обход (httpx.MockTransport)"""
+
+import time
+import asyncio
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import asana_client
+import conftest
+import main
+from asana_client import AsanaClient, AsanaError, SearchPagingError
+from main import TaskAnalyzer
+from ratelimit import TokenBucket
+
+_tokens = itertools.count()
+
+
+def make_client(handler, fake_time) -> AsanaClient:
+    """Клиент с мок-транспортом и ведром на фальшивых часах"""
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    # Лимитеры общие на токен — у каждого теста свой
+    client = AsanaClient(f"test-token-{next(_tokens)}", http=http)
+    client.bucket = TokenBucket(asana_client.ASANA_RATE_PER_MIN / 60, asana_client.ASANA_BURST, clock=fake_time.clock)
+    return client
+
+
+def replies(*responses):
+    """Обработчик, отдающий ответы по очереди; запросы пишутся в .requests"""
+    queue = list(responses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        handler.requests.append(request)
+        response = queue.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    handler.requests = []
+    return handler
+
+
+def ok(data=None) -> httpx.Response:
+    return httpx.Response(200, json={"data": data if data is not None else {"gid": "1"}})
+
+
+def error(status: int, **kwargs) -> httpx.Response:
+    return httpx.Response(status, json={"errors": [{"message": f"status {status}"}]}, **kwargs)
+
+
+URL = f"{AsanaClient.BASE_URL}/tasks/1"
+
+
+# ─── 429 и повторы ───
+
+def test_429_waits_retry_after_and_blocks_bucket(fake_time):
+    handler = replies(error(429, headers={"Retry-After": "7"}), ok())
+    client = make_client(handler, fake_time)
+
+    resp = asyncio.run(client._request("GET", URL))
+
+    assert resp.status_code == 200
+    assert len(handler.requests) == 2
+    assert client.stats["throttled"] == 1
+    assert client.stats["retried"] == 1
+    # Пауза ровно по Retry-After, без экспоненты
+    assert 7.0 in fake_time.sleeps
+    assert fake_time.now >= 7.0
+    assert client.bucket.blocked_until == 7.0
+
+
+def test_429_without_retry_after_uses_backoff(fake_time, monkeypatch):
+    monkeypatch.setattr(asana_client, "ASANA_BACKOFF_BASE", 2.0)
+    handler = replies(error(429), ok())
+    client = make_client(handler, fake_time)
+
+    asyncio.run(client._request("GET", URL))
+
+    assert client.stats["throttled"] == 1
+    assert 1.0 <= fake_time.sleeps[0] <= 2.0
+    assert client.bucket.blocked_until == 0.0
+
+
+def test_5xx_retried_with_exponential_backoff(fake_time, monkeypatch):
+    monkeypatch.setattr(asana_client, "ASANA_BACKOFF_BASE", 1.0)
+    handler = replies(error(500), error(503), ok())
+    client = make_client(handler, fake_time)
+
+    resp = asyncio.run(client._request("GET", URL))
+
+    assert resp.status_code == 200
+    assert client.stats["retried"] == 2
+    first, second = fake_time.sleeps
+    # Джиттер: от половины до полной паузы попытки
+    assert 0.5 <= first <= 1.0
+    assert 1.0 <= second <= 2.0
+
+
+def test_5xx_gives_up_after_max_retries(fake_time, monkeypatch):
+    monkeypatch.setattr(asana_client, "ASANA_MAX_RETRIES", 2)
+    handler = replies(error(502), error(502), error(502))
+    client = make_client(handler, fake_time)
+
+    with pytest.raises(AsanaError) as exc:
+        asyncio.run(client._request("GET", URL))
+
+    assert exc.value.status == 502
+    assert len(handler.requests) == 3
+    assert client.stats["failed"] == 1
+
+
+def test_network_error_retried(fake_time):
+    handler = replies(httpx.ConnectError("connection refused"), ok())
+    client = make_client(handler, fake_time)
+
+    resp = asyncio.run(client._request("GET", URL))
+
+    assert resp.status_code == 200
+    assert client.stats["retried"] == 1
+
+
+def test_4xx_not_retried(fake_time):
+    handler = replies(error(400))
+    client = make_client(handler, fake_time)
+
+    with pytest.raises(AsanaError) as exc:
+        asyncio.run(client._request("GET", URL))
+
+    assert exc.value.status == 400
+    assert len(handler.requests) == 1
+    assert fake_time.sleeps == []
+
+
+@pytest.mark.parametrize("status", [403, 404])
+def test_get_task_missing_or_private_is_none(fake_time, status):
+    client = make_client(replies(error(status)), fake_time)
+
+    assert asyncio.run(client.get_task("1")) is None
+    assert client.stats["failed"] == 0
+
+
+# ─── Постраничный обход ───
+
+def offset_pages(tasks, seen_params):
+    """Коллекция Asana с next_page.offset"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        seen_params.append(params)
+        start = int(params.get("offset", 0))
+        limit = int(params["limit"])
+        page = tasks[start:start + limit]
+        end = start + len(page)
+        next_page = {"offset": str(end)} if end < len(tasks) else None
+        return httpx.Response(200, json={"data": page, "next_page": next_page})
+
+    return handler
+
+
+def collect(pages) -> list:
+    async def run():
+        return [page async for page in pages]
+    return asyncio.run(run())
+
+
+def test_iter_pages_follows_offsets(fake_time):
+    tasks = [{"gid": str(i), "name": f"T{i}"} for i in range(250)]
+    params = []
+    client = make_client(offset_pages(tasks, params), fake_time)
+
+    pages = collect(client._iter_pages(f"{AsanaClient.BASE_URL}/tasks", {"limit": 100}))
+
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert [t["gid"] for page in pages for t in page] == [t["gid"] for t in tasks]
+    assert [p.get("offset") for p in params] == [None, "100", "200"]
+
+
+def test_iter_pages_stops_at_max_items(fake_time):
+    tasks = [{"gid": str(i)} for i in range(250)]
+    params = []
+    client = make_client(offset_pages(tasks, params), fake_time)
+
+    pages = collect(client._iter_pages(f"{AsanaClient.BASE_URL}/tasks", {"limit": 100}, max_items=120))
+
+    assert sum(len(page) for page in pages) == 120
+    # Третья страница не запрашивается
+    assert len(params) == 2
+
+
+def test_iter_task_pages_compacts_assignees(fake_time):
+    tasks = [{"gid": str(i), "resource_type": "task", "assignee": {"gid": "7", "name": "Ann"}} for i in range(3)]
+    client = make_client(offset_pages(tasks, []), fake_time)
+
+    pages = collect(client.iter_task_pages(project_id="p1"))
+
+    first, second, third = pages[0]
+    assert "resource_type" not in first
+    assert first["assignee"] is second["assignee"] is third["assignee"]
+
+
+def test_iter_task_pages_prefetches_next_page(fake_time, monkeypatch):
+    # Частоту проверяют тесты выше; здесь всем 50 страницам хватает ведра
+    monkeypatch.setattr(asana_client, "ASANA_BURST", 100)
+    tasks = [{"gid": str(i)} for i in range(5000)]
+    params = []
+    client = make_client(offset_pages(tasks, params), fake_time)
+    requested_while_processing = []
+
+    async def run():
+        async for page in client.iter_task_pages(project_id="p1"):
+            # «Обработка» страницы: за это время уходит запрос следующей
+            await conftest.REAL_SLEEP(0.002)
+            requested_while_processing.append(len(params))
+
+    asyncio.run(run())
+
+    assert len(params) == 50
+    # Пока обрабатывается страница N, страница N + 1 уже запрошена
+    assert requested_while_processing == [min(n + 2, 50) for n in range(50)]
+
+
+def thousands_of_tasks(count: int):
+    """Проект: каждая пятая просрочена, каждая седьмая без исполнителя"""
+    return [
+        {
+            "gid": str(i),
+            "name": f"Задача {i}",
+            "completed": False,
+            "due_on": f"2020-01-{i % 28 + 1:02d}" if i % 5 == 0 else f"2099-01-{i % 28 + 1:02d}",
+            "assignee": None if i % 7 == 0 else {"gid": str(i % 12), "name": f"Специалист {i % 12}"},
+        }
+        for i in range(count)
+    ]
+
+
+def fake_asana_project(tasks, seen_params):
+    """/events без токена — 412 с новым токеном, /tasks — страницы по offset"""
+    pages = offset_pages(tasks, seen_params)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/events"):
+            return httpx.Response(412, json={"sync": "token-1", "errors": [{"message": "Sync token invalid"}]})
+        return pages(request)
+
+    return handler
+
+
+def test_analyze_workload_counts_every_page(fake_time, monkeypatch):
+    monkeypatch.setattr(asana_client, "ASANA_BURST", 100)
+    tasks = thousands_of_tasks(5000)
+    params = []
+    analyzer = TaskAnalyzer(make_client(fake_asana_project(tasks, params), fake_time))
+
+    analysis = asyncio.run(analyzer.analyze_workload("p1"))
+
+    assert len(params) == 50
+    assert [p.get("offset") for p in params] == [None] + [str(n * 100) for n in range(1, 50)]
+    assert all(p["project"] == "p1" and p["limit"] == "100" for p in params)
+    assert analysis["total_active"] == 5000
+    assert len(analysis["overdue"]) == 1000
+    assert len(analysis["no_assignee"]) == len([t for t in tasks if t["assignee"] is None])
+    assigned = sum(len(v) for v in analysis["by_assignee"].values())
+    assert assigned == 5000 - len(analysis["no_assignee"])
+    assert len(analysis["by_assignee"]) == 12
+
+
+def search_workspace(tasks, seen_params):
+    """Поиск Asana: сортировка по created_at, фильтр created_at.after, без offset"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        seen_params.append(params)
+        after = params.get("created_at.after")
+        found = [
+            t for t in tasks
+            if after is None or datetime.fromisoformat(t["created_at"].replace("Z", "+00:00")) > datetime.fromisoformat(after)
+        ]
+        return httpx.Response(200, json={"data": found[:int(params["limit"])]})
+
+    return handler
+
+
+def created(ms: int) -> str:
+    moment = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=ms)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def test_iter_search_pages_walks_created_at(fake_time):
+    # Пары задач в одну миллисекунду, в том числе на границах страниц
+    tasks = [{"gid": str(i), "name": f"T{i}", "created_at": created(i // 2)} for i in range(250)]
+    params = []
+    client = make_client(search_workspace(tasks, params), fake_time)
+
+    pages = collect(client.iter_search_pages("ws", {"due_on": "null"}, limit=100))
+
+    gids = [t["gid"] for page in pages for t in page]
+    assert sorted(gids, key=int) == [t["gid"] for t in tasks]
+    assert len(gids) == len(set(gids))
+    assert all(p["due_on"] == "null" and p["sort_by"] == "created_at" for p in params)
+    assert "created_at" in params[0]["opt_fields"].split(",")
+
+
+def test_iter_search_pages_raises_when_stuck(fake_time):
+    # Целая страница с одним created_at: сдвинуться нельзя, неполный список не отдаём за полный
+    tasks = [{"gid": str(i), "created_at": created(0)} for i in range(150)]
+    params = []
+    client = make_client(search_workspace(tasks, params), fake_time)
+
+    with pytest.raises(SearchPagingError):
+        collect(client.iter_search_pages("ws", {}, limit=100))
+
+    assert len(params) == 2
+
+
+def test_search_list_falls_back_when_paging_stuck(fake_time, monkeypatch):
+    monkeypatch.setattr(main, "ASANA_PROJECTS", ["p1"])
+    tasks = [{"gid": str(i), "created_at": created(0), "due_on": None} for i in range(150)]
+    params = []
+    client = make_client(search_workspace(tasks, params), fake_time)
+    analyzer = TaskAnalyzer(client)
+    analyzer.projects = {"p1": "P1"}
+    analyzer._projects_loaded_at = time.monotonic()
+
+    assert asyncio.run(analyzer.search_list("no_due_date")) is None
+    assert "no_due_date" in analyzer._search_disabled
+    # Следующий отчёт сразу строится по снимку, без поиска
+    requests = len(params)
+    assert asyncio.run(analyzer.search_list("no_due_date")) is None
+    assert len(params) == requests
+
+
+# ─── Общий пул соединений (benchmarks/asana_latency.py) ───
+
+def test_shared_client_reuses_connections(monkeypatch):
+    from benchmarks.asana_latency import StubAsanaServer, measure
+
+    monkeypatch.setattr(asana_client, "ASANA_RATE_PER_MIN", 10 ** 6)
+    monkeypatch.setattr(asana_client, "ASANA_BURST", 10 ** 6)
+
+    async def run(mode: str):
+        async with StubAsanaServer(rtt=0, tls=None) as server:
+            await measure(server, mode, requests=20, parallel=1, verify=True)
+            return server.connections, server.requests
+
+    assert asyncio.run(run("pooled")) == (1, 20)
+    assert asyncio.run(run("fresh")) == (20, 20)
@@ -0,0 +1,100 @@
+"""ClientRegistry: дельта по updated_at (gte + дедупликация) и полная сверка"""
+
+import asyncio
+import json
+
+from client_registry import ClientRegistry
+from fake_supabase import FakeSupabase
+
+
+def client(id: str, updated_at: str, chat=None, **fields) -> dict:
+    return {"id": id, "updated_at": updated_at, "name": id.title(), "domain": f"{id}.ru",
+            "type": "seo", "status": "active", "telegram_chat_id": chat, "portal_token": None, **fields}
+
+
+def registry_for(db, fake_time, tmp_path, interval=3600) -> ClientRegistry:
+    return ClientRegistry(root=str(tmp_path), db=db, full_reload_interval=interval, clock=fake_time.clock)
+
+
+def refresh(registry, **kwargs) -> int:
+    return asyncio.run(registry.refresh_db(**kwargs))
+
+
+def test_first_refresh_loads_everything(fake_time, tmp_path):
+    db = FakeSupabase({"clients": [client("tvorim", "2026-01-15T10:00:00+00:00", chat=100), client("ant", "2026-01-15T09:00:00+00:00")]})
+    registry = registry_for(db, fake_time, tmp_path)
+
+    assert refresh(registry) == 2
+    assert registry.for_chat(100)["id"] == "tvorim"
+    assert registry.for_domain("https://www.ant.ru/")["id"] == "ant"
+    assert registry.stats["db_full_reloads"] == 1
+
+
+def test_delta_rereads_cursor_timestamp_without_double_counting(fake_time, tmp_path):
+    at = "2026-01-15T10:00:00+00:00"
+    db = FakeSupabase({"clients": [client("tvorim", at)]})
+    registry = registry_for(db, fake_time, tmp_path)
+    refresh(registry)
+
+    # Та же строка снова приходит по gte — это не изменение
+    assert refresh(registry) == 0
+
+    # Строка с тем же updated_at, закоммиченная после прошлого запроса
+    db.tables["clients"].append(client("ant", at, chat=200))
+    assert refresh(registry) == 1
+    assert registry.for_chat(200)["id"] == "ant"
+
+    db.tables["clients"][0].update(updated_at="2026-01-15T11:00:00+00:00", telegram_chat_id=100)
+    assert refresh(registry) == 1
+    assert registry.for_chat(100)["id"] == "tvorim"
+    assert registry.stats["db_full_reloads"] == 1
+
+
+def test_full_reload_drops_deleted_clients(fake_time, tmp_path):
+    db = FakeSupabase({"clients": [
+        client("tvorim", "2026-01-15T10:00:00+00:00", chat=100),
+        client("ant", "2026-01-15T10:00:00+00:00", chat=200),
+    ]})
+    registry = registry_for(db, fake_time, tmp_path, interval=600)
+    refresh(registry)
+
+    db.tables["clients"] = [row for row in db.tables["clients"] if row["id"] != "ant"]
+    # Дельта удаления не видит
+    fake_time.now += 300
+    assert refresh(registry) == 0
+    assert registry.for_chat(200) is not None
+
+    fake_time.now += 300
+    assert refresh(registry) == 1
+    assert registry.for_chat(200) is None
+    assert registry.get("ant") is None
+    assert registry.stats["db_full_reloads"] == 2
+
+
+def test_full_reload_picks_up_rows_behind_cursor(fake_time, tmp_path):
+    db = FakeSupabase({"clients": [client("tvorim", "2026-01-15T10:00:00+00:00")]})
+    registry = registry_for(db, fake_time, tmp_path)
+    refresh(registry)
+
+    # Транзакция закоммичена позже, но updated_at у неё старше курсора
+    db.tables["clients"].append(client("ant", "2026-01-15T09:59:00+00:00", chat=200))
+    assert refresh(registry) == 0
+    assert refresh(registry, full=True) == 1
+    assert registry.for_chat(200)["id"] == "ant"
+
+
+def test_deleted_row_falls_back_to_client_json(fake_time, tmp_path):
+    folder = tmp_path / "active" / "tvorim"
+    folder.mkdir(parents=True)
+    (folder / "client.json").write_text(json.dumps({"name": "Творим", "domain": "tvorim.ru"}), encoding="utf-8")
+    db = FakeSupabase({"clients": [client("tvorim", "2026-01-15T10:00:00+00:00", chat=100)]})
+    registry = registry_for(db, fake_time, tmp_path)
+    registry.load_files()
+    refresh(registry)
+    assert registry.get("tvorim")["name"] == "Tvorim"
+
+    db.tables["clients"] = []
+    refresh(registry, full=True)
+
+    assert registry.get("tvorim")["name"] == "Творим"
+    assert registry.for_chat(100) is None
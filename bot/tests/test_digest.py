@@ -0,0 +1,208 @@
+"""digest: расписание, сборка из снимка анализа и рассылка с RetryAfter"""
+
+import asyncio
+from datetime import date, datetime, time as dt_time, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+from digest import DigestScheduler, digest_tasks, format_digest, parse_schedule
+from ratelimit import TokenBucket
+
+MOSCOW = ZoneInfo("Europe/Moscow")
+VLADIVOSTOK = ZoneInfo("Asia/Vladivostok")
+
+
+def task(gid: str, due_on=None, assignee="Анна") -> dict:
+    return {
+        "gid": gid,
+        "name": f"Задача {gid}",
+        "due_on": due_on,
+        "assignee": {"gid": assignee, "name": assignee} if assignee else None,
+    }
+
+
+def analysis_of(*tasks) -> dict:
+    by_assignee = {}
+    for t in tasks:
+        if t["assignee"]:
+            by_assignee.setdefault(t["assignee"]["name"], []).append(t)
+    return {
+        "by_assignee": by_assignee,
+        "no_assignee": [t for t in tasks if not t["assignee"]],
+        "no_due_date": [t for t in tasks if not t["due_on"]],
+        "overdue": [],
+        "total_active": len(tasks),
+    }
+
+
+# ─── Расписание ───
+
+def test_parse_schedule():
+    entries = parse_schedule(" 161261562@10:30@Asia/Vladivostok, ,161261652,-100500@08:05 ", "09:00", "Europe/Moscow")
+
+    assert [(e["chat_id"], e["time"].strftime("%H:%M"), str(e["tz"])) for e in entries] == [
+        (161261562, "10:30", "Asia/Vladivostok"),
+        (161261652, "09:00", "Europe/Moscow"),
+        (-100500, "08:05", "Europe/Moscow"),
+    ]
+    assert all(e["time"].tzinfo is e["tz"] for e in entries)
+
+
+def test_parse_schedule_empty_time_uses_default():
+    [entry] = parse_schedule("1@@Asia/Vladivostok", "09:00", "Europe/Moscow")
+    assert entry["time"] == dt_time(9, 0, tzinfo=VLADIVOSTOK)
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def run_daily(self, callback, time, days, data, name):
+        self.jobs.append({"time": time, "days": days, "data": data, "name": name})
+
+
+def test_schedule_groups_chats_by_time_and_zone():
+    entries = parse_schedule("1@09:00@Europe/Moscow,2@09:00@Europe/Moscow,3@09:00@Asia/Vladivostok", "09:00", "UTC")
+    jobs = FakeJobQueue()
+
+    DigestScheduler(None, entries, days=(1, 2, 3, 4, 5)).schedule(jobs)
+
+    # 09:00 в разных поясах — разные задачи (time с ZoneInfo без даты равны)
+    assert sorted((str(j["data"]["tz"]), j["data"]["chat_ids"]) for j in jobs.jobs) == [
+        ("Asia/Vladivostok", [3]),
+        ("Europe/Moscow", [1, 2]),
+    ]
+    assert all(j["time"].tzinfo is j["data"]["tz"] for j in jobs.jobs)
+    assert all(j["days"] == (1, 2, 3, 4, 5) for j in jobs.jobs)
+
+
+# ─── Сборка ───
+
+def test_digest_tasks_from_analysis():
+    analysis = analysis_of(
+        task("1", "2026-01-10"), task("2", "2026-01-15"), task("3", "2026-01-16"),
+        task("4", "2026-01-05", assignee=None), task("5"),
+    )
+
+    overdue, today = digest_tasks(analysis, date(2026, 1, 15))
+
+    assert [t["gid"] for t in overdue] == ["4", "1"]
+    assert [t["gid"] for t in today] == ["2"]
+
+
+def test_digest_tasks_counts_shared_task_once():
+    shared = task("1", "2026-01-10")
+    analysis = analysis_of(shared, task("2", "2026-01-15"))
+    analysis["by_assignee"]["Борис"] = [shared]
+
+    overdue, _ = digest_tasks(analysis, date(2026, 1, 15))
+    assert [t["gid"] for t in overdue] == ["1"]
+
+
+class FakeAnalyzer:
+    """analyze_all отдаёт снимок, а живое состояние сразу же сбрасывается"""
+
+    def __init__(self, analysis: dict):
+        self.analysis = analysis
+        self.indexes = {"p1": object()}
+        self.calls = 0
+
+    async def analyze_all(self) -> dict:
+        self.calls += 1
+        # Как полная перезагрузка проекта, начавшаяся сразу после анализа
+        self.indexes.clear()
+        return self.analysis
+
+
+def test_build_uses_returned_analysis_only():
+    analyzer = FakeAnalyzer(analysis_of(task("1", "2026-01-10"), task("2", "2026-01-15")))
+
+    text = asyncio.run(DigestScheduler(analyzer, [], days=()).build(date(2026, 1, 15)))
+
+    assert text == format_digest([task("1", "2026-01-10")], [task("2", "2026-01-15")])
+    assert "Задача 1" in text and "Задача 2" in text
+
+
+# ─── Рассылка ───
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        queue = self.errors.get(chat_id)
+        if queue:
+            raise queue.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def scheduler_for(analysis: dict, fake_time, now: datetime) -> DigestScheduler:
+    scheduler = DigestScheduler(
+        FakeAnalyzer(analysis), [], days=(),
+        clock=lambda tz: now.astimezone(tz)
+    )
+    scheduler.bucket = TokenBucket(25, 25, clock=fake_time.clock)
+    return scheduler
+
+
+def test_run_uses_date_in_chat_timezone(fake_time):
+    # 20:00 UTC 15-го: в Москве ещё 15-е, во Владивостоке уже 16-е
+    now = datetime(2026, 1, 15, 20, 0, tzinfo=timezone.utc)
+    scheduler = scheduler_for(analysis_of(task("1", "2026-01-15")), fake_time, now)
+    bot = FakeBot()
+
+    async def run():
+        await scheduler.run(bot, [1], MOSCOW)
+        await scheduler.run(bot, [2], VLADIVOSTOK)
+
+    asyncio.run(run())
+
+    moscow, vladivostok = dict(bot.sent)[1], dict(bot.sent)[2]
+    assert "На сегодня" in moscow and "Просрочено" not in moscow
+    assert "Просрочено" in vladivostok and "На сегодня задач нет" in vladivostok
+    assert scheduler.stats == {"runs": 2, "sent": 2, "failed": 0}
+
+
+def test_retry_after_pauses_and_resends(fake_time):
+    now = datetime(2026, 1, 15, 6, 0, tzinfo=timezone.utc)
+    scheduler = scheduler_for(analysis_of(task("1", "2026-01-15")), fake_time, now)
+    bot = FakeBot({2: [RetryAfter(3)]})
+
+    asyncio.run(scheduler.run(bot, [1, 2, 3], MOSCOW))
+
+    assert [chat_id for chat_id, _ in bot.sent] == [1, 2, 3]
+    assert 3 in fake_time.sleeps
+    # Пауза блокирует всё ведро: следующий чат ждёт её конца
+    assert scheduler.bucket.blocked_until == pytest.approx(3)
+    assert scheduler.stats == {"runs": 1, "sent": 3, "failed": 0}
+
+
+def test_send_gives_up_after_repeated_retry_after_and_skips_blocked(fake_time):
+    now = datetime(2026, 1, 15, 6, 0, tzinfo=timezone.utc)
+    scheduler = scheduler_for(analysis_of(), fake_time, now)
+    bot = FakeBot({
+        1: [RetryAfter(1), RetryAfter(1), RetryAfter(1)],
+        2: [Forbidden("bot was blocked by the user")],
+    })
+
+    asyncio.run(scheduler.run(bot, [1, 2, 3], MOSCOW))
+
+    assert [chat_id for chat_id, _ in bot.sent] == [3]
+    assert scheduler.stats == {"runs": 1, "sent": 1, "failed": 2}
+
+
+def test_build_error_counts_every_chat_failed(fake_time):
+    class BrokenAnalyzer:
+        async def analyze_all(self):
+            raise RuntimeError("не удалось загрузить ни один проект")
+
+    scheduler = DigestScheduler(BrokenAnalyzer(), [], days=())
+    bot = FakeBot()
+
+    asyncio.run(scheduler.run(bot, [1, 2], MOSCOW, today=date(2026, 1, 15)))
+
+    assert bot.sent == []
+    assert scheduler.stats["failed"] == 2
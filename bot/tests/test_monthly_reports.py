@@ -0,0 +1,52 @@
+"""monthly_reports: upsert в reports и независимость от main"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from fake_supabase import FakeSupabase
+from monthly_reports import MonthlyReportBuilder, discover_clients
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def clients_dir(tmp_path, *ids) -> str:
+    root = tmp_path / "clients" / "active"
+    for client_id in ids:
+        (root / client_id).mkdir(parents=True)
+        (root / client_id / "client.json").write_text(
+            json.dumps({"name": client_id.title(), "domain": f"{client_id}.ru"}), encoding="utf-8"
+        )
+    return str(root)
+
+
+def test_rebuild_keeps_status_of_existing_report(tmp_path):
+    db = FakeSupabase(
+        {
+            "reports": [{"id": 1, "client_id": "tvorim", "type": "monthly", "month": "2026-01",
+                         "title": "старый", "file_url": "old.md", "status": "sent"}],
+            "positions_daily": [
+                {"client_id": "tvorim", "checked_on": "2026-01-15", "keywords": 10, "avg_position": 12.5,
+                 "top3": 1, "top10": 4, "visibility": 0.3},
+            ],
+        },
+        defaults={"reports": {"status": "draft"}},
+    )
+    builder = MonthlyReportBuilder(db, workers=1)
+
+    rows = asyncio.run(builder.build(discover_clients(clients_dir(tmp_path, "tvorim", "ant")), "2026-01"))
+
+    assert all("status" not in row for row in rows)
+    reports = {row["client_id"]: row for row in db.tables["reports"]}
+    # Отправленный отчёт пересобран, но не вернулся в черновики
+    assert reports["tvorim"]["status"] == "sent"
+    assert reports["tvorim"]["title"] == "Отчёт за январь 2026"
+    assert reports["ant"]["status"] == "draft"
+    assert builder.stats["built"] == 2
+
+
+def test_import_does_not_pull_in_main():
+    code = "import sys, asana_client, monthly_reports; sys.exit('main' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=BOT_DIR).returncode == 0
@@ -0,0 +1,159 @@
+"""notifications: экранирование текста из БД, разбор по чатам, лимиты и вёдра"""
+
+import asyncio
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from fake_supabase import FakeSupabase
+from notifications import NotificationDispatcher, _plain, format_notifications
+
+PARSE_ERROR = "Can't parse entities: can't find end of the entity starting at byte offset 12"
+
+
+def notification(id: str, client_id="tvorim", title="Отчёт за январь", message=None, type="report_ready") -> dict:
+    return {"id": id, "client_id": client_id, "type": type, "title": title, "message": message,
+            "created_at": f"2026-01-15T10:00:{id.zfill(2)}+00:00", "sent_at": None}
+
+
+def notifications_db(*rows, clients=None, users=None) -> FakeSupabase:
+    return FakeSupabase({
+        "notifications": list(rows),
+        "clients": clients if clients is not None else [{"id": "tvorim", "telegram_chat_id": 100}],
+        "portal_users": users or [],
+    })
+
+
+class FakeBot:
+    """errors: chat_id -> исключения по очереди"""
+
+    def __init__(self, errors=None):
+        self.errors = {chat: list(queue) for chat, queue in (errors or {}).items()}
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        queue = self.errors.get(chat_id)
+        if queue:
+            raise queue.pop(0)
+        self.sent.append((chat_id, text, parse_mode))
+
+
+def dispatcher_for(db, fake_time) -> NotificationDispatcher:
+    return NotificationDispatcher(db, clock=fake_time.clock)
+
+
+def by_id(db) -> dict:
+    return {row["id"]: row for row in db.tables["notifications"]}
+
+
+# ─── Текст ───
+
+def test_format_escapes_text_from_db():
+    text = format_notifications([notification("1", title="Заявка_1 *срочно*", message="сайт x.ru [форма]")])
+    assert text == "📄 Отчёт готов: *Заявка\\_1 \\*срочно\\**\nсайт x\\.ru \\[форма\\]"
+
+
+def test_format_several_and_plain_fallback():
+    text = format_notifications([notification("1", title="a_b"), notification("2", title="c", message="(d)")])
+
+    assert text.split("\n")[0] == "🔔 *Уведомления* \\(2\\)"
+    assert _plain(text) == "🔔 Уведомления (2)\n\n📄 Отчёт готов: a_b\n📄 Отчёт готов: c\n   (d)"
+
+
+# ─── Рассылка ───
+
+def test_run_once_groups_by_chat_and_marks_sent(fake_time):
+    db = notifications_db(
+        notification("1"), notification("2", type="new_lead"), notification("3", client_id="ant"),
+        clients=[{"id": "tvorim", "telegram_chat_id": 100}, {"id": "ant", "telegram_chat_id": None}],
+        users=[{"client_id": "tvorim", "telegram_id": 200}],
+    )
+    bot = FakeBot()
+
+    result = asyncio.run(dispatcher_for(db, fake_time).run_once(bot))
+
+    assert result == {"notifications": 2, "messages": 2, "rejected": 0, "no_recipients": 1, "failed": 0}
+    assert sorted(chat for chat, _, _ in bot.sent) == [100, 200]
+    assert all(mode == "MarkdownV2" and "\\(2\\)" in text for _, text, mode in bot.sent)
+    rows = by_id(db)
+    assert rows["1"]["sent_at"] and rows["1"]["send_error"] is None
+    assert rows["3"]["send_error"] == "no recipients"
+
+
+def test_parse_error_resends_as_plain_text(fake_time):
+    db = notifications_db(notification("1", title="Позиции_1"))
+    bot = FakeBot({100: [BadRequest(PARSE_ERROR)]})
+
+    result = asyncio.run(dispatcher_for(db, fake_time).run_once(bot))
+
+    assert result["notifications"] == 1 and result["rejected"] == 0
+    assert bot.sent == [(100, "📄 Отчёт готов: Позиции_1", None)]
+    assert by_id(db)["1"]["send_error"] is None
+
+
+def test_rejected_only_when_every_chat_refuses(fake_time):
+    db = notifications_db(
+        notification("1"),
+        users=[{"client_id": "tvorim", "telegram_id": 200}],
+    )
+    both_blocked = FakeBot({100: [Forbidden("blocked")], 200: [BadRequest("Chat not found")]})
+    asyncio.run(dispatcher_for(db, fake_time).run_once(both_blocked))
+    assert by_id(db)["1"]["send_error"] == "rejected"
+
+    db = notifications_db(notification("1"), users=[{"client_id": "tvorim", "telegram_id": 200}])
+    one_blocked = FakeBot({100: [Forbidden("blocked")]})
+    asyncio.run(dispatcher_for(db, fake_time).run_once(one_blocked))
+    assert by_id(db)["1"]["send_error"] is None
+
+
+def test_retry_after_pauses_chat_and_resends(fake_time):
+    db = notifications_db(notification("1"))
+    bot = FakeBot({100: [RetryAfter(5)]})
+    dispatcher = dispatcher_for(db, fake_time)
+
+    result = asyncio.run(dispatcher.run_once(bot))
+
+    assert result["notifications"] == 1
+    assert dispatcher.stats["flood_waits"] == 1
+    assert fake_time.now >= 5
+    assert len(bot.sent) == 1
+
+
+def test_repeated_flood_waits_leave_row_for_next_run(fake_time):
+    db = notifications_db(notification("1"))
+    bot = FakeBot({100: [RetryAfter(1)] * 4})
+
+    result = asyncio.run(dispatcher_for(db, fake_time).run_once(bot))
+
+    assert result["failed"] == 1
+    assert by_id(db)["1"]["sent_at"] is None
+
+
+# ─── Вёдра чатов ───
+
+def test_idle_chat_buckets_are_evicted(fake_time):
+    db = notifications_db(
+        *(notification(str(i), client_id=f"c{i}") for i in range(50)),
+        clients=[{"id": f"c{i}", "telegram_chat_id": 1000 + i} for i in range(50)],
+    )
+    dispatcher = dispatcher_for(db, fake_time)
+    bot = FakeBot()
+
+    asyncio.run(dispatcher.run_once(bot))
+    assert len(dispatcher.chat_buckets) == 50
+
+    # Через секунду вёдра снова полные — следующий прогон их выбрасывает
+    fake_time.now += 1
+    db.tables["notifications"].append(notification("99", client_id="c0"))
+    asyncio.run(dispatcher.run_once(bot))
+    assert list(dispatcher.chat_buckets) == [1000]
+
+
+def test_paused_bucket_is_kept(fake_time):
+    dispatcher = dispatcher_for(notifications_db(), fake_time)
+    dispatcher._chat_bucket(1).pause(30)
+    dispatcher._chat_bucket(2)
+
+    fake_time.now += 5
+    dispatcher._prune_buckets()
+
+    assert list(dispatcher.chat_buckets) == [1]
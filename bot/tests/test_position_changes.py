@@ -0,0 +1,143 @@
+"""position_changes: векторное сравнение снимков и пакетная запись уведомлений"""
+
+import asyncio
+from datetime import date
+
+import numpy as np
+
+from fake_supabase import FakeSupabase
+from position_changes import (
+    DROPPED, ENTERED, KEY_SEP, LEFT, UNRANKED, PositionChangeDetector, diff_snapshots, format_changes,
+    to_columns,
+)
+
+
+def rows(positions: dict, engine="yandex", region="spb") -> list:
+    return [
+        {"keyword": keyword, "search_engine": engine, "region": region, "position": position}
+        for keyword, position in positions.items()
+    ]
+
+
+def diff(before: dict, after: dict, threshold=5) -> dict:
+    changes = diff_snapshots(to_columns(rows(before)), to_columns(rows(after)), threshold)
+    return {
+        key.split(KEY_SEP, 1)[0]: (int(p), int(c), int(kind))
+        for key, p, c, kind in zip(changes["keys"], changes["previous"], changes["current"], changes["kind"])
+    }
+
+
+def test_to_columns_marks_unranked():
+    keys, positions = to_columns(rows({"окна": 3, "двери": None}))
+    assert list(keys) == [f"окна{KEY_SEP}yandex{KEY_SEP}spb", f"двери{KEY_SEP}yandex{KEY_SEP}spb"]
+    assert positions.dtype == np.int32
+    assert positions.tolist() == [3, UNRANKED]
+
+
+def test_diff_flags_significant_moves():
+    before = {"вход": 12, "выход": 9, "просадка": 20, "шум": 30, "выпал": 4, "появился": None, "рост": 40}
+    after = {"вход": 10, "выход": 11, "просадка": 25, "шум": 33, "выпал": None, "появился": 7, "рост": 15}
+
+    assert diff(before, after) == {
+        "вход": (12, 10, ENTERED),
+        "выход": (9, 11, LEFT),
+        "просадка": (20, 25, DROPPED),
+        "выпал": (4, UNRANKED, LEFT),
+        "появился": (UNRANKED, 7, ENTERED),
+    }
+
+
+def test_diff_threshold_and_order():
+    changes = diff({"a": 20, "b": 20, "c": 20}, {"a": 23, "b": 40, "c": 27}, threshold=3)
+    assert list(changes) == ["b", "c", "a"]
+
+
+def test_diff_ignores_keys_missing_on_one_day():
+    before = rows({"окна": 3}) + rows({"окна": 4}, engine="google")
+    after = rows({"окна": 50}) + rows({"двери": 50})
+
+    changes = diff_snapshots(to_columns(before), to_columns(after))
+
+    assert list(changes["keys"]) == [f"окна{KEY_SEP}yandex{KEY_SEP}spb"]
+
+
+def test_diff_empty_snapshots():
+    changes = diff_snapshots(to_columns([]), to_columns(rows({"окна": 1})))
+    assert all(len(column) == 0 for column in changes.values())
+
+
+def test_format_changes():
+    changes = diff_snapshots(
+        to_columns(rows({f"q{i}": 5 for i in range(12)})),
+        to_columns(rows({f"q{i}": 30 + i for i in range(12)}))
+    )
+
+    title, message = format_changes(changes, "2026-01-15", limit=2)
+
+    assert title == "Изменились позиции: 12 запросов"
+    lines = message.split("\n")
+    assert lines[0] == "2026-01-15 — ⬇️ из топ-10: 12"
+    assert lines[1:] == ["• q11: 5 → 41", "• q10: 5 → 40", "... и ещё 10"]
+
+
+def test_matches_row_by_row_comparison():
+    from benchmarks.position_changes import run
+
+    result = run(20000, threshold=5)
+    assert result["match"]
+    assert result["changes"] > 0
+
+
+# ─── Пакетная задача ───
+
+def positions_db(days: dict) -> FakeSupabase:
+    """days: {(client_id, checked_on): {keyword: position}}"""
+    positions = [
+        {**row, "client_id": client_id, "checked_on": day}
+        for (client_id, day), snapshot in days.items()
+        for row in rows(snapshot)
+    ]
+    daily = [{"client_id": client_id, "checked_on": day} for client_id, day in days]
+    return FakeSupabase({"positions": positions, "positions_daily": daily})
+
+
+def test_run_once_writes_one_notification_per_client():
+    db = positions_db({
+        ("tvorim", "2026-01-14"): {f"q{i}": 5 for i in range(30)},
+        ("tvorim", "2026-01-15"): {f"q{i}": 5 if i % 3 else 50 for i in range(30)},
+        ("ant", "2026-01-14"): {"окна": 3},
+        ("ant", "2026-01-15"): {"окна": 4},
+        ("solo", "2026-01-15"): {"окна": 1},
+    })
+    detector = PositionChangeDetector(db, page_size=7)
+
+    result = asyncio.run(detector.run_once(date(2026, 1, 16)))
+
+    assert result == {"clients": 2, "notifications": 1}
+    [notification] = db.tables["notifications"]
+    assert notification["client_id"] == "tvorim"
+    assert notification["type"] == "position_change"
+    assert notification["title"] == "Изменились позиции: 10 запросов"
+    # Уведомления — одной вставкой на прогон
+    assert [call for call in db.calls if call[0] == "notifications"] == [("notifications", "insert", 1)]
+    checks = {row["client_id"]: (row["checked_on"], row["changes"]) for row in db.tables["position_change_checks"]}
+    assert checks == {"tvorim": ("2026-01-15", 10), "ant": ("2026-01-15", 0)}
+
+
+def test_run_once_skips_processed_days():
+    db = positions_db({
+        ("ant", "2026-01-14"): {"окна": 3},
+        ("ant", "2026-01-15"): {"окна": 30},
+    })
+    detector = PositionChangeDetector(db)
+
+    async def run():
+        first = await detector.run_once(date(2026, 1, 16))
+        second = await detector.run_once(date(2026, 1, 16))
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == {"clients": 1, "notifications": 1}
+    assert second == {"clients": 0, "notifications": 0}
+    assert len(db.tables["notifications"]) == 1
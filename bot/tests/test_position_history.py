@@ -0,0 +1,97 @@
+"""PositionHistoryCache: дельта по updated_at и полная пересборка после удалений"""
+
+import asyncio
+
+from fake_supabase import FakeSupabase
+from position_history import PositionHistoryCache
+
+
+def position(id: int, keyword: str, day: str, pos, updated_at=None) -> dict:
+    return {"id": id, "client_id": "tvorim", "keyword": keyword, "search_engine": "yandex", "region": "spb",
+            "position": pos, "checked_on": day, "updated_at": updated_at or f"{day}T06:00:00+00:00"}
+
+
+def history_db() -> FakeSupabase:
+    return FakeSupabase({"positions": [
+        position(1, "окна", "2026-01-10", 3),
+        position(2, "двери", "2026-01-10", 8),
+        position(3, "окна", "2026-01-11", 4),
+        position(4, "двери", "2026-01-11", 9),
+    ]})
+
+
+def cache_for(db, fake_time, tmp_path, interval=86400) -> PositionHistoryCache:
+    return PositionHistoryCache(db, str(tmp_path), page_size=3, full_rebuild_interval=interval, clock=fake_time.clock)
+
+
+def sync(cache, **kwargs) -> int:
+    return asyncio.run(cache.sync("tvorim", **kwargs))
+
+
+def keywords_on(cache, day: str) -> list:
+    return sorted(row["keyword"] for row in cache.load("tvorim").day_rows(day))
+
+
+def test_delta_appends_new_days(fake_time, tmp_path):
+    db = history_db()
+    cache = cache_for(db, fake_time, tmp_path)
+    assert sync(cache) == 4
+
+    db.tables["positions"].append(position(5, "окна", "2026-01-12", 2))
+    sync(cache)
+
+    history = cache.load("tvorim")
+    assert len(history) == 5
+    assert history.day_rows("2026-01-12") == [
+        {"keyword": "окна", "search_engine": "yandex", "region": "spb", "position": 2}
+    ]
+    assert cache.stats["full_rebuilds"] == 1
+
+
+def test_delta_misses_deleted_rows_until_full_rebuild(fake_time, tmp_path):
+    db = history_db()
+    cache = cache_for(db, fake_time, tmp_path, interval=3600)
+    sync(cache)
+
+    db.tables["positions"] = [row for row in db.tables["positions"] if row["id"] != 2]
+    db.tables["positions"].append(position(5, "окна", "2026-01-12", 2))
+
+    # Дельта перечитывает только хвост с 12-го — удаление из 10-го не видно
+    fake_time.now += 1800
+    sync(cache)
+    assert keywords_on(cache, "2026-01-10") == ["двери", "окна"]
+
+    fake_time.now += 1800
+    assert sync(cache) == 4
+    assert keywords_on(cache, "2026-01-10") == ["окна"]
+    assert len(cache.load("tvorim")) == 4
+    assert cache.stats["full_rebuilds"] == 2
+
+
+def test_full_rebuild_survives_restart(fake_time, tmp_path):
+    db = history_db()
+    sync(cache_for(db, fake_time, tmp_path))
+    db.tables["positions"] = []
+
+    # Время пересборки хранится в meta.json, а не в объекте
+    fake_time.now += 3600
+    restarted = cache_for(db, fake_time, tmp_path)
+    assert sync(restarted) == 0
+    assert len(restarted.load("tvorim")) == 4
+
+    assert sync(restarted, full=True) == 0
+    assert len(restarted.load("tvorim")) == 0
+    assert restarted.stats["full_rebuilds"] == 1
+
+
+def test_old_snapshot_stays_readable_after_rebuild(fake_time, tmp_path):
+    db = history_db()
+    cache = cache_for(db, fake_time, tmp_path)
+    sync(cache)
+    before = cache.load("tvorim")
+
+    db.tables["positions"] = [row for row in db.tables["positions"] if row["keyword"] != "двери"]
+    sync(cache, full=True)
+
+    assert keywords_on(cache, "2026-01-11") == ["окна"]
+    assert sorted(row["keyword"] for row in before.day_rows("2026-01-11")) == ["двери", "окна"]
@@ -0,0 +1,226 @@
+"""positions_ingest: разбор выгрузок, пачки по дню UTC, upsert и пересчёт витрин"""
+
+import asyncio
+import json
+
+import pytest
+
+from fake_supabase import FakeSupabase, POSITIONS_GENERATED
+from positions_ingest import (
+    PositionIngestor, _checked_at, batched, ingest_files, normalize,
+)
+
+DEFAULTS = {"client_id": "tvorim", "search_engine": "yandex", "region": "spb", "date": "2026-01-15"}
+
+
+def positions_db(**kwargs) -> FakeSupabase:
+    return FakeSupabase(generated={"positions": POSITIONS_GENERATED}, **kwargs)
+
+
+# ─── Нормализация ───
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-01-15", "2026-01-15T00:00:00+00:00"),
+    ("2026-01-15T10:00:00", "2026-01-15T10:00:00+00:00"),
+    ("2026-01-14T23:30:00Z", "2026-01-14T23:30:00+00:00"),
+    ("2026-01-15T02:30:00+03:00", "2026-01-14T23:30:00+00:00"),
+    ("2026-01-15 01:00:00+05:00", "2026-01-14T20:00:00+00:00"),
+])
+def test_checked_at_is_utc(value, expected):
+    assert _checked_at(value, "2000-01-01") == expected
+
+
+def test_checked_at_default_date():
+    assert _checked_at(None, "2026-01-15") == "2026-01-15T00:00:00+00:00"
+    assert _checked_at("", "2026-01-15") == "2026-01-15T00:00:00+00:00"
+
+
+def test_normalize_row():
+    row = normalize({"query": " купить окна ", "position": "3.6", "url": "https://x.ru/"}, DEFAULTS)
+    assert row == {
+        "client_id": "tvorim",
+        "keyword": "купить окна",
+        "position": 4,
+        "url": "https://x.ru/",
+        "search_engine": "yandex",
+        "region": "spb",
+        "checked_at": "2026-01-15T00:00:00+00:00",
+    }
+
+
+@pytest.mark.parametrize("raw", [
+    {"keyword": "", "position": "1"},
+    {"keyword": "окна"},
+    {"keyword": "окна", "position": ""},
+    {"keyword": "окна", "position": "n/a"},
+    {"keyword": "окна", "position": "1", "checked_at": "вчера T утром"},
+])
+def test_normalize_skips_bad_rows(raw):
+    assert normalize(raw, DEFAULTS) is None
+
+
+def test_normalize_row_values_override_defaults():
+    raw = {"keyword": "окна", "position": 2, "client_id": "ant", "search_engine": "google", "region": "msk",
+           "date": "2026-02-01"}
+    row = normalize(raw, DEFAULTS)
+    assert (row["client_id"], row["search_engine"], row["region"]) == ("ant", "google", "msk")
+    assert row["checked_at"] == "2026-02-01T00:00:00+00:00"
+
+
+# ─── Пачки ───
+
+def rows_at(*checked):
+    return [normalize({"keyword": "окна", "position": i + 1, "checked_at": c}, DEFAULTS) for i, c in enumerate(checked)]
+
+
+def test_batched_dedupes_on_utc_day_across_midnight():
+    rows = rows_at(
+        "2026-01-15T23:30:00+00:00",
+        "2026-01-16T01:30:00+03:00",  # 22:30 UTC 15-го — тот же день
+        "2026-01-16T00:30:00Z",       # уже 16-е по UTC
+    )
+    batches = list(batched(rows, 10))
+
+    assert len(batches) == 1
+    kept = sorted((r["checked_at"], r["position"]) for r in batches[0])
+    # Из двух строк 15-го побеждает последняя
+    assert kept == [("2026-01-15T22:30:00+00:00", 2), ("2026-01-16T00:30:00+00:00", 3)]
+
+
+def test_batched_sizes():
+    rows = [normalize({"keyword": f"k{i}", "position": 1}, DEFAULTS) for i in range(25)]
+    assert [len(b) for b in batched(rows, 10)] == [10, 10, 5]
+
+
+def test_midnight_duplicates_upsert_cleanly():
+    db = positions_db()
+    rows = rows_at("2026-01-15T23:30:00+00:00", "2026-01-16T01:30:00+03:00", "2026-01-16T00:30:00Z")
+
+    stats = asyncio.run(PositionIngestor(db, batch_size=10).ingest(rows))
+
+    assert stats["failed_rows"] == 0
+    assert sorted((r["checked_on"], r["position"]) for r in db.tables["positions"]) == [
+        ("2026-01-15", 2), ("2026-01-16", 3),
+    ]
+
+
+# ─── Загрузка ───
+
+def test_ingest_is_idempotent():
+    db = positions_db()
+    rows = [normalize({"keyword": f"k{i}", "position": i % 50 + 1}, DEFAULTS) for i in range(120)]
+
+    async def run():
+        ingestor = PositionIngestor(db, batch_size=50)
+        await ingestor.ingest(rows)
+        await ingestor.ingest(rows)
+        return ingestor.stats
+
+    stats = asyncio.run(run())
+    assert len(db.tables["positions"]) == 120
+    assert stats["rows"] == 240
+    assert stats["batches"] == 6
+
+
+def test_ingest_memory_is_bounded():
+    db = positions_db(latency=0.001)
+    pulled = {"rows": 0, "max_ahead": 0}
+
+    def rows():
+        for i in range(5000):
+            pulled["rows"] += 1
+            stored = len(db.tables.get("positions", []))
+            pulled["max_ahead"] = max(pulled["max_ahead"], pulled["rows"] - stored)
+            yield normalize({"keyword": f"k{i}", "position": 1}, DEFAULTS)
+
+    ingestor = PositionIngestor(db, batch_size=100, concurrency=3)
+    stats = asyncio.run(ingestor.ingest(rows()))
+
+    assert stats["rows"] == 5000
+    assert db.max_in_flight <= 3
+    # Очередь (concurrency * 2) + пачки в работе + собираемая пачка
+    assert pulled["max_ahead"] <= (3 * 2 + 3 + 1) * 100
+
+
+def test_ingest_retries_then_gives_up(fake_time):
+    db = positions_db()
+    db.fail_next = 2
+    rows = [normalize({"keyword": f"k{i}", "position": 1}, DEFAULTS) for i in range(10)]
+
+    stats = asyncio.run(PositionIngestor(db, batch_size=10, retries=3).ingest(rows))
+    assert stats["rows"] == 10
+    assert fake_time.sleeps == [1, 2]
+
+    db.fail_next = 10
+    stats = asyncio.run(PositionIngestor(db, batch_size=5, concurrency=1, retries=1).ingest(rows))
+    assert stats["failed_batches"] == 2
+    assert stats["failed_rows"] == 10
+
+
+# ─── Форматы и пересчёт витрин ───
+
+def ingest(db, tmp_path, name: str, content: str, fmt: str, defaults=DEFAULTS):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return asyncio.run(ingest_files(db, [str(path)], fmt, defaults, batch_size=2))
+
+
+def test_csv_file(tmp_path):
+    db = positions_db()
+    content = (
+        "﻿keyword,position,url,date\n"
+        "окна пвх,3,https://x.ru/okna,2026-01-15\n"
+        "двери,,https://x.ru/dveri,2026-01-15\n"
+        "балконы,12.4,,2026-01-16T01:00:00+03:00\n"
+    )
+    stats = ingest(db, tmp_path, "export.csv", content, "csv")
+
+    rows = sorted(db.tables["positions"], key=lambda r: r["keyword"])
+    assert stats["rows"] == 2
+    assert [(r["keyword"], r["position"], r["checked_on"]) for r in rows] == [
+        ("балконы", 12, "2026-01-15"),
+        ("окна пвх", 3, "2026-01-15"),
+    ]
+    assert ("rpc", "refresh_position_rollups", "call") in db.calls
+
+
+def test_jsonl_file(tmp_path):
+    db = positions_db()
+    lines = [
+        {"keyword": "окна", "position": 5, "client_id": "ant", "checked_at": "2026-01-15T23:59:00+00:00"},
+        {"keyword": "окна", "position": 4, "client_id": "ant", "checked_at": "2026-01-16T00:01:00+00:00"},
+        {"keyword": "окна", "position": 7, "client_id": "ant", "checked_at": "2026-01-16T02:00:00+03:00"},
+    ]
+    content = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\n\n"
+    ingest(db, tmp_path, "export.jsonl", content, "jsonl")
+
+    # 02:00+03:00 — это 23:00 UTC 15-го: перезаписывает первую строку
+    assert sorted((r["checked_on"], r["position"]) for r in db.tables["positions"]) == [
+        ("2026-01-15", 7), ("2026-01-16", 4),
+    ]
+    assert {r["client_id"] for r in db.tables["positions"]} == {"ant"}
+
+
+def test_webmaster_file(tmp_path):
+    db = positions_db()
+    content = json.dumps({
+        "date_to": "2026-01-20",
+        "queries": [
+            {"query_text": "окна", "indicators": {"AVG_SHOW_POSITION": 2.4}},
+            {"query_text": "двери", "indicators": {}},
+            {"query_text": "балконы", "indicators": {"AVG_SHOW_POSITION": 9.5}},
+        ],
+    })
+    ingest(db, tmp_path, "popular.json", content, "webmaster")
+
+    assert sorted((r["keyword"], r["position"], r["checked_on"]) for r in db.tables["positions"]) == [
+        ("балконы", 10, "2026-01-20"), ("окна", 2, "2026-01-20"),
+    ]
+
+
+def test_rows_without_client_skipped_and_no_refresh(tmp_path):
+    db = positions_db()
+    stats = ingest(db, tmp_path, "export.csv", "keyword,position\nокна,1\n", "csv", {**DEFAULTS, "client_id": None})
+
+    assert stats["rows"] == 0
+    assert not any(call[0] == "rpc" for call in db.calls)
@@ -0,0 +1,43 @@
+"""TokenBucket на фальшивых часах"""
+
+import asyncio
+
+import pytest
+
+from ratelimit import TokenBucket
+
+
+def test_acquire_paces_after_burst(fake_time):
+    bucket = TokenBucket(150 / 60, 15, clock=fake_time.clock)
+
+    async def run():
+        for _ in range(60):
+            await bucket.acquire()
+
+    # Раньше ожидание зацикливалось на остатке 0.9999999999999998 токена
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert fake_time.now == pytest.approx((60 - 15) / 2.5)
+
+
+def test_try_acquire_and_delay(fake_time):
+    bucket = TokenBucket(2, 2, clock=fake_time.clock)
+
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.5)
+
+    fake_time.now += 0.5
+    assert bucket.try_acquire()
+
+
+def test_pause_blocks_until_deadline(fake_time):
+    bucket = TokenBucket(10, 10, clock=fake_time.clock)
+    bucket.pause(3)
+
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(3)
+
+    waited = asyncio.run(bucket.acquire())
+    assert waited == pytest.approx(3)
+    assert fake_time.now == pytest.approx(3)
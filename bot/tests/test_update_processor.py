@@ -0,0 +1,154 @@
+"""PerChatUpdateProcessor: порядок внутри чата, параллельность между чатами"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerChatUpdateProcessor
+
+_update_ids = iter(range(1, 10_000))
+
+
+def message_update(chat_id: int) -> Update:
+    chat = Chat(chat_id, Chat.PRIVATE)
+    user = User(chat_id, "Test", is_bot=False)
+    message = Message(1, datetime.now(timezone.utc), chat, from_user=user, text="/analyze")
+    return Update(next(_update_ids), message=message)
+
+
+class Recorder:
+    """Журнал начала/конца обработчиков и максимум одновременно работающих"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handler(self, name: str, steps: int = 1):
+        self.events.append(("start", name))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        for _ in range(steps):
+            await asyncio.sleep(0)
+        self.running -= 1
+        self.events.append(("end", name))
+
+    def index(self, kind: str, name: str) -> int:
+        return self.events.index((kind, name))
+
+
+def run_updates(processor, jobs):
+    """jobs: [(update, coroutine)] — подаются в порядке списка"""
+
+    async def run():
+        await asyncio.gather(*(processor.process_update(update, coroutine) for update, coroutine in jobs))
+
+    asyncio.run(run())
+
+
+def test_same_chat_processed_in_order():
+    processor = PerChatUpdateProcessor(workers=4)
+    recorder = Recorder()
+    chat = 100
+    run_updates(processor, [
+        (message_update(chat), recorder.handler("first", steps=10)),
+        (message_update(chat), recorder.handler("second", steps=1)),
+        (message_update(chat), recorder.handler("third", steps=1)),
+    ])
+
+    # Быстрый апдейт не обгоняет медленный из того же чата
+    assert recorder.index("end", "first") < recorder.index("start", "second")
+    assert recorder.index("end", "second") < recorder.index("start", "third")
+    assert recorder.max_running == 1
+    assert processor.active_chats == 0
+
+
+def test_other_chats_not_blocked():
+    processor = PerChatUpdateProcessor(workers=4)
+    recorder = Recorder()
+    run_updates(processor, [
+        (message_update(1), recorder.handler("slow", steps=20)),
+        (message_update(1), recorder.handler("slow-next", steps=1)),
+        (message_update(2), recorder.handler("other", steps=1)),
+    ])
+
+    # Чат 2 не ждёт очередь чата 1
+    assert recorder.index("end", "other") < recorder.index("end", "slow")
+    assert recorder.index("end", "slow") < recorder.index("start", "slow-next")
+
+
+def test_workers_limit_concurrency():
+    processor = PerChatUpdateProcessor(workers=2)
+    recorder = Recorder()
+    run_updates(processor, [
+        (message_update(chat), recorder.handler(f"chat-{chat}", steps=5))
+        for chat in range(6)
+    ])
+
+    assert recorder.max_running == 2
+    assert len(recorder.events) == 12
+
+
+def test_updates_without_chat_run_unordered():
+    processor = PerChatUpdateProcessor(workers=4)
+    recorder = Recorder()
+    run_updates(processor, [
+        (object(), recorder.handler("a", steps=5)),
+        (object(), recorder.handler("b", steps=1)),
+    ])
+
+    assert processor.chat_key(object()) is None
+    assert recorder.index("end", "b") < recorder.index("end", "a")
+
+
+def test_failed_update_releases_chat():
+    processor = PerChatUpdateProcessor(workers=2)
+    recorder = Recorder()
+
+    async def failing():
+        raise RuntimeError("handler failed")
+
+    async def run():
+        results = await asyncio.gather(
+            processor.process_update(message_update(5), failing()),
+            processor.process_update(message_update(5), recorder.handler("after")),
+            return_exceptions=True
+        )
+        return results
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], RuntimeError)
+    assert ("end", "after") in recorder.events
+    assert processor.active_chats == 0
+
+
+# ─── Прогон через Application (benchmarks/replay_updates.py) ───
+
+def test_replay_through_application_keeps_chat_order():
+    from benchmarks.replay_updates import replay, synthetic_updates
+
+    updates = synthetic_updates(300, chats=20, admin_share=0.02)
+    result = asyncio.run(replay(updates, workers=8, api_latency=0, tasks=300, page_latency=0))
+
+    assert sum(len(ids) for ids in result["order"].values()) == 300
+    assert all(ids == sorted(ids) for ids in result["order"].values())
+    # На каждый апдейт — хотя бы один ответ через Bot API
+    assert result["api_calls"] >= 300
+
+
+def test_replay_slow_admin_does_not_delay_clients():
+    from benchmarks.replay_updates import replay, synthetic_updates
+
+    # Апдейты приходят потоком, а не разом: иначе задержку клиентов
+    # определяет очередь на процессор, а не блокировка /analyze
+    updates = synthetic_updates(200, chats=50, admin_share=0.05)
+    kwargs = dict(api_latency=0.001, tasks=500, page_latency=0.05, arrival_rate=250)
+    sequential = asyncio.run(replay(updates, workers=1, **kwargs))
+    per_chat = asyncio.run(replay(updates, workers=8, **kwargs))
+
+    # Полная загрузка проекта — 5 страниц по 50 мс
+    assert per_chat["admin_p99"] > 0.2
+    # Последовательно клиенты ждут её за спиной /analyze, по чатам — нет
+    assert sequential["client_p99"] > 0.2
+    assert per_chat["client_p99"] < per_chat["admin_p99"] / 4
@@ -0,0 +1,183 @@
+"""Тёплый старт: восстановление снимков в TaskAnalyzer"""
+
+import asyncio
+import time
+
+import main
+from main import TaskAnalyzer
+
+
+class FakeStore:
+    """Хранилище снимков в памяти"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.saved = []
+
+    async def load(self):
+        return [dict(row, analysis=dict(row["analysis"])) for row in self.rows]
+
+    async def save(self, gid, name, sync_token, tasks, analysis):
+        self.saved.append((gid, len(tasks)))
+
+
+class FakeAsana:
+    def __init__(self):
+        self.project_calls = []
+
+    async def get_project(self, gid):
+        self.project_calls.append(gid)
+        return {"gid": gid, "name": gid.upper()}
+
+
+def snapshot(gid: str) -> dict:
+    return {
+        "gid": gid,
+        "name": f"Project {gid}",
+        "sync_token": "tok",
+        "saved_at": time.time(),
+        "tasks": [{"gid": f"{gid}-1", "name": "Task", "due_on": None, "assignee": None}],
+        "analysis": {"total_active": 1, "overdue": [], "no_due_date": [], "no_assignee": [], "by_assignee": {}},
+    }
+
+
+def restore(analyzer):
+    async def run():
+        restored = await analyzer.restore()
+        return restored, await analyzer.list_projects()
+    return asyncio.run(run())
+
+
+def test_project_without_snapshot_not_dropped(monkeypatch):
+    monkeypatch.setattr(main, "ASANA_PROJECTS", ["p1", "p2"])
+    asana = FakeAsana()
+    analyzer = TaskAnalyzer(asana, snapshots=FakeStore([snapshot("p1")]))
+
+    restored, projects = restore(analyzer)
+
+    assert restored == 1
+    assert projects == {"p1": "P1", "p2": "P2"}
+    # Восстановленный проект отдаётся из кэша, второго там нет — не «тёплый»
+    assert analyzer.cache.entry("p1") is not None
+    assert not analyzer.is_warm()
+
+
+def test_all_snapshots_skip_project_lookup(monkeypatch):
+    monkeypatch.setattr(main, "ASANA_PROJECTS", ["p1", "p2"])
+    asana = FakeAsana()
+    analyzer = TaskAnalyzer(asana, snapshots=FakeStore([snapshot("p1"), snapshot("p2")]))
+
+    restored, projects = restore(analyzer)
+
+    assert restored == 2
+    assert projects == {"p1": "Project p1", "p2": "Project p2"}
+    assert asana.project_calls == []
+    assert analyzer.is_warm()
+
+
+def test_snapshots_of_other_projects_ignored(monkeypatch):
+    monkeypatch.setattr(main, "ASANA_PROJECTS", ["p1"])
+    analyzer = TaskAnalyzer(FakeAsana(), snapshots=FakeStore([snapshot("p1"), snapshot("old")]))
+
+    restored, projects = restore(analyzer)
+
+    assert restored == 1
+    assert list(projects) == ["p1"]
+    assert "old" not in analyzer.syncs
+
+
+def test_all_mode_reloads_project_list(monkeypatch):
+    monkeypatch.setattr(main, "ASANA_PROJECTS", ["all"])
+    asana = FakeAsana()
+
+    async def get_projects(workspace):
+        return [{"gid": "p1", "name": "P1"}, {"gid": "new", "name": "New"}]
+
+    asana.get_projects = get_projects
+    analyzer = TaskAnalyzer(asana, snapshots=FakeStore([snapshot("p1")]))
+
+    _, projects = restore(analyzer)
+
+    assert projects == {"p1": "P1", "new": "New"}
+
+
+class SlowStore(FakeStore):
+    """Сохранение, которое ждёт разрешения"""
+
+    def __init__(self):
+        super().__init__([])
+        self.release = asyncio.Event()
+
+    async def save(self, gid, name, sync_token, tasks, analysis):
+        await self.release.wait()
+        await super().save(gid, name, sync_token, tasks, analysis)
+
+
+def analyzer_with_project(store) -> TaskAnalyzer:
+    analyzer = TaskAnalyzer(FakeAsana(), snapshots=store)
+    sync = analyzer.get_sync("p1")
+
+    async def refresh():
+        return 0
+
+    sync.refresh = refresh
+    return analyzer
+
+
+def test_analyze_does_not_wait_for_snapshot_save():
+    store = SlowStore()
+    analyzer = analyzer_with_project(store)
+
+    async def run():
+        analysis = await asyncio.wait_for(analyzer.analyze_workload("p1"), 1)
+        assert store.saved == []
+        store.release.set()
+        await asyncio.gather(*analyzer._persist_tasks.values())
+        await asyncio.sleep(0)
+        return analysis
+
+    assert asyncio.run(run())["total_active"] == 0
+    assert store.saved == [("p1", 0)]
+
+
+def test_saves_coalesced_and_rate_limited(fake_time, monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_SAVE_INTERVAL", 300)
+    monkeypatch.setattr(main.time, "monotonic", fake_time.clock)
+    store = FakeStore([])
+    analyzer = analyzer_with_project(store)
+    sync = analyzer.syncs["p1"]
+
+    async def change(gid: str):
+        sync.store.upsert({"gid": gid, "name": gid, "due_on": None, "assignee": None})
+        await analyzer.analyze_workload("p1")
+
+    async def run():
+        await change("a")
+        await asyncio.sleep(0)
+        assert store.saved == [("p1", 1)]
+        # Три изменения за паузу — одно сохранение с последним состоянием
+        for gid in ("b", "c", "d"):
+            await change(gid)
+        assert len(analyzer._persist_tasks) == 1
+        await analyzer._persist_tasks["p1"]
+
+    asyncio.run(run())
+    assert store.saved == [("p1", 1), ("p1", 4)]
+    assert 300 in fake_time.sleeps
+
+
+def test_flush_saves_pending_immediately(fake_time, monkeypatch):
+    monkeypatch.setattr(main.time, "monotonic", fake_time.clock)
+    store = FakeStore([])
+    analyzer = analyzer_with_project(store)
+
+    async def run():
+        await analyzer.analyze_workload("p1")
+        await asyncio.sleep(0)
+        analyzer.syncs["p1"].store.upsert({"gid": "x", "name": "x", "due_on": None, "assignee": None})
+        await analyzer.analyze_workload("p1")
+        await analyzer.flush_snapshots()
+
+    asyncio.run(run())
+    assert store.saved == [("p1", 0), ("p1", 1)]
+    assert analyzer._persist_tasks == {}
@@ -0,0 +1,63 @@
+"""TelegramWebhookApp: проверка секрета и тела апдейта"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from webhook import TelegramWebhookApp
+
+SECRET = "s3cret"
+
+
+def post(app: TelegramWebhookApp, body: bytes, secret: str = SECRET):
+    """POST на путь вебхука; возвращает (статус, тело ответа)"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "path": app.path,
+        "method": "POST",
+        "headers": [(b"x-telegram-bot-api-secret-token", secret.encode())],
+    }
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], sent[1]["body"]
+
+
+def make_app():
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    return TelegramWebhookApp(application, SECRET), application.update_queue
+
+
+def test_update_queued():
+    app, queue = make_app()
+    status, _ = post(app, json.dumps({"update_id": 1}).encode())
+
+    assert status == 200
+    assert queue.get_nowait().update_id == 1
+    assert app.stats["received"] == 1
+
+
+def test_wrong_secret_rejected():
+    app, queue = make_app()
+    status, _ = post(app, b'{"update_id": 1}', secret="nope")
+
+    assert status == 403
+    assert queue.empty()
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b"null", b"42", b'"text"', b"{broken"])
+def test_non_object_body_is_bad_request(body):
+    app, queue = make_app()
+    status, _ = post(app, body)
+
+    assert status == 400
+    assert queue.empty()
+    assert app.stats["invalid"] == 1
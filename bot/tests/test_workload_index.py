@@ -0,0 +1,103 @@
+"""WorkloadIndex: порядок по срокам, обновления по одной задаче, смена дня"""
+
+from datetime import date, timedelta
+
+from benchmarks.workload_index import TODAY, rescan, synthetic_tasks
+from workload_index import WorkloadIndex, merge_snapshots
+
+
+def task(gid: str, due_on=None, assignee="Анна", completed=False) -> dict:
+    return {
+        "gid": gid,
+        "name": f"Задача {gid}",
+        "due_on": due_on,
+        "assignee": {"gid": assignee, "name": assignee} if assignee else None,
+        "completed": completed,
+    }
+
+
+def gids(tasks) -> list:
+    return [t["gid"] for t in tasks]
+
+
+def index_of(*tasks) -> WorkloadIndex:
+    index = WorkloadIndex(today=lambda: TODAY)
+    for t in tasks:
+        index.upsert(t)
+    return index
+
+
+def test_assignee_tasks_ordered_by_due_date():
+    index = index_of(
+        task("1", "2026-01-20"), task("2"), task("3", "2026-01-10"), task("4", "2026-01-15"),
+    )
+    # Без срока — в конце
+    assert gids(index.assignee_tasks("Анна")) == ["3", "4", "1", "2"]
+    assert gids(index.upcoming("Анна", 2)) == ["3", "4"]
+    # Задачи без срока в «ближайшие дедлайны» не попадают
+    assert gids(index.upcoming("Анна", 10)) == ["3", "4", "1"]
+
+
+def test_update_moves_task_between_buckets():
+    index = index_of(task("1", "2026-01-10"), task("2", "2026-01-20", assignee="Борис"))
+
+    index.upsert(task("1", None, assignee=None))
+    assert gids(index.no_assignee()) == ["1"]
+    assert gids(index.no_due_date()) == ["1"]
+    assert index.assignee_counts() == {"Борис": 1}
+    assert index.overdue() == []
+
+    index.upsert(task("2", "2026-01-01", assignee="Борис"))
+    assert gids(index.overdue()) == ["2"]
+    assert len(index) == 2
+
+
+def test_completed_and_removed_tasks_leave_index():
+    index = index_of(task("1", "2026-01-10"), task("2", "2026-01-11"))
+
+    index.upsert(task("1", "2026-01-10", completed=True))
+    index.remove("2")
+    index.remove("missing")
+
+    assert len(index) == 0
+    assert index.assignee_counts() == {}
+    assert index.overdue_count() == 0
+
+
+def test_overdue_rolls_with_the_day_without_rescan():
+    index = index_of(task("1", "2026-01-14"), task("2", "2026-01-15"), task("3", "2026-01-16"))
+
+    assert gids(index.overdue()) == ["1"]
+    assert gids(index.overdue(TODAY + timedelta(days=1))) == ["1", "2"]
+    assert index.overdue_count(TODAY + timedelta(days=2)) == 3
+    assert gids(index.due_on(date(2026, 1, 15))) == ["2"]
+
+
+def test_snapshot_matches_full_rescan():
+    tasks = synthetic_tasks(3000, assignees=12)
+    index = index_of(*tasks)
+
+    snapshot = index.snapshot(TODAY)
+    expected = rescan(tasks, TODAY)
+
+    assert snapshot["total_active"] == expected["total_active"]
+    assert gids(snapshot["no_assignee"]) == gids(expected["no_assignee"])
+    assert gids(snapshot["no_due_date"]) == gids(expected["no_due_date"])
+    assert sorted(gids(snapshot["overdue"])) == sorted(gids(expected["overdue"]))
+    assert snapshot["by_assignee"].keys() == expected["by_assignee"].keys()
+    for name, tasks_of in snapshot["by_assignee"].items():
+        assert sorted(gids(tasks_of)) == sorted(gids(expected["by_assignee"][name]))
+        due = [t["due_on"] or "9999-12-31" for t in tasks_of]
+        assert due == sorted(due)
+
+
+def test_merge_snapshots_counts_shared_task_once():
+    shared = task("1", "2026-01-10")
+    first = index_of(shared, task("2", "2026-01-20")).snapshot(TODAY)
+    second = index_of(shared, task("3", "2026-01-12", assignee=None)).snapshot(TODAY)
+
+    merged = merge_snapshots([first, second])
+
+    assert merged["total_active"] == 3
+    assert gids(merged["by_assignee"]["Анна"]) == ["1", "2"]
+    assert gids(merged["overdue"]) == ["1", "3"]
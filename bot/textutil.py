@@ -0,0 +1,39 @@
+"""
+Работа с текстом сообщений Telegram
+"""
+
+from typing import List
+
+# Лимит Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Разбить текст на части не длиннее limit.
+
+    Режем по строкам; строку длиннее лимита — по символам.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+
+    if current:
+        parts.append(current)
+    return parts
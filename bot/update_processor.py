@@ -0,0 +1,72 @@
+"""
+Конкурентная обработка апдейтов с сохранением порядка внутри чата
+
+Апдейты разных чатов обрабатываются параллельно (не больше workers
+одновременно), апдейты одного чата — строго по очереди поступления. Так
+медленный /analyze у админа не задерживает клиентов, а двойное нажатие
+кнопки в одном чате не обгоняет само себя.
+
+Семафор базового класса ограничивает число принятых в работу апдейтов
+(max_pending, включая ждущих своей очереди в чате), внутренний — число
+реально выполняющихся. Поэтому очередь одного «шумного» чата не занимает
+слоты пула.
+"""
+
+import asyncio
+from typing import Awaitable, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельно между чатами, последовательно внутри чата"""
+
+    def __init__(self, workers: int, max_pending: int = 256):
+        super().__init__(max(workers, max_pending))
+        self.workers = workers
+        self._workers = asyncio.BoundedSemaphore(workers)
+        # chat_id -> [lock, число апдейтов, ожидающих или обрабатываемых]
+        self._chats: Dict[Hashable, List] = {}
+
+    @staticmethod
+    def chat_key(update: object) -> Optional[Hashable]:
+        """Ключ очереди: чат, а без чата — пользователь"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self.chat_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chats)
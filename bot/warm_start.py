@@ -0,0 +1,177 @@
+"""
+Снимок состояния для тёплого старта
+
+Render перезапускает и усыпляет воркер, а всё состояние бота живёт в
+памяти — без снимка первый /analyze после рестарта ждёт полную загрузку
+проектов из Asana. Здесь после каждого обновления анализа сохраняются
+задачи проекта, sync-токен и готовый анализ; при старте они поднимаются
+обратно:
+
+- анализ сразу отдаётся из кэша (с пометкой возраста), а в фоне идёт
+  обновление;
+- хранилище задач и sync-токен восстановлены, поэтому обновление — это
+  дельта по /events, а не полная перезагрузка.
+
+Одна строка на проект, задачи и анализ — JSON, сжатый zlib. Хранилищ
+два с одним интерфейсом (async save/load):
+
+- SupabaseSnapshotStore — таблица bot_snapshots (миграция 011); диск
+  воркера на Render эфемерный, поэтому в проде снимок живёт здесь;
+- SnapshotStore — SQLite-файл (SNAPSHOT_PATH) для запуска без Supabase.
+
+Сериализация и сжатие идут в отдельном потоке, не блокируя цикл событий.
+"""
+
+import json
+import time
+import zlib
+import base64
+import asyncio
+import sqlite3
+import logging
+from typing import Dict, List, Optional
+
+from postgrest.types import ReturnMethod
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    gid TEXT PRIMARY KEY,
+    name TEXT,
+    sync_token TEXT,
+    saved_at REAL NOT NULL,
+    tasks BLOB NOT NULL,
+    analysis BLOB NOT NULL
+)
+"""
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode(), 6)
+
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob))
+
+
+def pack_row(
+    gid: str,
+    name: str,
+    sync_token: Optional[str],
+    tasks: List[Dict],
+    analysis: Dict
+) -> tuple:
+    """(gid, name, sync_token, saved_at, tasks, analysis) со сжатыми задачами и анализом"""
+    analysis = {k: v for k, v in analysis.items() if k not in ("version", "restored_at")}
+    return (gid, name, sync_token, time.time(), _pack(tasks), _pack(analysis))
+
+
+def unpack_rows(rows: List[tuple]) -> List[Dict]:
+    """Строки pack_row -> проекты; битые снимки пропускаются"""
+    projects = []
+    for gid, name, sync_token, saved_at, tasks, analysis in rows:
+        try:
+            if isinstance(tasks, str):
+                # Supabase: base64
+                tasks, analysis = base64.b64decode(tasks), base64.b64decode(analysis)
+            projects.append({
+                "gid": gid,
+                "name": name,
+                "sync_token": sync_token,
+                "saved_at": saved_at,
+                "tasks": _unpack(tasks),
+                "analysis": _unpack(analysis),
+            })
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Skipping broken snapshot for project {gid}: {e}")
+    return projects
+
+
+class SnapshotStore:
+    """SQLite-файл со снимками проектов"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as db:
+            db.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    async def save(
+        self,
+        gid: str,
+        name: str,
+        sync_token: Optional[str],
+        tasks: List[Dict],
+        analysis: Dict
+    ):
+        await asyncio.to_thread(self._save, gid, name, sync_token, tasks, analysis)
+
+    def _save(self, *project):
+        row = pack_row(*project)
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO projects (gid, name, sync_token, saved_at, tasks, analysis) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+
+    async def load(self) -> List[Dict]:
+        """Все сохранённые проекты"""
+        return await asyncio.to_thread(self._load)
+
+    def _load(self) -> List[Dict]:
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT gid, name, sync_token, saved_at, tasks, analysis FROM projects"
+            ).fetchall()
+        return unpack_rows(rows)
+
+
+class SupabaseSnapshotStore:
+    """Снимки проектов в таблице bot_snapshots (сжатый JSON в base64)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _row(*project) -> Dict:
+        gid, name, sync_token, saved_at, tasks, analysis = pack_row(*project)
+        return {
+            "gid": gid,
+            "name": name,
+            "sync_token": sync_token,
+            "saved_at": saved_at,
+            "tasks": base64.b64encode(tasks).decode(),
+            "analysis": base64.b64encode(analysis).decode(),
+        }
+
+    async def save(
+        self,
+        gid: str,
+        name: str,
+        sync_token: Optional[str],
+        tasks: List[Dict],
+        analysis: Dict
+    ):
+        row = await asyncio.to_thread(self._row, gid, name, sync_token, tasks, analysis)
+        await (
+            self.db.table("bot_snapshots")
+            .upsert(row, on_conflict="gid", returning=ReturnMethod.minimal)
+            .execute()
+        )
+
+    async def load(self) -> List[Dict]:
+        """Все сохранённые проекты"""
+        result = await (
+            self.db.table("bot_snapshots")
+            .select("gid,name,sync_token,saved_at,tasks,analysis")
+            .execute()
+        )
+        rows = [
+            (r["gid"], r["name"], r["sync_token"], r["saved_at"], r["tasks"], r["analysis"])
+            for r in result.data or []
+        ]
+        return await asyncio.to_thread(unpack_rows, rows)
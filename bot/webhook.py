@@ -0,0 +1,118 @@
+"""
+Webhook-режим бота
+
+Минимальное ASGI-приложение: принимает апдейты Telegram на WEBHOOK_PATH,
+проверяет заголовок X-Telegram-Bot-Api-Secret-Token и кладёт апдейт в
+очередь Application. Обработка идёт обычным путём (handlers), поэтому
+локально режим проверяется простым POST записанного апдейта:
+
+    curl -X POST localhost:8080/telegram \\
+        -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+        -d @update.json
+"""
+
+import hmac
+import json
+import logging
+from typing import Dict
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class TelegramWebhookApp:
+    """ASGI-приложение для приёма апдейтов Telegram"""
+
+    def __init__(self, application: Application, secret: str, path: str = "/telegram"):
+        self.application = application
+        self.secret = secret.encode()
+        self.path = path
+        self.routes = {}
+
+        self.stats = {
+            "received": 0,
+            "rejected": 0,
+            "invalid": 0,
+        }
+
+    def add_route(self, path: str, handler):
+        """Дополнительный GET-маршрут: handler() -> (status, content_type, body)"""
+        self.routes[path] = handler
+
+    async def __call__(self, scope: Dict, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        method = scope["method"]
+
+        if path == self.path and method == "POST":
+            status, body = await self._handle_update(scope, receive)
+            await self._respond(send, status, b"text/plain", body)
+        elif path == "/health" and method == "GET":
+            await self._respond(send, 200, b"text/plain", b"ok")
+        elif path in self.routes and method == "GET":
+            status, content_type, body = await self.routes[path]()
+            await self._respond(send, status, content_type.encode(), body.encode())
+        else:
+            await self._respond(send, 404, b"text/plain", b"not found")
+
+    async def _handle_update(self, scope: Dict, receive):
+        headers = dict(scope.get("headers") or [])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b""), self.secret):
+            self.stats["rejected"] += 1
+            return 403, b"forbidden"
+
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+            if len(body) > MAX_BODY_SIZE:
+                self.stats["invalid"] += 1
+                return 413, b"too large"
+
+        try:
+            payload = json.loads(body)
+            # null, список, число — валидный JSON, но не апдейт
+            if not isinstance(payload, dict):
+                raise TypeError(f"expected object, got {type(payload).__name__}")
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            self.stats["invalid"] += 1
+            logger.warning(f"Invalid webhook update: {e}")
+            return 400, b"bad request"
+
+        self.stats["received"] += 1
+        await self.application.update_queue.put(update)
+        return 200, b"ok"
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _respond(send, status: int, content_type: bytes, body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,220 @@
+"""
+История загрузки команды для /trend
+
+Раз в interval секунд текущий анализ сворачивается в строки дня
+(миграция 009): итог, по исполнителю, по проекту — счётчики активных,
+просроченных и без срока. Списки исполнителей в анализе уже упорядочены
+по сроку, поэтому счётчики берутся бинарным поиском: запись дня —
+O(исполнителей), без прохода по задачам. За текущий день строки
+перезаписываются, прошедшие дни не меняются.
+
+/trend читает по одному дню на неделю (тот же день недели, что и
+последний записанный) — число строк зависит от числа недель и рядов,
+а не от длины истории. Сырая история Asana не нужна.
+"""
+
+import bisect
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from postgrest.types import ReturnMethod
+
+from position_summary import sparkline
+
+logger = logging.getLogger(__name__)
+
+NO_DUE_KEY = "9999-12-31"
+
+
+def _due_key(task: Dict) -> str:
+    return task.get("due_on") or NO_DUE_KEY
+
+
+def rollup(analysis: Dict, day: date) -> List[Dict]:
+    """Строки workload_daily за день из объединённого анализа"""
+    today = day.isoformat()
+    rows = [{
+        "day": today,
+        "scope": "total",
+        "key": "",
+        "name": None,
+        "active": analysis["total_active"],
+        "overdue": len(analysis["overdue"]),
+        "no_due": len(analysis["no_due_date"]),
+        "no_assignee": len(analysis["no_assignee"]),
+    }]
+
+    for name, tasks in analysis["by_assignee"].items():
+        dated = bisect.bisect_left(tasks, NO_DUE_KEY, key=_due_key)
+        rows.append({
+            "day": today,
+            "scope": "assignee",
+            "key": name,
+            "name": name,
+            "active": len(tasks),
+            "overdue": bisect.bisect_left(tasks, today, hi=dated, key=_due_key),
+            "no_due": len(tasks) - dated,
+            "no_assignee": None,
+        })
+
+    for project in analysis.get("projects", []):
+        rows.append({
+            "day": today,
+            "scope": "project",
+            "key": project["gid"],
+            "name": project["name"],
+            "active": project["total_active"],
+            "overdue": project["overdue"],
+            "no_due": project.get("no_due", 0),
+            "no_assignee": None,
+        })
+    return rows
+
+
+def _delta(series: List[Optional[int]]) -> str:
+    known = [v for v in series if v is not None]
+    if len(known) < 2:
+        return ""
+    return f" ({known[-1] - known[0]:+d})"
+
+
+def _spark(series: List[Optional[int]]) -> str:
+    known = [v for v in series if v is not None]
+    return sparkline(known) if len(known) > 2 else ""
+
+
+def format_trend(trend: Optional[Dict], limit: int = 15) -> str:
+    """Текст /trend"""
+    if not trend or not trend["days"]:
+        return "📈 *Динамика загрузки*\n\nИстории пока нет — она копится раз в день."
+
+    days = trend["days"]
+    total = trend["total"]
+    msg = [f"📈 *Динамика загрузки* ({len(days)} нед., {days[0]} — {days[-1]})\n"]
+
+    for field, label in (
+        ("active", "📋 Активных"),
+        ("overdue", "🔥 Просрочено"),
+        ("no_due", "📅 Без срока"),
+        ("no_assignee", "❌ Без исполнителя"),
+    ):
+        series = [row.get(field) if row else None for row in total]
+        if series[-1] is None:
+            continue
+        msg.append(f"{label}: {series[-1]}{_delta(series)}  {_spark(series)}".rstrip())
+
+    assignees = trend["assignees"]
+    if assignees:
+        msg.append("\n👥 *По специалистам* (активные / просроченные):")
+        current = sorted(
+            assignees.items(),
+            key=lambda item: -(item[1][-1]["active"] if item[1][-1] else 0)
+        )
+        for name, rows in current[:limit]:
+            active = [row["active"] if row else None for row in rows]
+            if active[-1] is None:
+                continue
+            overdue = rows[-1]["overdue"]
+            msg.append(f"• {name}: {active[-1]}{_delta(active)} / {overdue}  {_spark(active)}".rstrip())
+        if len(current) > limit:
+            msg.append(f"... и ещё {len(current) - limit}")
+
+    return "\n".join(msg)
+
+
+class WorkloadHistory:
+    """Запись дневных сводок и чтение тренда"""
+
+    def __init__(self, db, analyzer, page_size: int = 1000):
+        self.db = db
+        self.analyzer = analyzer
+        self.page_size = page_size
+
+    async def record(self, day: Optional[date] = None) -> int:
+        """Записать сводку дня; возвращает число строк"""
+        analysis = await self.analyzer.analyze_all()
+        failed = [p["name"] for p in analysis.get("projects", []) if "error" in p]
+        if failed:
+            # Частичный итог испортил бы ряд — ждём следующего прогона
+            logger.warning(f"Workload rollup skipped, projects not loaded: {', '.join(failed)}")
+            return 0
+
+        day = day or date.today()
+        rows = rollup(analysis, day)
+        await (
+            self.db.table("workload_daily")
+            .upsert(rows, on_conflict="day,scope,key", returning=ReturnMethod.minimal)
+            .execute()
+        )
+        return len(rows)
+
+    async def run_job(self, context):
+        """Колбэк JobQueue"""
+        try:
+            rows = await self.record()
+            if rows:
+                logger.info(f"Workload rollup: {rows} rows")
+        except Exception as e:
+            logger.error(f"Workload rollup error: {e}")
+
+    async def trend(self, weeks: int) -> Optional[Dict]:
+        """
+        Ряды за последние weeks недель: по одному дню на неделю.
+
+        {"days": [...], "total": [row|None, ...], "assignees": {name: [row|None, ...]}}
+        """
+        latest = await (
+            self.db.table("workload_daily")
+            .select("day")
+            .eq("scope", "total")
+            .order("day", desc=True)
+            .limit(1)
+            .execute()
+        )
+        if not latest.data:
+            return None
+
+        last = date.fromisoformat(latest.data[0]["day"])
+        days = [(last - timedelta(weeks=i)).isoformat() for i in reversed(range(weeks))]
+        rows = await self._rows(days)
+
+        position = {day: i for i, day in enumerate(days)}
+        total: List[Optional[Dict]] = [None] * len(days)
+        assignees: Dict[str, List[Optional[Dict]]] = {}
+        for row in rows:
+            i = position[row["day"]]
+            if row["scope"] == "total":
+                total[i] = row
+            else:
+                assignees.setdefault(row["key"], [None] * len(days))[i] = row
+
+        # Недели до начала истории не показываем
+        first = next((i for i, row in enumerate(total) if row), len(days))
+        return {
+            "days": days[first:],
+            "total": total[first:],
+            "assignees": {name: series[first:] for name, series in assignees.items()},
+        }
+
+    async def _rows(self, days: List[str]) -> List[Dict]:
+        """Итог и исполнители за дни (постранично)"""
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            result = await (
+                self.db.table("workload_daily")
+                .select("day,scope,key,active,overdue,no_due,no_assignee")
+                .in_("day", days)
+                .in_("scope", ["total", "assignee"])
+                .order("day")
+                .order("scope")
+                .order("key")
+                .range(start, start + self.page_size - 1)
+                .execute()
+            )
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
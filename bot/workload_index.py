@@ -0,0 +1,192 @@
+"""
+Индекс загрузки команды
+
+Поддерживается инкрементально (по одной задаче на вставку/обновление/
+удаление), поэтому анализ не перебирает проект заново:
+
+- задачи каждого исполнителя лежат упорядоченными по дедлайну —
+  «N ближайших дедлайнов» берётся срезом без сортировки;
+- все задачи со сроком лежат в одном упорядоченном списке — просроченные
+  это префикс до сегодняшней даты, поэтому смена дня не требует пересчёта;
+- «без исполнителя» и «без дедлайна» — множества с порядком вставки.
+"""
+
+import heapq
+from datetime import date
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+# Ключ задачи без срока — в конце списка исполнителя
+NO_DUE = date.max
+
+
+class WorkloadIndex:
+    """Инкрементальный индекс задач по исполнителям и срокам"""
+
+    def __init__(self, today: Callable[[], date] = date.today):
+        self.today = today
+
+        # gid -> (задача, исполнитель, срок)
+        self._tasks: Dict[str, Tuple[Dict, Optional[str], Optional[date]]] = {}
+        # исполнитель -> SortedList[(срок, gid)]
+        self._by_assignee: Dict[str, SortedList] = {}
+        # все задачи со сроком: SortedList[(срок, gid)]
+        self._dated = SortedList()
+        # упорядоченные множества gid
+        self._no_assignee: Dict[str, None] = {}
+        self._no_due: Dict[str, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    # ───────────────────────── обновление ─────────────────────────
+
+    def upsert(self, task: Dict):
+        """Добавить или обновить задачу"""
+        gid = task["gid"]
+        if gid in self._tasks:
+            self.remove(gid)
+        if task.get("completed"):
+            return
+
+        assignee = task.get("assignee")
+        name = assignee.get("name", "Unknown") if assignee else None
+        due_on = task.get("due_on")
+        due = date.fromisoformat(due_on) if due_on else None
+
+        self._tasks[gid] = (task, name, due)
+
+        if name is None:
+            self._no_assignee[gid] = None
+        else:
+            if name not in self._by_assignee:
+                self._by_assignee[name] = SortedList()
+            self._by_assignee[name].add((due or NO_DUE, gid))
+
+        if due is None:
+            self._no_due[gid] = None
+        else:
+            self._dated.add((due, gid))
+
+    def remove(self, gid: str):
+        """Убрать задачу (завершена/удалена)"""
+        entry = self._tasks.pop(gid, None)
+        if entry is None:
+            return
+        _, name, due = entry
+
+        if name is None:
+            self._no_assignee.pop(gid, None)
+        else:
+            tasks = self._by_assignee[name]
+            tasks.remove((due or NO_DUE, gid))
+            if not tasks:
+                del self._by_assignee[name]
+
+        if due is None:
+            self._no_due.pop(gid, None)
+        else:
+            self._dated.remove((due, gid))
+
+    def clear(self):
+        self._tasks.clear()
+        self._by_assignee.clear()
+        self._dated.clear()
+        self._no_assignee.clear()
+        self._no_due.clear()
+
+    # ───────────────────────── запросы ─────────────────────────
+
+    def assignee_counts(self) -> Dict[str, int]:
+        return {name: len(tasks) for name, tasks in self._by_assignee.items()}
+
+    def assignee_tasks(self, name: str) -> List[Dict]:
+        """Задачи исполнителя по возрастанию срока (без срока — в конце)"""
+        return [self._tasks[gid][0] for _, gid in self._by_assignee.get(name, ())]
+
+    def upcoming(self, name: str, n: int) -> List[Dict]:
+        """N ближайших дедлайнов исполнителя"""
+        entries = islice(self._by_assignee.get(name, ()), n)
+        return [self._tasks[gid][0] for due, gid in entries if due is not NO_DUE]
+
+    def overdue_count(self, today: Optional[date] = None) -> int:
+        return self._dated.bisect_left((today or self.today(),))
+
+    def overdue(self, today: Optional[date] = None) -> List[Dict]:
+        """Просроченные — префикс списка по срокам"""
+        end = self.overdue_count(today)
+        return [self._tasks[gid][0] for _, gid in self._dated.islice(0, end)]
+
+    def due_on(self, day: date) -> List[Dict]:
+        """Задачи со сроком ровно в этот день"""
+        return [self._tasks[gid][0] for _, gid in self._dated.irange((day,), (day, "\uffff"))]
+
+    def no_assignee(self) -> List[Dict]:
+        return [self._tasks[gid][0] for gid in self._no_assignee]
+
+    def no_due_date(self) -> List[Dict]:
+        return [self._tasks[gid][0] for gid in self._no_due]
+
+    def snapshot(self, today: Optional[date] = None) -> Dict:
+        """Анализ в формате TaskAnalyzer.analyze_workload"""
+        return {
+            "by_assignee": {
+                name: self.assignee_tasks(name) for name in self._by_assignee
+            },
+            "no_assignee": self.no_assignee(),
+            "no_due_date": self.no_due_date(),
+            "overdue": self.overdue(today),
+            "total_active": len(self._tasks)
+        }
+
+
+def _due_key(task: Dict) -> str:
+    return task.get("due_on") or "9999-12-31"
+
+
+def _unique(tasks, seen: set) -> List[Dict]:
+    result = []
+    for task in tasks:
+        if task["gid"] not in seen:
+            seen.add(task["gid"])
+            result.append(task)
+    return result
+
+
+def merge_snapshots(snapshots: List[Dict]) -> Dict:
+    """
+    Объединить снимки нескольких проектов.
+
+    Задача, входящая в несколько проектов, учитывается один раз. Списки
+    уже упорядочены по сроку, поэтому сливаются без пересортировки.
+    """
+    if len(snapshots) == 1:
+        return dict(snapshots[0])
+
+    names = {name for s in snapshots for name in s["by_assignee"]}
+    by_assignee = {
+        name: _unique(
+            heapq.merge(*(s["by_assignee"].get(name, ()) for s in snapshots), key=_due_key),
+            set()
+        )
+        for name in names
+    }
+
+    active = set()
+    for s in snapshots:
+        for tasks in s["by_assignee"].values():
+            active.update(t["gid"] for t in tasks)
+        active.update(t["gid"] for t in s["no_assignee"])
+
+    return {
+        "by_assignee": by_assignee,
+        "no_assignee": _unique((t for s in snapshots for t in s["no_assignee"]), set()),
+        "no_due_date": _unique((t for s in snapshots for t in s["no_due_date"]), set()),
+        "overdue": _unique(
+            heapq.merge(*(s["overdue"] for s in snapshots), key=_due_key),
+            set()
+        ),
+        "total_active": len(active)
+    }
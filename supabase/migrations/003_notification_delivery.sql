@@ -0,0 +1,12 @@
+-- Доставка уведомлений в Telegram
+-- Бот выбирает неотправленные уведомления пачкой и отмечает их отправленными
+
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS sent_at TIMESTAMPTZ;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS send_error TEXT;
+
+-- Очередь на отправку: только неотправленные, по времени создания
+CREATE INDEX IF NOT EXISTS idx_notifications_unsent
+    ON notifications(created_at)
+    WHERE sent_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_portal_users_client ON portal_users(client_id);
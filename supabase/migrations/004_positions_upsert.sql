@@ -0,0 +1,22 @@
+-- Идемпотентная загрузка позиций
+-- Одна строка на (клиент, запрос, поисковик, регион, день проверки)
+
+ALTER TABLE positions
+    ADD COLUMN IF NOT EXISTS checked_on DATE
+    GENERATED ALWAYS AS ((checked_at AT TIME ZONE 'UTC')::date) STORED;
+
+-- Дубликаты, накопленные до появления ключа: оставляем последнюю проверку
+DELETE FROM positions p
+USING positions newer
+WHERE p.client_id = newer.client_id
+  AND p.keyword = newer.keyword
+  AND p.search_engine IS NOT DISTINCT FROM newer.search_engine
+  AND p.region IS NOT DISTINCT FROM newer.region
+  AND p.checked_on = newer.checked_on
+  AND (p.checked_at, p.id) < (newer.checked_at, newer.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_positions_unique_day
+    ON positions(client_id, keyword, search_engine, region, checked_on);
+
+CREATE INDEX IF NOT EXISTS idx_positions_client_day
+    ON positions(client_id, checked_on);
@@ -0,0 +1,72 @@
+-- Сводка позиций для бота
+-- Дневные агрегаты и последние изменения считаются заранее, бот читает
+-- несколько строк на клиента вместо сырой таблицы positions.
+-- Обновляются вызовом refresh_position_rollups() после загрузки позиций.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS positions_daily AS
+SELECT
+    client_id,
+    checked_on,
+    COUNT(*) AS keywords,
+    ROUND(AVG(position)::numeric, 1) AS avg_position,
+    COUNT(*) FILTER (WHERE position <= 3) AS top3,
+    COUNT(*) FILTER (WHERE position <= 10) AS top10,
+    -- Видимость: доля запросов в топ-10, %
+    ROUND(100.0 * COUNT(*) FILTER (WHERE position <= 10) / COUNT(*), 1) AS visibility
+FROM positions
+WHERE position IS NOT NULL
+GROUP BY client_id, checked_on;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_positions_daily_client_day
+    ON positions_daily(client_id, checked_on);
+
+-- Изменения последней проверки клиента относительно предыдущей проверки запроса
+CREATE MATERIALIZED VIEW IF NOT EXISTS position_movers AS
+WITH ranked AS (
+    SELECT
+        client_id, keyword, search_engine, region, checked_on, position,
+        ROW_NUMBER() OVER (
+            PARTITION BY client_id, keyword, search_engine, region
+            ORDER BY checked_on DESC
+        ) AS rn
+    FROM positions
+    WHERE position IS NOT NULL
+),
+last_day AS (
+    SELECT client_id, MAX(checked_on) AS checked_on
+    FROM positions
+    GROUP BY client_id
+)
+SELECT
+    cur.client_id,
+    cur.keyword,
+    cur.search_engine,
+    cur.region,
+    cur.checked_on,
+    prev.position AS previous,
+    cur.position AS current,
+    prev.position - cur.position AS delta, -- > 0 — рост
+    ABS(prev.position - cur.position) AS abs_delta
+FROM ranked cur
+JOIN ranked prev USING (client_id, keyword, search_engine, region)
+JOIN last_day d ON d.client_id = cur.client_id AND d.checked_on = cur.checked_on
+WHERE cur.rn = 1 AND prev.rn = 2 AND cur.position <> prev.position;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_position_movers_key
+    ON position_movers(client_id, keyword, search_engine, region);
+CREATE INDEX IF NOT EXISTS idx_position_movers_client
+    ON position_movers(client_id, abs_delta DESC);
+
+CREATE OR REPLACE FUNCTION refresh_position_rollups() RETURNS void
+LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY positions_daily;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY position_movers;
+END;
+$$;
+
+-- У материализованных представлений нет RLS: закрываем их и обновление
+-- от публичных ролей, как закрыта сама positions (читает только бот
+-- с сервисным ключом)
+REVOKE ALL ON positions_daily, position_movers FROM anon, authenticated;
+REVOKE EXECUTE ON FUNCTION refresh_position_rollups() FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,13 @@
+-- Уведомления об изменении позиций
+-- Для каждого клиента хранится последний обработанный день проверки,
+-- чтобы одна и та же пара снимков не давала повторных уведомлений.
+
+CREATE TABLE IF NOT EXISTS position_change_checks (
+    client_id TEXT PRIMARY KEY REFERENCES clients(id),
+    checked_on DATE NOT NULL,
+    changes INTEGER DEFAULT 0,
+    processed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Читает и пишет только бот с сервисным ключом
+ALTER TABLE position_change_checks ENABLE ROW LEVEL SECURITY;
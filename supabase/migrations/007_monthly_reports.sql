@@ -0,0 +1,12 @@
+-- Пакетная генерация месячных отчётов
+-- Один отчёт каждого типа на клиента и месяц: повторная сборка обновляет строку
+
+DELETE FROM reports r
+USING reports newer
+WHERE r.client_id = newer.client_id
+  AND r.type = newer.type
+  AND r.month = newer.month
+  AND (r.created_at, r.id) < (newer.created_at, newer.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_client_type_month
+    ON reports(client_id, type, month);
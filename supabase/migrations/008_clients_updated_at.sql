@@ -0,0 +1,9 @@
+-- Инкрементальная выгрузка клиентов в бот
+-- Бот периодически забирает строки clients с updated_at новее последней загрузки
+
+CREATE TRIGGER clients_updated_at
+    BEFORE UPDATE ON clients
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_clients_updated_at ON clients(updated_at);
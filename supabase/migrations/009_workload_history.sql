@@ -0,0 +1,22 @@
+-- Дневная история загрузки команды для /trend
+-- Одна строка на день и ряд: итог по всем проектам (scope = 'total'),
+-- исполнитель (key — имя в Asana) или проект (key — gid). За текущий день
+-- строка перезаписывается при каждом пересчёте, прошедшие дни не меняются.
+-- Тренд читает несколько дней из диапазона по первичному ключу, поэтому
+-- скорость запроса не зависит от длины истории.
+
+CREATE TABLE IF NOT EXISTS workload_daily (
+    day DATE NOT NULL,
+    scope TEXT NOT NULL CHECK (scope IN ('total', 'assignee', 'project')),
+    key TEXT NOT NULL,
+    name TEXT,
+    active INTEGER NOT NULL DEFAULT 0,
+    overdue INTEGER NOT NULL DEFAULT 0,
+    no_due INTEGER NOT NULL DEFAULT 0,
+    no_assignee INTEGER,
+    recorded_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (day, scope, key)
+);
+
+-- Читает и пишет только бот с сервисным ключом
+ALTER TABLE workload_daily ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,15 @@
+-- Курсор синхронизации локального кэша истории позиций
+-- checked_at — время проверки (при загрузке — полночь дня), поэтому
+-- вторая загрузка того же дня или перезаливка старого дня его не
+-- сдвигают. updated_at меняется при любой вставке и обновлении строки.
+
+ALTER TABLE positions
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+CREATE TRIGGER positions_updated_at
+    BEFORE UPDATE ON positions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_positions_client_updated_at
+    ON positions(client_id, updated_at);
@@ -0,0 +1,16 @@
+-- Снимки проектов для тёплого старта бота (warm_start.py)
+-- Диск воркера на Render не переживает рестарт, поэтому задачи проекта,
+-- sync-токен Asana и готовый анализ хранятся здесь: одна строка на
+-- проект, tasks и analysis — JSON, сжатый zlib, в base64.
+
+CREATE TABLE IF NOT EXISTS bot_snapshots (
+    gid TEXT PRIMARY KEY,
+    name TEXT,
+    sync_token TEXT,
+    saved_at DOUBLE PRECISION NOT NULL,  -- unix time
+    tasks TEXT NOT NULL,
+    analysis TEXT NOT NULL
+);
+
+-- Читает и пишет только бот с сервисным ключом
+ALTER TABLE bot_snapshots ENABLE ROW LEVEL SECURITY;